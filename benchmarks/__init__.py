@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+性能基准测试脚本（在项目根目录用 python -m benchmarks.<脚本名> 运行）
+"""
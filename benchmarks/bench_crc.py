@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CRC16微基准：对比原逐位循环实现与查表法实现
+运行：python -m benchmarks.bench_crc
+"""
+
+import os
+import timeit
+
+from modbus_crc import crc16, verify_frames, append_crc
+
+
+def legacy_crc16(data):
+    """原ModernUI.calculate_crc16的逐位循环实现"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc = crc >> 1
+    return crc
+
+
+def bench(func, data, number):
+    """返回单次调用的平均耗时（微秒）"""
+    elapsed = min(timeit.repeat(lambda: func(data), number=number, repeat=3))
+    return elapsed / number * 1e6
+
+
+def main():
+    """运行基准并打印结果"""
+    print(f"{'帧长度':>8} {'逐位循环(us)':>14} {'查表法(us)':>12} {'加速比':>8}")
+    for size in (8, 64, 256):
+        data = os.urandom(size)
+        assert legacy_crc16(data) == crc16(data)
+        number = max(200, 20000 // size)
+        legacy = bench(legacy_crc16, data, number)
+        table = bench(crc16, data, number)
+        print(f"{size:>8} {legacy:>14.2f} {table:>12.2f} {legacy / table:>7.1f}x")
+
+    # 批量校验：1000个8字节请求帧，直接在bytes/memoryview上计算
+    frames = [memoryview(append_crc(os.urandom(6))) for _ in range(1000)]
+    legacy = min(timeit.repeat(
+        lambda: [legacy_crc16(list(f)) == 0 for f in frames], number=10, repeat=3)) / 10
+    bulk = min(timeit.repeat(lambda: verify_frames(frames), number=10, repeat=3)) / 10
+    print(f"批量校验1000帧: 逐位循环 {legacy * 1e3:.2f} ms, verify_frames {bulk * 1e3:.2f} ms, "
+          f"加速比 {legacy / bulk:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多串口并行轮询吞吐基准：每个串口接一个pty模拟从站（响应延迟模拟总线传输时间），
+分别用1、2、4、8个串口轮询，测量汇总吞吐量随串口数的增长（仅Linux/macOS）
+运行：python -m benchmarks.bench_multiport [每轮秒数] [响应延迟ms]
+"""
+
+import queue
+import sys
+import time
+
+from modbus_multiport import MultiPortPoller
+from modbus_scheduler import PollTask
+from modbus_simulator import ModbusSlaveSimulator, PtySlaveServer
+
+PORT_COUNTS = (1, 2, 4, 8)
+
+
+def run(port_count, duration, latency):
+    """用port_count个模拟串口轮询duration秒，返回汇总吞吐量（次/秒）和各串口吞吐量"""
+    servers = [PtySlaveServer(ModbusSlaveSimulator(latency=latency)).start() for _ in range(port_count)]
+    poller = MultiPortPoller()
+    for server in servers:
+        poller.add_port(server.port_name, 115200)
+        poller.add_task(server.port_name, PollTask(1, 3, 0, 10, 0))
+    counts = dict.fromkeys(poller.channels, 0)
+    poller.start()
+    # 预热后开始计数
+    time.sleep(0.2)
+    while not poller.results.empty():
+        poller.results.get_nowait()
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        try:
+            result = poller.results.get(timeout=0.05)
+        except queue.Empty:
+            continue
+        if result.ok:
+            counts[result.port] += 1
+    elapsed = time.perf_counter() - start
+    poller.stop()
+    for server in servers:
+        server.stop()
+    return sum(counts.values()) / elapsed, [count / elapsed for count in counts.values()]
+
+
+def main():
+    """运行基准并打印结果"""
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.005
+    print(f"每轮 {duration:.0f}s, 模拟从站响应延迟 {latency * 1000:.1f}ms")
+    baseline = None
+    for port_count in PORT_COUNTS:
+        total, per_port = run(port_count, duration, latency)
+        baseline = baseline or total
+        print(f"串口 {port_count}: 汇总 {total:.0f} 次/秒, 每串口 {min(per_port):.0f}-{max(per_port):.0f} 次/秒, "
+              f"加速比 {total / baseline:.2f} (理想 {port_count})")
+
+
+if __name__ == "__main__":
+    main()
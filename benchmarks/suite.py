@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试套件：CRC16、请求组帧、各功能码响应解码、解析窗口的报文解析、27930报文处理、日志视图追加和抓包回放
+数据集固定（固定随机种子），结果以JSON保存，可与保存的基准结果逐项比较
+运行：python -m benchmarks.suite [--output 结果.json] [--baseline 基准.json] [--filter crc] [--fail-on-regression]
+"""
+
+import argparse
+import atexit
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+from frame_capture import CaptureWriter, read_captures, LINK_MODBUS_RTU, LINK_CAN
+from frame_replay import ReplayDecoder, ReplayPlayer, SPEED_MAX
+from gbt27930 import MESSAGE_TYPES, build_message, pack_can_frame, unpack_can_frame, format_hex
+from log_buffer import LogBuffer, DEFAULT_CAPACITY as LOG_CAPACITY
+from modbus_crc import crc16, append_crc, check_frame
+from modbus_frame import (
+    ModbusRequest, ModbusResult, build_read_request, build_write_request, decode_read_response,
+    READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS,
+    WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS,
+)
+from modbus_history import TimeSeriesStore
+from ui_pump import UiPump, UpdateQueue
+
+SEED = 27930
+ANNOTATION_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modbus_annotations.json")
+LOG_LINES = 5000  # 日志视图追加的行数
+REPLAY_TRANSACTIONS = 5000  # 回放基准的Modbus事务数（另有同样数量的CAN帧）
+HISTORY_SERIES = 100          # 历史数据基准的点位数
+HISTORY_SAMPLES = 8640        # 每个点位的采样数（1秒1次，2.4小时）
+DEFAULT_THRESHOLD = 0.10  # 比基准慢10%以上判为退化
+
+
+class BenchCase:
+    """一个基准项：func无参数，每次调用执行ops次操作"""
+
+    def __init__(self, name, func, ops=1, number=None):
+        self.name = name
+        self.func = func
+        self.ops = ops
+        self.number = number  # 每轮调用次数，None时自动确定
+
+
+class SkipCase(Exception):
+    """当前环境无法运行该基准项（如没有图形显示）"""
+
+
+def build_dataset():
+    """固定的测试数据：各长度的帧、各功能码的请求和响应"""
+    rng = random.Random(SEED)
+    data = {"crc": {size: rng.randbytes(size) for size in (8, 64, 256, 1024)}}
+    responses = {}
+    for function_code, count in ((READ_COILS, 64), (READ_DISCRETE_INPUTS, 64),
+                                 (READ_HOLDING_REGISTERS, 60), (READ_INPUT_REGISTERS, 60)):
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS):
+            payload = rng.randbytes((count + 7) // 8)
+        else:
+            payload = rng.randbytes(count * 2)
+        request = ModbusRequest(1, function_code, 0, count)
+        responses[function_code] = (request, append_crc(bytes((1, function_code, len(payload))) + payload))
+    for function_code, values in ((WRITE_SINGLE_COIL, [1]), (WRITE_SINGLE_REGISTER, [1234]),
+                                  (WRITE_MULTIPLE_COILS, [rng.randint(0, 1) for _ in range(64)]),
+                                  (WRITE_MULTIPLE_REGISTERS, [rng.randint(0, 0xFFFF) for _ in range(60)])):
+        request = ModbusRequest.write(1, function_code, 0, values)
+        # 写请求的正常响应：功能码05/06回显整帧，功能码15/16回显地址和数量
+        echo = request.frame if function_code in (WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER) \
+            else append_crc(request.frame[:6])
+        responses[function_code] = (request, echo)
+    data["responses"] = responses
+    data["write_values"] = [rng.randint(0, 0xFFFF) for _ in range(123)]
+    return data
+
+
+def codec_cases(data):
+    """CRC、组帧和响应解码"""
+    cases = []
+    for size, frame in data["crc"].items():
+        cases.append(BenchCase(f"crc16/{size}", lambda frame=frame: crc16(frame)))
+    framed = append_crc(data["crc"][256])
+    cases.append(BenchCase("crc16/check_frame_256", lambda: check_frame(framed)))
+
+    cases.append(BenchCase("build/read_request", lambda: build_read_request(1, READ_HOLDING_REGISTERS, 100, 10)))
+    cases.append(BenchCase("build/modbus_request", lambda: ModbusRequest(1, READ_HOLDING_REGISTERS, 100, 10)))
+    values = data["write_values"]
+    cases.append(BenchCase("build/write_request_123",
+                           lambda: build_write_request(1, WRITE_MULTIPLE_REGISTERS, 0, values)))
+
+    for function_code, (request, response) in data["responses"].items():
+        name = f"decode/fc{function_code:02d}"
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            cases.append(BenchCase(name, lambda request=request, response=response: decode_read_response(
+                response, request.slave, request.function_code, request.count)))
+        else:
+            cases.append(BenchCase(name, lambda request=request, response=response:
+                                   ModbusResult(request, response).decode()))
+    return cases
+
+
+def parser_cases(data):
+    """解析对码窗口的parse_modbus_data（不创建窗口，只调用解析方法）"""
+    try:
+        from modbus_parser import ModbusParserWindow
+    except ImportError as e:
+        return [BenchCase("parser/*", _skip(f"无法导入解析模块: {e}"))]
+    parser = ModbusParserWindow.__new__(ModbusParserWindow)
+    try:
+        with open(ANNOTATION_FILE, "r", encoding="utf-8") as f:
+            parser.annotations = json.load(f)
+    except (OSError, ValueError):
+        parser.annotations = {}
+    cases = []
+    for function_code, (request, response) in data["responses"].items():
+        # 读功能码的响应在解析窗口中输入 字节数 + 数据 + CRC（与load_frame一致），否则会按请求报文解析
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            response = response[2:]
+        for kind, frame in (("request", request.frame), ("response", response)):
+            text = frame.hex().upper()
+            cases.append(BenchCase(f"parser/fc{function_code:02d}_{kind}",
+                                   lambda code=f"{function_code:02d}", text=text: parser.parse_modbus_data(code, text)))
+    exception = append_crc(bytes((1, 0x83, 0x02))).hex().upper()
+    cases.append(BenchCase("parser/exception", lambda: parser.parse_modbus_data("03", exception)))
+    return cases
+
+
+def gbt27930_cases(data):
+    """27930报文组帧、拆包和显示格式化"""
+    message_types = list(MESSAGE_TYPES) + ["自定义"]
+
+    def build_all():
+        for message_type in message_types:
+            name, can_id, payload = build_message(message_type)
+            format_hex(pack_can_frame(can_id, payload))
+
+    frames = [pack_can_frame(MESSAGE_TYPES[name][0], MESSAGE_TYPES[name][1]) for name in MESSAGE_TYPES]
+
+    def unpack_all():
+        for frame in frames:
+            can_id, payload = unpack_can_frame(frame)
+            f"  CAN ID: {can_id:08X}  数据: {format_hex(payload)}"
+
+    return [
+        BenchCase("gbt27930/build_format", build_all, ops=len(message_types)),
+        BenchCase("gbt27930/unpack_format", unpack_all, ops=len(frames)),
+    ]
+
+
+def log_view_cases(data):
+    """日志视图：格式化日志行、环形缓冲区追加，以及把LOG_LINES行逐行追加到Text控件和日志视图（需要图形显示）"""
+    request, response = data["responses"][READ_HOLDING_REGISTERS]
+    timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
+
+    def format_lines():
+        for _ in range(LOG_LINES):
+            f"[{timestamp}] 接收: {' '.join([f'{b:02X}' for b in response])}"
+
+    cases = [BenchCase(f"log/format_{LOG_LINES}", format_lines, ops=LOG_LINES, number=3)]
+    line = f"[{timestamp}] 接收: {format_hex(response)}"
+
+    def append_lines():
+        import tkinter as tk
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            raise SkipCase(f"没有图形显示: {e}")
+        root.withdraw()
+        text = tk.Text(root)
+        text.pack()
+        try:
+            # 与主界面add_raw_data相同：逐行insert并滚动到末尾
+            for _ in range(LOG_LINES):
+                text.insert(tk.END, line + "\n")
+                text.see(tk.END)
+            root.update_idletasks()
+        finally:
+            root.destroy()
+
+    cases.append(BenchCase(f"log/text_append_{LOG_LINES}", append_lines, ops=LOG_LINES, number=1))
+
+    buffer = LogBuffer(LOG_CAPACITY)
+    cases.append(BenchCase(f"log/buffer_append_{LOG_LINES}", lambda: buffer.extend([line] * LOG_LINES), ops=LOG_LINES))
+
+    def view_append():
+        import tkinter as tk
+        from log_view import LogView
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:
+            raise SkipCase(f"没有图形显示: {e}")
+        root.withdraw()
+        # 容量小于追加行数，覆盖淘汰旧行的情况
+        view = LogView(root, capacity=LOG_LINES // 5)
+        view.grid(row=0, column=0)
+        try:
+            for _ in range(LOG_LINES):
+                view.append(line)
+            root.update_idletasks()
+        finally:
+            root.destroy()
+
+    cases.append(BenchCase(f"log/view_append_{LOG_LINES}", view_append, ops=LOG_LINES, number=1))
+
+    class NullWidget:
+        """不定时的控件，只用tick()驱动界面更新泵"""
+
+        def after(self, ms, func):
+            """不启动定时器"""
+            return None
+
+        def after_cancel(self, timer):
+            """没有定时器需要取消"""
+            pass
+
+    # 界面更新泵：一帧内积压LOG_LINES条结果，只格式化和追加最新的若干条
+    updates = UpdateQueue()
+    pump = UiPump(NullWidget())
+    pump_buffer = LogBuffer(LOG_CAPACITY)
+
+    def handle(result, render):
+        if render:
+            pump.write(pump_buffer, f"[{timestamp}] 接收: {format_hex(result)}")
+
+    pump.add_source(updates, handle, lambda skipped, dropped: pump.write(pump_buffer, f"省略 {len(skipped)} 条"))
+
+    def pump_frame():
+        for _ in range(LOG_LINES):
+            updates.put(response)
+        pump.tick()
+
+    cases.append(BenchCase(f"log/pump_frame_{LOG_LINES}", pump_frame, ops=LOG_LINES))
+    return cases
+
+
+def replay_cases(data):
+    """抓包回放：按最快速度读取抓包文件（内存映射），以及读取并配对解码成ModbusResult"""
+    request, response = data["responses"][READ_HOLDING_REGISTERS]
+    _, can_id, can_data = build_message("充电状态")
+    can_frame = pack_can_frame(can_id, can_data)
+    directory = tempfile.mkdtemp(prefix="bench_replay_")
+    atexit.register(shutil.rmtree, directory, True)
+    writer = CaptureWriter(directory)
+    rtu = writer.channel("COM1", LINK_MODBUS_RTU)
+    can = writer.channel("CAN0", LINK_CAN)
+    timestamp = 1_700_000_000_000_000_000
+    for index in range(REPLAY_TRANSACTIONS):
+        rtu.tx(request.frame, timestamp)
+        rtu.rx(response, timestamp + 2_000_000)
+        can.tx(can_frame, timestamp + 3_000_000)
+        timestamp += 10_000_000
+    writer.close()
+    frames = REPLAY_TRANSACTIONS * 3
+
+    def read_all():
+        for _ in read_captures([directory]):
+            pass
+
+    def replay_flat_out():
+        decoder = ReplayDecoder(lambda result: None, lambda frame: None)
+        ReplayPlayer([directory], decoder, SPEED_MAX).run()
+
+    return [
+        BenchCase(f"replay/read_{frames}", read_all, ops=frames),
+        BenchCase(f"replay/decode_flat_out_{frames}", replay_flat_out, ops=frames),
+    ]
+
+
+def history_cases(data):
+    """历史数据：追加采样（只写内存），以及按时间桶降采样读取（趋势图）"""
+    directory = tempfile.mkdtemp(prefix="bench_history_")
+    atexit.register(shutil.rmtree, directory, True)
+    rng = random.Random(SEED)
+    store = TimeSeriesStore(os.path.join(directory, "history.db"), flush_interval=3600, min_interval=0)
+    atexit.register(store.close)
+    start = 1_700_000_000
+    for address in range(HISTORY_SERIES):
+        key = ("COM1", 1, "holding_registers", address)
+        value = rng.randrange(1000)
+        for index in range(HISTORY_SAMPLES):
+            value += rng.randrange(-2, 3)
+            store.append(key, start + index, value)
+    store.flush()
+    key = ("COM1", 1, "holding_registers", 0)
+    end = start + HISTORY_SAMPLES
+    clock = [end]
+
+    def append_samples():
+        # 时间持续递增，采样不会因为间隔过短被跳过
+        timestamp = clock[0]
+        for address in range(HISTORY_SERIES):
+            store.append(("COM1", 2, "holding_registers", address), timestamp, address)
+        clock[0] = timestamp + 1
+
+    def downsample():
+        store.downsample(key, start, end, 800)
+
+    def downsample_coarse():
+        store.downsample(key, start, end, 24)
+
+    return [
+        BenchCase(f"history/append_{HISTORY_SERIES}", append_samples, ops=HISTORY_SERIES),
+        BenchCase(f"history/downsample_{HISTORY_SAMPLES}_to_800", downsample, ops=HISTORY_SAMPLES),
+        BenchCase(f"history/downsample_{HISTORY_SAMPLES}_to_24", downsample_coarse, ops=HISTORY_SAMPLES),
+    ]
+
+
+def _skip(reason):
+    """生成直接跳过的基准函数"""
+    def func():
+        raise SkipCase(reason)
+    return func
+
+
+def all_cases():
+    """全部基准项"""
+    data = build_dataset()
+    return (codec_cases(data) + parser_cases(data) + gbt27930_cases(data) + log_view_cases(data) + replay_cases(data)
+            + history_cases(data))
+
+
+def run_case(case, repeat, min_time=0.05):
+    """运行一个基准项，返回结果字典（取多轮中最快的一轮）"""
+    try:
+        case.func()  # 预热，同时检查是否需要跳过
+        number = case.number
+        if number is None:
+            number = 1
+            while timeit.timeit(case.func, number=number) < min_time and number < 1 << 20:
+                number *= 2
+        elapsed = min(timeit.repeat(case.func, number=number, repeat=repeat)) / number
+    except SkipCase as e:
+        return {"skipped": str(e)}
+    return {"us_per_op": elapsed / case.ops * 1e6, "ops_per_s": case.ops / elapsed if elapsed else 0.0,
+            "calls": number, "ops": case.ops}
+
+
+def compare(baseline, results, threshold):
+    """逐项与基准比较，返回(文本行列表, 退化项列表)"""
+    lines = []
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if "skipped" in result or base is None or "us_per_op" not in base:
+            continue
+        change = (result["us_per_op"] - base["us_per_op"]) / base["us_per_op"] if base["us_per_op"] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  <-- 退化"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  改善"
+        lines.append(f"{name:<32} {base['us_per_op']:>12.3f} {result['us_per_op']:>12.3f} {change * 100:>+8.1f}%{mark}")
+    return lines, regressions
+
+
+def main(argv=None):
+    """运行基准并打印/保存结果"""
+    parser = argparse.ArgumentParser(description="基准测试套件")
+    parser.add_argument("--output", help="把结果保存为JSON")
+    parser.add_argument("--baseline", help="与之比较的基准结果JSON")
+    parser.add_argument("--filter", help="只运行名称包含该字符串的基准项")
+    parser.add_argument("--repeat", type=int, default=5, help="每项重复轮数，取最快一轮")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="判为退化的变慢比例")
+    parser.add_argument("--fail-on-regression", action="store_true", help="有退化项时返回非0")
+    args = parser.parse_args(argv)
+
+    results = {}
+    print(f"{'基准项':<32} {'us/次':>12} {'次/秒':>14}")
+    for case in all_cases():
+        if args.filter and args.filter not in case.name:
+            continue
+        result = results[case.name] = run_case(case, args.repeat)
+        if "skipped" in result:
+            print(f"{case.name:<32} 跳过: {result['skipped']}")
+        else:
+            print(f"{case.name:<32} {result['us_per_op']:>12.3f} {result['ops_per_s']:>14.0f}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "seed": SEED,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, results, args.threshold)
+        print(f"\n{'基准项':<32} {'基准us':>12} {'本次us':>12} {'变化':>9}")
+        for line in lines:
+            print(line)
+        print(f"退化 {len(regressions)} 项（阈值 {args.threshold * 100:.0f}%）")
+    return 1 if args.fail_on_regression and regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
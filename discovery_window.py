@@ -0,0 +1,242 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+import queue
+import serial.tools.list_ports
+from frame_capture import LINK_MODBUS_RTU
+from modbus_discovery import DiscoveryRun, FIRST_ADDRESS, LAST_ADDRESS, probe_timeout
+from modbus_serial import SerialLink, open_port
+
+
+class DiscoveryWindow:
+    """从站扫描窗口：在选中的串口上并行扫描有响应的从站地址，列出各从站支持的功能码，双击填入主界面"""
+
+    REFRESH_INTERVAL = 100  # 进度刷新间隔（ms）
+
+    def __init__(self, parent, app):
+        self.parent = parent
+        self.app = app  # 主界面，读取串口参数，双击结果时填入从站地址
+        self.window = tk.Toplevel(parent)
+        self.window.title("从站扫描")
+        self.window.geometry("760x480")
+        self.window.minsize(600, 360)
+
+        self.run = None
+        self.links = {}
+        self.events = queue.Queue()  # 扫描线程 -> 界面线程
+        self.refresh_timer = None
+        self.probed = 0
+        self.total = 0
+
+        self.create_interface()
+        self.refresh_ports()
+
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def create_interface(self):
+        """创建界面"""
+        self.status_var = tk.StringVar(value="选择串口后点击扫描，使用主界面的串口参数")
+        self.first_var = tk.StringVar(value=str(FIRST_ADDRESS))
+        self.last_var = tk.StringVar(value=str(LAST_ADDRESS))
+        self.functions_var = tk.BooleanVar(value=True)
+        self.full_reprobe_var = tk.BooleanVar(value=False)
+
+        main_frame = ttk.Frame(self.window, padding="5")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(0, weight=1)
+
+        # 左侧：串口和扫描参数
+        option_frame = ttk.LabelFrame(main_frame, text="串口", padding="5")
+        option_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5))
+        option_frame.rowconfigure(0, weight=1)
+
+        self.port_listbox = tk.Listbox(option_frame, selectmode=tk.MULTIPLE, width=18, exportselection=False)
+        self.port_listbox.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        ttk.Button(option_frame, text="刷新", command=self.refresh_ports).grid(row=1, column=0, columnspan=2,
+                                                                         sticky=(tk.W, tk.E), pady=(5, 0))
+        ttk.Label(option_frame, text="起始地址:").grid(row=2, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(option_frame, textvariable=self.first_var, width=6).grid(row=2, column=1, pady=(5, 0))
+        ttk.Label(option_frame, text="结束地址:").grid(row=3, column=0, sticky=tk.W, pady=(5, 0))
+        ttk.Entry(option_frame, textvariable=self.last_var, width=6).grid(row=3, column=1, pady=(5, 0))
+        ttk.Checkbutton(option_frame, text="探测功能码01-04", variable=self.functions_var).grid(
+            row=4, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+        ttk.Checkbutton(option_frame, text="重扫全部无响应地址", variable=self.full_reprobe_var).grid(
+            row=5, column=0, columnspan=2, sticky=tk.W)
+        self.start_button = ttk.Button(option_frame, text="扫描", command=self.toggle_discovery, style="Accent.TButton")
+        self.start_button.grid(row=6, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+
+        # 右侧：扫描结果
+        table_frame = ttk.LabelFrame(main_frame, text="扫描结果（双击填入主界面）", padding="5")
+        table_frame.grid(row=0, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+
+        columns = ("port", "slave", "latency", "functions")
+        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for column, text, width in (("port", "串口", 100), ("slave", "从站地址", 70), ("latency", "响应ms", 70),
+                                    ("functions", "功能码", 280)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=tk.W if column in ("port", "functions") else tk.E)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.bind("<Double-1>", self.use_selected)
+
+        self.progress = ttk.Progressbar(main_frame, mode="determinate")
+        self.progress.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+
+    def refresh_ports(self):
+        """刷新可用串口列表"""
+        try:
+            ports = [port.device for port in serial.tools.list_ports.comports()]
+        except Exception:
+            ports = []
+        self.port_listbox.delete(0, tk.END)
+        for port in ports:
+            self.port_listbox.insert(tk.END, port)
+            if port == self.app.com_port_var.get():
+                self.port_listbox.selection_set(tk.END)
+
+    def selected_ports(self):
+        """当前选中的串口"""
+        return [self.port_listbox.get(index) for index in self.port_listbox.curselection()]
+
+    def toggle_discovery(self):
+        """开始/停止切换"""
+        if self.run is None:
+            self.start_discovery()
+        else:
+            self.run.stop()
+            self.status_var.set("正在停止...")
+
+    def start_discovery(self):
+        """打开选中的串口并开始扫描"""
+        ports = self.selected_ports()
+        if not ports:
+            messagebox.showwarning("警告", "请至少选择一个串口", parent=self.window)
+            return
+        app = self.app
+        if app.serial_status and app.com_port_var.get() in ports:
+            messagebox.showwarning("警告", f"串口 {app.com_port_var.get()} 已在主界面打开，请先关闭", parent=self.window)
+            return
+        try:
+            first = int(self.first_var.get(), 0)
+            last = int(self.last_var.get(), 0)
+            if not FIRST_ADDRESS <= first <= last <= LAST_ADDRESS:
+                raise ValueError(f"地址范围应在{FIRST_ADDRESS}-{LAST_ADDRESS}之间")
+            baudrate = int(app.baud_rate_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", f"参数错误: {str(e)}", parent=self.window)
+            return
+
+        self.links = {}
+        try:
+            for port in ports:
+                ser = open_port(port, baudrate, app.data_bits_var.get(), app.parity_var.get(), app.stop_bits_var.get())
+                self.links[port] = SerialLink(ser)
+        except Exception as e:
+            self.close_links()
+            messagebox.showerror("错误", f"打开串口失败: {str(e)}", parent=self.window)
+            return
+
+        # 扫描的收发帧写入主界面的抓包文件
+        app.add_capture_listener(self.set_capture)
+        addresses = range(first, last + 1)
+        self.tree.delete(*self.tree.get_children())
+        self.probed = 0
+        self.total = len(addresses) * len(ports)
+        self.progress.config(maximum=self.total, value=0)
+        functions = None if self.functions_var.get() else ()
+        options = {} if functions is None else {"functions": functions}
+        self.run = DiscoveryRun(self.links, addresses, on_event=self.on_event,
+                                full_reprobe=self.full_reprobe_var.get() or None, **options).start()
+        self.status_var.set(f"扫描中，首轮超时 {probe_timeout(baudrate) * 1000:.1f}ms")
+        self.start_button.config(text="停止", style="TButton")
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def on_event(self, port, event, data):
+        """扫描线程的进度事件，转交界面线程处理"""
+        self.events.put((port, event, data))
+
+    def refresh(self):
+        """处理扫描进度（在界面线程中运行）"""
+        while True:
+            try:
+                port, event, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event == "probe":
+                index, slave = data
+                if index == 0:
+                    self.probed += 1
+            elif event in ("found", "functions"):
+                self.show_slave(data)
+            elif event == "error":
+                self.status_var.set(f"{port} 扫描失败: {data}")
+        self.progress.config(value=self.probed)
+        if self.run.running():
+            self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+            return
+        self.refresh_timer = None
+        run = self.run.join()
+        self.run = None
+        self.close_links()
+        self.start_button.config(text="扫描", style="Accent.TButton")
+        if not run.errors:
+            self.status_var.set(f"发现从站 {len(run.slaves())} 个, 用时 {run.elapsed:.2f}s")
+
+    def show_slave(self, info):
+        """在结果表中添加或更新一个从站"""
+        item = f"{info.port}:{info.slave}"
+        functions = info.summary().partition("功能码 ")[2]
+        values = (info.port, info.slave, f"{info.latency * 1000:.1f}", functions)
+        if self.tree.exists(item):
+            self.tree.item(item, values=values)
+        else:
+            self.tree.insert("", tk.END, iid=item, values=values)
+
+    def use_selected(self, event=None):
+        """把选中的从站地址和串口填入主界面"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        port, slave = self.tree.item(selection[0], "values")[:2]
+        app = self.app
+        if not app.serial_status:
+            app.com_port_var.set(port)
+        if app.slave_address_base_var.get() == "HEX":
+            app.slave_address_var.set(f"{int(slave):02X}")
+        else:
+            app.slave_address_var.set(str(slave))
+        self.status_var.set(f"已填入 {port} 从站{slave}")
+
+    def set_capture(self, capture):
+        """开启（capture为抓包入口）或关闭扫描串口的抓包"""
+        for port, link in self.links.items():
+            link.capture = capture.channel(port, LINK_MODBUS_RTU) if capture is not None else None
+
+    def close_links(self):
+        """关闭扫描用的串口"""
+        self.app.remove_capture_listener(self.set_capture)
+        for link in self.links.values():
+            try:
+                link.close()
+            except Exception:
+                pass
+        self.links = {}
+
+    def on_closing(self):
+        """窗口关闭事件"""
+        if self.refresh_timer is not None:
+            self.window.after_cancel(self.refresh_timer)
+        if self.run is not None:
+            self.run.stop()
+            self.run.join(1.0)
+            self.run = None
+        self.close_links()
+        self.window.destroy()
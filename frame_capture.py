@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+报文抓包文件（不依赖tkinter）
+把收发的每一帧Modbus RTU/TCP报文和CAN报文追加到紧凑的二进制文件：每条记录包含纳秒时间戳、方向、通道号和原始字节。
+I/O线程只在内存块中追加记录（加锁后打包，约1微秒），写满的块由后台线程写盘；文件按大小轮转，
+关闭时在文件末尾写入按时间的块索引和通道表，读取时可按时间直接定位；没有索引的文件（如异常退出）顺序扫描读取。
+读取使用内存映射，不逐条调用read
+
+文件格式（小端）：
+    文件头   MAGIC(8) 版本(u16) 标志(u16) 创建时间ns(i64)
+    记录     时间戳ns(i64) 类型(u8) 通道号(u8) 长度(u16) 数据
+             类型：0发送 1接收 0xFF通道定义（数据为 链路类型(u8) + UTF-8通道名）
+    索引     每块一项：块内最早时间戳ns(i64) 文件偏移(u64)
+    通道表   通道号(u8) 链路类型(u8) 名称长度(u16) 名称
+    文件尾   索引偏移(u64) 索引项数(u32) 通道表偏移(u64) 通道数(u32) INDEX_MAGIC(8)
+"""
+
+import bisect
+import collections
+import datetime
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"TMCAPTR\x00"
+INDEX_MAGIC = b"TMCAPIDX"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sHHq")
+RECORD_HEADER = struct.Struct("<qBBH")
+INDEX_ENTRY = struct.Struct("<qQ")
+CHANNEL_ENTRY = struct.Struct("<BBH")
+TRAILER = struct.Struct("<QIQI8s")
+
+# 记录类型
+DIRECTION_TX = 0
+DIRECTION_RX = 1
+RECORD_CHANNEL = 0xFF
+DIRECTION_NAMES = {DIRECTION_TX: "TX", DIRECTION_RX: "RX"}
+
+# 链路类型
+LINK_MODBUS_RTU = 1
+LINK_MODBUS_TCP = 2
+LINK_CAN = 3
+LINK_NAMES = {LINK_MODBUS_RTU: "modbus_rtu", LINK_MODBUS_TCP: "modbus_tcp", LINK_CAN: "can"}
+
+MAX_CHANNELS = 255
+MAX_FRAME_LENGTH = 0xFFFF
+
+DEFAULT_BLOCK_SIZE = 256 * 1024           # 内存块大小，写满后交给后台线程写盘
+DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024  # 单个文件上限，超过后轮转
+DEFAULT_MAX_FILES = 20                    # 目录中保留的同前缀文件数（含之前运行留下的），超过后删除最旧的（0为不限）
+DEFAULT_FLUSH_INTERVAL = 1.0              # 未写满的块最长多久写盘一次（秒）
+MAX_PENDING_BLOCKS = 64                   # 待写盘的块数上限，磁盘跟不上时丢弃新记录而不阻塞I/O线程
+FILE_SUFFIX = ".tmcap"
+
+
+class CaptureRecord:
+    """一条抓包记录"""
+
+    __slots__ = ("timestamp", "direction", "channel", "data")
+
+    def __init__(self, timestamp, direction, channel, data):
+        self.timestamp = timestamp  # 纳秒（Unix时间）
+        self.direction = direction
+        self.channel = channel
+        self.data = data
+
+
+class CaptureChannel:
+    """一个端口/通道的抓包入口，链路在收发时调用tx/rx"""
+
+    __slots__ = ("writer", "channel_id", "name", "link_type")
+
+    def __init__(self, writer, channel_id, name, link_type):
+        self.writer = writer
+        self.channel_id = channel_id
+        self.name = name
+        self.link_type = link_type
+
+    def tx(self, data, timestamp=None):
+        """记录发送的一帧"""
+        self.writer.record(self.channel_id, DIRECTION_TX, data, timestamp)
+
+    def rx(self, data, timestamp=None):
+        """记录接收的一帧"""
+        if data:
+            self.writer.record(self.channel_id, DIRECTION_RX, data, timestamp)
+
+
+class CaptureTee:
+    """把同一帧交给多个抓包写入器（如抓包文件和实时pcapng），时间戳只取一次"""
+
+    def __init__(self, writers):
+        self.writers = list(writers)
+
+    def channel(self, name, link_type):
+        """在每个抓包入口注册同名通道"""
+        return _TeeChannel([writer.channel(name, link_type) for writer in self.writers], name, link_type)
+
+
+class _TeeChannel:
+    __slots__ = ("channels", "name", "link_type")
+
+    def __init__(self, channels, name, link_type):
+        self.channels = channels
+        self.name = name
+        self.link_type = link_type
+
+    def tx(self, data, timestamp=None):
+        """记录发送帧到每个抓包入口（时间戳相同）"""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        for channel in self.channels:
+            channel.tx(data, timestamp)
+
+    def rx(self, data, timestamp=None):
+        """记录接收帧到每个抓包入口（时间戳相同）"""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        for channel in self.channels:
+            channel.rx(data, timestamp)
+
+
+def tee_captures(writers):
+    """多个写入器合并为一个抓包入口：没有时返回None，只有一个时返回它本身"""
+    if not writers:
+        return None
+    if len(writers) == 1:
+        return writers[0]
+    return CaptureTee(writers)
+
+
+def _channel_record(channel_id, link_type, name, timestamp):
+    payload = bytes((link_type,)) + name.encode("utf-8")
+    return RECORD_HEADER.pack(timestamp, RECORD_CHANNEL, channel_id, len(payload)) + payload
+
+
+class CaptureWriter:
+    """抓包写入器：多个I/O线程共用，记录追加到内存块，后台线程写盘和轮转文件"""
+
+    def __init__(self, directory, prefix="capture", max_file_size=DEFAULT_MAX_FILE_SIZE, max_files=DEFAULT_MAX_FILES,
+                 block_size=DEFAULT_BLOCK_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._buffer = bytearray()
+        self._buffer_records = 0
+        self._block_ts = 0
+        self._pending = collections.deque()  # (块内最早时间戳, 数据, 是否可丢弃)
+        self._writing = False
+        self._channels = {}  # 通道名 -> CaptureChannel
+        self._closed = False
+
+        # 以下只在写盘线程中访问
+        self._file = None
+        self._file_size = 0
+        self._index = []
+        # 保留的文件（含目录中之前运行留下的同前缀文件），文件名含时间，按名称排序即按时间顺序
+        pattern = f"{glob.escape(prefix)}_*{FILE_SUFFIX}"
+        self.files = sorted(glob.glob(os.path.join(glob.escape(directory), pattern)))
+        self._sequence = 0
+        self.path = None
+        self._prune_files()
+
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="frame-capture", daemon=True)
+        self._thread.start()
+
+    def channel(self, name, link_type):
+        """取得（或登记）一个通道，同名通道返回同一个CaptureChannel"""
+        with self._lock:
+            channel = self._channels.get(name)
+            if channel is not None:
+                return channel
+            if len(self._channels) >= MAX_CHANNELS:
+                raise ValueError(f"抓包通道数超过上限{MAX_CHANNELS}")
+            channel = self._channels[name] = CaptureChannel(self, len(self._channels), name, link_type)
+            # 通道定义记录不可丢弃，保证之后的记录都能对应到通道名
+            self._seal()
+            timestamp = time.time_ns()
+            self._pending.append((timestamp, _channel_record(channel.channel_id, link_type, name, timestamp), False))
+            self._wakeup.notify()
+            return channel
+
+    def record(self, channel_id, direction, data, timestamp=None):
+        """追加一条记录（任意线程），只在内存中打包，不做磁盘I/O"""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        length = len(data)
+        if length > MAX_FRAME_LENGTH:
+            data = data[:MAX_FRAME_LENGTH]
+            length = MAX_FRAME_LENGTH
+        header = RECORD_HEADER.pack(timestamp, direction, channel_id, length)
+        with self._lock:
+            if self._closed:
+                # 关闭后仍持有通道的链路：记录直接丢弃，不再积累在内存中
+                return
+            buffer = self._buffer
+            if not buffer or timestamp < self._block_ts:
+                self._block_ts = timestamp
+            buffer += header
+            buffer += data
+            self._buffer_records += 1
+            self.records += 1
+            if len(buffer) >= self.block_size:
+                self._seal()
+                self._wakeup.notify()
+
+    def _seal(self):
+        """把当前内存块移到待写盘队列（持有锁时调用）"""
+        if not self._buffer:
+            return
+        if sum(1 for entry in self._pending if entry[2]) >= MAX_PENDING_BLOCKS:
+            # 磁盘跟不上：丢弃这一块，不阻塞调用者
+            self.dropped += self._buffer_records
+        else:
+            self._pending.append((self._block_ts, bytes(self._buffer), True))
+        self._buffer = bytearray()
+        self._buffer_records = 0
+
+    def flush(self, timeout=5.0):
+        """把内存中的记录全部写盘（等待写盘线程完成）"""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._seal()
+            self._wakeup.notify()
+            while (self._pending or self._writing) and time.monotonic() < deadline:
+                self._wakeup.wait(0.05)
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        """写盘剩余记录，写入索引并关闭文件"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._seal()
+            self._wakeup.notify()
+        self._thread.join()
+
+    def _run(self):
+        """写盘线程"""
+        while True:
+            with self._lock:
+                if not self._pending and not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                    if not self._pending:
+                        # 定时把未写满的块写盘，异常退出时最多丢失flush_interval内的记录
+                        self._seal()
+                blocks = list(self._pending)
+                self._pending.clear()
+                closed = self._closed
+                self._writing = bool(blocks)
+            try:
+                for first_ts, data, _ in blocks:
+                    self._write_block(first_ts, data)
+            finally:
+                with self._lock:
+                    self._writing = False
+                    self._wakeup.notify_all()
+            if closed:
+                with self._lock:
+                    remaining = bool(self._pending)
+                if not remaining:
+                    self._close_file()
+                    return
+
+    def _write_block(self, first_ts, data):
+        """写入一个记录块并登记索引，超过文件大小时先轮换文件"""
+        if self._file is None or (self._file_size + len(data) > self.max_file_size and self._index):
+            self._rotate()
+        self._index.append((first_ts, self._file_size))
+        self._file.write(data)
+        self._file_size += len(data)
+        self.bytes_written += len(data)
+
+    def _rotate(self):
+        """关闭当前文件，打开新文件并写入文件头和全部通道定义"""
+        self._close_file()
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(self.directory, f"{self.prefix}_{stamp}_{self._sequence:04d}{FILE_SUFFIX}")
+        self._sequence += 1
+        self._file = open(self.path, "wb")
+        self.files.append(self.path)
+        now = time.time_ns()
+        header = FILE_HEADER.pack(MAGIC, VERSION, 0, now)
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            header += _channel_record(channel.channel_id, channel.link_type, channel.name, now)
+        self._file.write(header)
+        self._file_size = len(header)
+        self._index = []
+        self._prune_files()
+
+    def _prune_files(self):
+        """保留的文件超过max_files时从最旧的开始删除"""
+        while self.max_files and len(self.files) > self.max_files:
+            oldest = self.files.pop(0)
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
+
+    def _close_file(self):
+        """写入索引、通道表和文件尾后关闭当前文件"""
+        f = self._file
+        if f is None:
+            return
+        index_offset = self._file_size
+        index = b"".join(INDEX_ENTRY.pack(first_ts, offset) for first_ts, offset in self._index)
+        with self._lock:
+            channels = list(self._channels.values())
+        table = b"".join(CHANNEL_ENTRY.pack(channel.channel_id, channel.link_type, len(name)) + name
+                         for channel, name in ((channel, channel.name.encode("utf-8")) for channel in channels))
+        f.write(index)
+        f.write(table)
+        f.write(TRAILER.pack(index_offset, len(self._index), index_offset + len(index), len(channels), INDEX_MAGIC))
+        f.close()
+        self._file = None
+
+    def stats(self):
+        """记录数、丢弃数和写盘字节数"""
+        return {"records": self.records, "dropped": self.dropped, "bytes": self.bytes_written,
+                "files": len(self.files), "path": self.path}
+
+
+class CaptureReader:
+    """读取抓包文件；有索引时按时间定位，没有索引时顺序扫描"""
+
+    def __init__(self, path):
+        self.path = path
+        self.channels = {}  # 通道号 -> (通道名, 链路类型)
+        self.index = []     # [(块内最早时间戳, 偏移)]
+        with open(path, "rb") as f:
+            header = f.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size:
+                raise ValueError(f"不是抓包文件: {path}")
+            magic, self.version, self.flags, self.created = FILE_HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ValueError(f"不是抓包文件: {path}")
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            self.data_end = size
+            if size >= FILE_HEADER.size + TRAILER.size:
+                f.seek(size - TRAILER.size)
+                index_offset, index_count, table_offset, channel_count, magic = TRAILER.unpack(f.read(TRAILER.size))
+                if magic == INDEX_MAGIC:
+                    self.data_end = index_offset
+                    f.seek(index_offset)
+                    raw = f.read(index_count * INDEX_ENTRY.size)
+                    self.index = [INDEX_ENTRY.unpack_from(raw, i * INDEX_ENTRY.size) for i in range(index_count)]
+                    f.seek(table_offset)
+                    for _ in range(channel_count):
+                        channel_id, link_type, length = CHANNEL_ENTRY.unpack(f.read(CHANNEL_ENTRY.size))
+                        self.channels[channel_id] = (f.read(length).decode("utf-8", "replace"), link_type)
+
+    @property
+    def indexed(self):
+        """文件是否带索引（正常关闭）"""
+        return bool(self.index)
+
+    def channel_name(self, channel_id):
+        """通道号对应的通道名"""
+        return self.channels.get(channel_id, (f"#{channel_id}", 0))[0]
+
+    def records(self, start=None, end=None):
+        """按时间范围（纳秒，含两端）迭代记录；通道定义记录只更新channels，不返回"""
+        offset = FILE_HEADER.size
+        stop = self.data_end
+        if self.index:
+            times = [first_ts for first_ts, _ in self.index]
+            if start is not None:
+                position = bisect.bisect_right(times, start) - 1
+                if position > 0:
+                    offset = self.index[position][1]
+            if end is not None:
+                position = bisect.bisect_right(times, end)
+                if position < len(self.index):
+                    stop = self.index[position][1]
+        return self._scan(offset, stop, start, end)
+
+    def _scan(self, offset, stop, start=None, end=None):
+        """逐条读取[offset, stop)内的记录（通道记录登记到channels），按时间范围过滤"""
+        size = RECORD_HEADER.size
+        unpack = RECORD_HEADER.unpack_from
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            # 异常退出时最后一条记录可能不完整，只读到映射范围内完整的记录为止
+            stop = min(stop, len(view))
+            while offset + size <= stop:
+                timestamp, kind, channel, length = unpack(view, offset)
+                begin = offset + size
+                offset = begin + length
+                if offset > stop:
+                    break
+                if kind == RECORD_CHANNEL:
+                    self.channels[channel] = (view[begin + 1:offset].decode("utf-8", "replace"), view[begin])
+                    continue
+                if start is not None and timestamp < start:
+                    continue
+                if end is not None and timestamp > end:
+                    continue
+                yield CaptureRecord(timestamp, kind, channel, view[begin:offset])
+
+    def time_range(self):
+        """文件中第一条和最后一条记录的时间戳（纳秒），没有记录时返回(None, None)；有索引时只扫描最后一块"""
+        first = last = None
+        for record in self._scan(FILE_HEADER.size, self.data_end):
+            first = record.timestamp
+            break
+        offset = self.index[-1][1] if self.index else FILE_HEADER.size
+        for record in self._scan(offset, self.data_end):
+            last = record.timestamp if last is None else max(last, record.timestamp)
+        return first, last
+
+
+def capture_files(paths):
+    """展开目录和通配符，返回按文件名（即时间）排序的抓包文件列表"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*" + FILE_SUFFIX)))
+        elif any(c in path for c in "*?["):
+            files.extend(glob.glob(path))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+
+def read_captures(paths, start=None, end=None):
+    """依次读取多个抓包文件，返回(CaptureReader, CaptureRecord)迭代器"""
+    for path in capture_files(paths):
+        reader = CaptureReader(path)
+        for record in reader.records(start, end):
+            yield reader, record
+
+
+def captures_time_range(paths):
+    """多个抓包文件的时间范围（纳秒），没有记录时返回(None, None)"""
+    first = last = None
+    for path in capture_files(paths):
+        file_first, file_last = CaptureReader(path).time_range()
+        if file_first is None:
+            continue
+        first = file_first if first is None else min(first, file_first)
+        last = file_last if last is None else max(last, file_last)
+    return first, last
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓包转换为pcapng（不依赖tkinter），供Wireshark分析
+每个通道一个接口（IDB），时间戳精度为纳秒，保留抓包时的原始时间；方向写入EPB的epb_flags（发送为出站、接收为入站）。
+    Modbus RTU  默认为LINKTYPE_USER0（147），RTU帧原样写入；在Wireshark的 首选项 > Protocols > DLT_USER 中
+                把DLT 147的payload协议设为mbrtu即可解析。也可以封装为TCP（原始IPv4），按"RTU over TCP"解析
+    Modbus TCP  封装为到502端口的TCP（原始IPv4），Wireshark自动按mbtcp解析
+    CAN         LINKTYPE_CAN_SOCKETCAN（227），29位ID带扩展帧标志
+export_pcapng逐条读取、逐条写出，内存占用与抓包文件大小无关；PcapngLiveWriter在轮询时持续写出pcapng，
+可以用 tail -f 或命名管道交给 wireshark -k -i - 实时查看
+"""
+
+import collections
+import struct
+import threading
+import time
+
+from frame_capture import (
+    CaptureChannel, read_captures, DIRECTION_TX, LINK_MODBUS_RTU, LINK_MODBUS_TCP, LINK_CAN, MAX_CHANNELS,
+)
+
+# 链路层类型
+LINKTYPE_RAW = 101                # 原始IP包（TCP封装）
+LINKTYPE_USER0 = 147              # 用户自定义（RTU帧原样）
+LINKTYPE_CAN_SOCKETCAN = 227
+
+# RTU封装方式
+ENCAP_USER = "user"
+ENCAP_TCP = "tcp"
+
+MODBUS_TCP_PORT = 502
+RTU_OVER_TCP_PORT = 5020          # RTU over TCP封装的服务端端口（在Wireshark中对该端口"解码为"mbrtu）
+CLIENT_PORT_BASE = 49152
+
+SNAPLEN = 0xFFFF
+
+BLOCK_SHB = 0x0A0D0D0A
+BLOCK_IDB = 0x00000001
+BLOCK_EPB = 0x00000006
+BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+OPT_END = 0
+OPT_SHB_USERAPPL = 4
+OPT_IF_NAME = 2
+OPT_IF_TSRESOL = 9
+OPT_EPB_FLAGS = 2
+EPB_INBOUND = 1
+EPB_OUTBOUND = 2
+
+CAN_EFF_FLAG = 0x80000000
+CAN_SFF_MAX = 0x7FF
+CAN_MAX_DLEN = 8
+CANFD_MAX_DLEN = 64
+CANFD_FDF = 0x04
+
+APPLICATION = "testmodbuscharge"
+
+DEFAULT_LIVE_FLUSH_INTERVAL = 0.2   # 实时模式的写出间隔（秒）
+DEFAULT_LIVE_MAX_PENDING = 100000   # 实时模式待写出记录上限，超过后丢弃新记录而不阻塞I/O线程
+
+_IPV4_HEADER = struct.Struct(">BBHHHBBH4s4s")
+_TCP_HEADER = struct.Struct(">HHIIHHHH")
+_EPB_HEADER = struct.Struct("<IIIIIII")
+
+
+def _option(code, value):
+    """pcapng选项，值按4字节对齐填充"""
+    return struct.pack("<HH", code, len(value)) + value + b"\x00" * (-len(value) % 4)
+
+
+def _block(block_type, body):
+    length = 12 + len(body)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+
+def section_header():
+    """节头块（SHB）"""
+    body = struct.pack("<IHHq", BYTE_ORDER_MAGIC, 1, 0, -1)
+    body += _option(OPT_SHB_USERAPPL, APPLICATION.encode("utf-8")) + _option(OPT_END, b"")
+    return _block(BLOCK_SHB, body)
+
+
+def interface_description(linktype, name):
+    """接口描述块（IDB），时间戳精度为纳秒"""
+    body = struct.pack("<HHI", linktype, 0, SNAPLEN)
+    body += _option(OPT_IF_NAME, name.encode("utf-8")) + _option(OPT_IF_TSRESOL, bytes((9,))) + _option(OPT_END, b"")
+    return _block(BLOCK_IDB, body)
+
+
+def enhanced_packet(interface_id, timestamp, data, direction):
+    """增强分组块（EPB），timestamp为纳秒"""
+    flags = EPB_OUTBOUND if direction == DIRECTION_TX else EPB_INBOUND
+    padding = -len(data) % 4
+    length = _EPB_HEADER.size + len(data) + padding + 12 + 4
+    return b"".join((
+        _EPB_HEADER.pack(BLOCK_EPB, length, interface_id, timestamp >> 32, timestamp & 0xFFFFFFFF,
+                         len(data), len(data)),
+        data, b"\x00" * padding,
+        struct.pack("<HHIHHI", OPT_EPB_FLAGS, 4, flags, OPT_END, 0, length),
+    ))
+
+
+def socketcan_frame(frame):
+    """抓包中的CAN帧（ID 4字节大端 + 数据）转换为SocketCAN格式"""
+    can_id = int.from_bytes(frame[:4], "big")
+    data = bytes(frame[4:4 + CANFD_MAX_DLEN])
+    if can_id > CAN_SFF_MAX:
+        can_id = (can_id & 0x1FFFFFFF) | CAN_EFF_FLAG
+    flags = CANFD_FDF if len(data) > CAN_MAX_DLEN else 0
+    return struct.pack(">IBBBB", can_id, len(data), flags, 0, 0) + data
+
+
+def _checksum(header):
+    total = sum(struct.unpack(f">{len(header) // 2}H", header))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+class _TcpStream:
+    """为一个通道合成的TCP连接：主站（发送方向）为客户端，从站为服务端，序号按载荷累加以便Wireshark重组"""
+
+    def __init__(self, index, server_port):
+        # 每个通道使用不同的地址，Wireshark中按通道区分会话
+        self.client = bytes((10, 0, index >> 8 & 0xFF, index & 0xFF))
+        self.server = bytes((10, 1, index >> 8 & 0xFF, index & 0xFF))
+        self.client_port = CLIENT_PORT_BASE + index % 16384
+        self.server_port = server_port
+        self.client_seq = 1
+        self.server_seq = 1
+        self.ip_id = 0
+
+    def packet(self, direction, payload):
+        """生成一个IPv4/TCP包（TCP校验和为0，Wireshark默认不校验）"""
+        if direction == DIRECTION_TX:
+            src, dst, sport, dport = self.client, self.server, self.client_port, self.server_port
+            seq, ack = self.client_seq, self.server_seq
+            self.client_seq = (self.client_seq + len(payload)) & 0xFFFFFFFF
+        else:
+            src, dst, sport, dport = self.server, self.client, self.server_port, self.client_port
+            seq, ack = self.server_seq, self.client_seq
+            self.server_seq = (self.server_seq + len(payload)) & 0xFFFFFFFF
+        tcp = _TCP_HEADER.pack(sport, dport, seq, ack, (5 << 12) | 0x18, 0xFFFF, 0, 0)
+        self.ip_id = (self.ip_id + 1) & 0xFFFF
+        total = _IPV4_HEADER.size + len(tcp) + len(payload)
+        ip = _IPV4_HEADER.pack(0x45, 0, total, self.ip_id, 0x4000, 64, 6, 0, src, dst)
+        ip = ip[:10] + struct.pack(">H", _checksum(ip)) + ip[12:]
+        return ip + tcp + payload
+
+
+class PcapngEncoder:
+    """把抓包记录编码为pcapng块；首次出现的通道先输出接口描述块"""
+
+    def __init__(self, rtu_encapsulation=ENCAP_USER, rtu_port=RTU_OVER_TCP_PORT):
+        if rtu_encapsulation not in (ENCAP_USER, ENCAP_TCP):
+            raise ValueError(f"未知的RTU封装方式: {rtu_encapsulation}")
+        self.rtu_encapsulation = rtu_encapsulation
+        self.rtu_port = rtu_port
+        self.interfaces = {}  # (通道名, 链路类型) -> (接口号, 链路层类型, TCP流)
+
+    def header(self):
+        """文件开头的节头块"""
+        return section_header()
+
+    def encode(self, name, link_type, direction, timestamp, data):
+        """编码一帧，返回bytes（可能包含新接口的IDB）"""
+        key = (name, link_type)
+        interface = self.interfaces.get(key)
+        prefix = b""
+        if interface is None:
+            interface, prefix = self._add_interface(key)
+        interface_id, linktype, stream = interface
+        if stream is not None:
+            payload = stream.packet(direction, bytes(data))
+        elif linktype == LINKTYPE_CAN_SOCKETCAN:
+            payload = socketcan_frame(data)
+        else:
+            payload = bytes(data)
+        return prefix + enhanced_packet(interface_id, timestamp, payload, direction)
+
+    def _add_interface(self, key):
+        """为一个(通道名, 链路类型)新建接口，返回(接口信息, 接口描述块)"""
+        name, link_type = key
+        interface_id = len(self.interfaces)
+        stream = None
+        if link_type == LINK_CAN:
+            linktype = LINKTYPE_CAN_SOCKETCAN
+        elif link_type == LINK_MODBUS_TCP:
+            linktype, stream = LINKTYPE_RAW, _TcpStream(interface_id, MODBUS_TCP_PORT)
+        elif link_type == LINK_MODBUS_RTU and self.rtu_encapsulation == ENCAP_TCP:
+            linktype, stream = LINKTYPE_RAW, _TcpStream(interface_id, self.rtu_port)
+        else:
+            linktype = LINKTYPE_USER0
+        interface = self.interfaces[key] = (interface_id, linktype, stream)
+        return interface, interface_description(linktype, name)
+
+
+def export_pcapng(paths, output, start=None, end=None, channels=None, rtu_encapsulation=ENCAP_USER,
+                  rtu_port=RTU_OVER_TCP_PORT):
+    """把抓包文件转换为pcapng（流式处理，内存占用与文件大小无关），返回导出的帧数"""
+    encoder = PcapngEncoder(rtu_encapsulation, rtu_port)
+    count = 0
+    with open(output, "wb", buffering=1024 * 1024) as f:
+        f.write(encoder.header())
+        for reader, record in read_captures(paths, start, end):
+            name, link_type = reader.channels.get(record.channel, (f"#{record.channel}", 0))
+            if channels and name not in channels:
+                continue
+            f.write(encoder.encode(name, link_type, record.direction, record.timestamp, record.data))
+            count += 1
+    return count
+
+
+class PcapngLiveWriter:
+    """实时pcapng写出：接口与CaptureWriter相同（channel(名称, 链路类型)返回带tx/rx的通道），
+    I/O线程只把记录放入内存队列，后台线程定时编码、写出并flush，读取方可以边写边看。
+    文件在后台线程中打开，命名管道在Wireshark连接前不会阻塞轮询"""
+
+    def __init__(self, path, rtu_encapsulation=ENCAP_USER, rtu_port=RTU_OVER_TCP_PORT,
+                 flush_interval=DEFAULT_LIVE_FLUSH_INTERVAL, max_pending=DEFAULT_LIVE_MAX_PENDING):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.encoder = PcapngEncoder(rtu_encapsulation, rtu_port)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = collections.deque()
+        self._channels = {}  # 通道名 -> CaptureChannel
+        self._names = []     # 通道号 -> (通道名, 链路类型)
+        self._closed = False
+        self.records = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._run, name="pcapng-live", daemon=True)
+        self._thread.start()
+
+    def channel(self, name, link_type):
+        """取得（或登记）一个通道"""
+        with self._lock:
+            channel = self._channels.get(name)
+            if channel is None:
+                if len(self._channels) >= MAX_CHANNELS:
+                    raise ValueError(f"抓包通道数超过上限{MAX_CHANNELS}")
+                channel = self._channels[name] = CaptureChannel(self, len(self._names), name, link_type)
+                self._names.append((name, link_type))
+            return channel
+
+    def record(self, channel_id, direction, data, timestamp=None):
+        """追加一条记录（任意线程），不做编码和磁盘I/O"""
+        if timestamp is None:
+            timestamp = time.time_ns()
+        with self._lock:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append((channel_id, direction, timestamp, bytes(data)))
+            self.records += 1
+
+    def close(self):
+        """写出剩余记录并关闭文件"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join()
+
+    def stats(self):
+        """记录数、丢弃数、写出字节数和写出失败的原因（没有失败时为None）"""
+        return {"records": self.records, "dropped": self.dropped, "bytes": self.bytes_written, "path": self.path,
+                "error": self.error}
+
+    def _run(self):
+        """写出线程"""
+        try:
+            f = open(self.path, "wb")
+        except OSError as e:
+            self._fail(e)
+            return
+        try:
+            f.write(self.encoder.header())
+            while True:
+                with self._lock:
+                    if not self._closed:
+                        self._wakeup.wait(self.flush_interval)
+                    records = self._pending
+                    self._pending = collections.deque()
+                    names = list(self._names)
+                    closed = self._closed
+                if records:
+                    data = b"".join(self.encoder.encode(*names[channel_id], direction, timestamp, frame)
+                                    for channel_id, direction, timestamp, frame in records)
+                    f.write(data)
+                    f.flush()
+                    self.bytes_written += len(data)
+                if closed:
+                    return
+        except OSError as e:
+            # 读取方退出（管道断开）或磁盘错误：停止写出，之后的记录计为丢弃
+            self._fail(e)
+        finally:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    def _fail(self, error):
+        """写出失败：停止写出并丢弃尚未写出的帧"""
+        self.error = error
+        with self._lock:
+            self._closed = True
+            self.dropped += len(self._pending)
+            self._pending.clear()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抓包回放（不依赖tkinter）
+ReplayPlayer按原始时间间隔、N倍速或最快速度把抓包文件中的帧交给ReplayDecoder，支持暂停、变速和跳转；
+ReplayDecoder把Modbus请求和响应配对成与实时轮询相同的ModbusResult（解码、统计、显示走同一条路径），
+CAN帧拆分为CAN ID和数据交给27930显示；
+RecordedResponder用录制的请求/响应对代替模拟器映像，在pty或TCP上扮演现场设备，复现现场的响应内容、延迟和超时
+"""
+
+import struct
+import threading
+import time
+
+from frame_capture import (
+    read_captures, captures_time_range, DIRECTION_TX, LINK_MODBUS_RTU, LINK_MODBUS_TCP, LINK_CAN,
+)
+from gbt27930 import unpack_can_frame
+from modbus_crc import check_frame
+from modbus_frame import (
+    ModbusRequest, ModbusResult, READ_FUNCTIONS, WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER,
+    WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS, ModbusError, rtu_frame,
+)
+from modbus_tcp import MBAP_HEADER, decode_pdu_result
+
+SPEED_MAX = 0                      # 速度为0表示不等待，按最快速度回放
+MAX_RESPONSES_PER_REQUEST = 10000  # 每种请求最多保存的录制响应数（超过后只保留最早的，内存有界）
+
+_ADDRESS_COUNT = struct.Struct(">HH")
+
+
+class ReplayTag:
+    """回放请求的标记（ModbusRequest.tag），显示时补充显示录制的请求帧"""
+
+    __slots__ = ("channel",)
+
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class CanReplayFrame:
+    """回放的一帧CAN报文"""
+
+    __slots__ = ("timestamp", "channel", "direction", "can_id", "data")
+
+    def __init__(self, timestamp, channel, direction, can_id, data):
+        self.timestamp = timestamp  # 秒（Unix时间）
+        self.channel = channel
+        self.direction = direction
+        self.can_id = can_id
+        self.data = data
+
+
+def parse_request_pdu(slave, pdu, frame=None, tag=None):
+    """从请求PDU还原ModbusRequest，不支持的功能码或格式错误时返回None"""
+    if len(pdu) < 5:
+        return None
+    function_code = pdu[0]
+    address, quantity = _ADDRESS_COUNT.unpack_from(pdu, 1)
+    if function_code in (WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER):
+        quantity = 1
+    elif function_code not in READ_FUNCTIONS + (WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS):
+        return None
+    if frame is None:
+        frame = rtu_frame(slave, pdu)
+    return ModbusRequest(slave, function_code, address, quantity, frame, tag)
+
+
+class ReplayDecoder:
+    """把回放的帧配对解码：on_result(ModbusResult)，on_can(CanReplayFrame)"""
+
+    def __init__(self, on_result=None, on_can=None):
+        self.on_result = on_result
+        self.on_can = on_can
+        self.pending = {}  # 通道名 -> RTU为(请求, 发送时间ns)；TCP为{事务号: (请求, 发送时间ns)}
+        self.last_request = None   # 最近一帧Modbus RTU请求和响应（供解析窗口查看）
+        self.last_response = None
+        self.frames = 0
+        self.results = 0
+        self.unmatched = 0  # 没有对应请求的响应（回放起点之前发出的请求、迟到的响应等）
+        self.skipped = 0    # 无法解析的帧
+
+    def reset(self):
+        """跳转后丢弃未配对的请求"""
+        self.pending.clear()
+
+    def feed(self, name, link_type, record):
+        """处理一条抓包记录"""
+        self.frames += 1
+        if link_type == LINK_MODBUS_RTU:
+            self._feed_rtu(name, record)
+        elif link_type == LINK_MODBUS_TCP:
+            self._feed_tcp(name, record)
+        elif link_type == LINK_CAN:
+            self._feed_can(name, record)
+        else:
+            self.skipped += 1
+
+    def flush(self):
+        """回放结束：未收到响应的请求按超时处理"""
+        for name, pending in list(self.pending.items()):
+            entries = pending.values() if isinstance(pending, dict) else [pending]
+            for request, sent in entries:
+                self._emit(request, b"", sent, sent, name)
+        self.pending.clear()
+
+    def _emit(self, request, response, sent, received, name):
+        """生成一个事务结果（response为空时为超时）"""
+        result = ModbusResult(request, response, elapsed=(received - sent) / 1e9, timestamp=sent / 1e9, port=name)
+        result.decode()
+        self.results += 1
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def _feed_rtu(self, name, record):
+        """处理一条RTU记录：请求帧和其后的响应帧配对"""
+        frame = record.data
+        if record.direction == DIRECTION_TX:
+            self.last_request = frame
+            pending = self.pending.pop(name, None)
+            if pending is not None:
+                # 上一个请求没有响应：超时
+                self._emit(pending[0], b"", pending[1], record.timestamp, name)
+            request = None
+            if len(frame) >= 8 and check_frame(frame):
+                request = parse_request_pdu(frame[0], frame[1:-2], frame, ReplayTag(name))
+            if request is None:
+                self.skipped += 1
+                return
+            self.pending[name] = (request, record.timestamp)
+            return
+        self.last_response = frame
+        pending = self.pending.pop(name, None)
+        if pending is None:
+            self.unmatched += 1
+            return
+        self._emit(pending[0], frame, pending[1], record.timestamp, name)
+
+    def _feed_tcp(self, name, record):
+        """处理一条Modbus TCP记录：按事务号配对请求和响应"""
+        data = record.data
+        if len(data) < MBAP_HEADER.size + 1:
+            self.skipped += 1
+            return
+        transaction_id, protocol, length, unit = MBAP_HEADER.unpack_from(data)
+        pdu = data[MBAP_HEADER.size:]
+        pending = self.pending.setdefault(name, {})
+        if record.direction == DIRECTION_TX:
+            # 主站逐个发送请求：发出新请求时仍未收到响应的请求已经超时，按发送顺序在此输出
+            for request, sent in pending.values():
+                self._emit(request, b"", sent, record.timestamp, name)
+            pending.clear()
+            request = parse_request_pdu(unit, pdu, tag=ReplayTag(name))
+            if request is None:
+                self.skipped += 1
+                return
+            pending[transaction_id] = (request, record.timestamp)
+            return
+        entry = pending.pop(transaction_id, None)
+        if entry is None:
+            self.unmatched += 1
+            return
+        request, sent = entry
+        result = ModbusResult(request, data, elapsed=(record.timestamp - sent) / 1e9, timestamp=sent / 1e9, port=name)
+        try:
+            decode_pdu_result(result, pdu)
+        except ModbusError as e:
+            result.error = e
+        self.results += 1
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def _feed_can(self, name, record):
+        """处理一条CAN记录"""
+        try:
+            can_id, data = unpack_can_frame(record.data)
+        except ValueError:
+            self.skipped += 1
+            return
+        if self.on_can is not None:
+            self.on_can(CanReplayFrame(record.timestamp / 1e9, name, record.direction, can_id, data))
+
+
+class ReplayPlayer:
+    """在后台线程中按时间回放抓包文件，speed为倍速（1为原始速度，SPEED_MAX为最快）"""
+
+    def __init__(self, paths, decoder, speed=1.0, start=None, end=None, channels=None, on_finish=None):
+        self.paths = list(paths)
+        self.decoder = decoder
+        self.speed = speed
+        self.start_time = start
+        self.end_time = end
+        self.channels = set(channels) if channels else None
+        self.on_finish = on_finish
+        self.first, self.last = captures_time_range(self.paths)
+        self._cond = threading.Condition()
+        self._paused = False
+        self._stopped = False
+        self._seek_to = None
+        self._anchor = None  # (墙上时间, 录制时间ns)，按它换算每帧的播放时刻
+        self.position = start if start is not None else self.first  # 最近一帧的录制时间ns
+        self.records = 0
+        self.elapsed = 0.0   # 不含暂停的回放用时（秒）
+        self._paused_time = 0.0
+        self.finished = False
+        self._thread = None
+
+    @property
+    def paused(self):
+        """是否已暂停"""
+        return self._paused
+
+    def start(self):
+        """在后台线程中开始回放"""
+        self._thread = threading.Thread(target=self.run, name="frame-replay", daemon=True)
+        self._thread.start()
+        return self
+
+    def pause(self):
+        """暂停回放"""
+        with self._cond:
+            self._paused = True
+            self._cond.notify_all()
+
+    def resume(self):
+        """继续回放，从当前位置重新对齐时间"""
+        with self._cond:
+            self._paused = False
+            self._anchor = None
+            self._cond.notify_all()
+
+    def set_speed(self, speed):
+        """修改倍速（从当前位置起生效）"""
+        with self._cond:
+            self.speed = speed
+            self._anchor = None
+            self._cond.notify_all()
+
+    def seek(self, timestamp):
+        """跳转到录制时间timestamp（纳秒）"""
+        with self._cond:
+            self._seek_to = timestamp
+            self._cond.notify_all()
+
+    def stop(self):
+        """停止回放并等待线程结束"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def join(self, timeout=None):
+        """等待回放线程结束"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def rate(self):
+        """回放速度（帧/秒）"""
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    def run(self):
+        """回放主循环（start()在后台线程中调用，也可以直接调用同步回放）"""
+        start = self.start_time
+        try:
+            while True:
+                restart = self._play(start)
+                if restart is None:
+                    break
+                start = restart
+                self.decoder.reset()
+            if not self._stopped:
+                self.decoder.flush()
+        finally:
+            self.finished = True
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def _play(self, start):
+        """从start起回放，跳转时返回新的起点，结束或停止时返回None"""
+        decoder = self.decoder
+        channels = self.channels
+        began = time.perf_counter()
+        try:
+            for reader, record in read_captures(self.paths, start, self.end_time):
+                seek = self._wait(record.timestamp)
+                if seek is not None:
+                    return seek
+                if self._stopped:
+                    return None
+                name, link_type = reader.channels.get(record.channel, (f"#{record.channel}", 0))
+                if channels is not None and name not in channels:
+                    continue
+                self.position = record.timestamp
+                decoder.feed(name, link_type, record)
+                self.records += 1
+        finally:
+            self.elapsed += time.perf_counter() - began - self._paused_time
+            self._paused_time = 0.0
+        return None
+
+    def _wait(self, timestamp):
+        """等到timestamp的播放时刻，处理暂停、停止和跳转；需要跳转时返回新的起点"""
+        if not self._paused and self._seek_to is None and not self.speed and not self._stopped:
+            return None  # 最快速度：不加锁
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                if self._seek_to is not None:
+                    seek, self._seek_to = self._seek_to, None
+                    self._anchor = None
+                    self.position = seek
+                    return seek
+                if self._paused:
+                    paused = time.perf_counter()
+                    self._cond.wait()
+                    self._paused_time += time.perf_counter() - paused
+                    continue
+                if not self.speed:
+                    return None
+                now = time.perf_counter()
+                if self._anchor is None:
+                    self._anchor = (now, timestamp)
+                delay = self._anchor[0] + (timestamp - self._anchor[1]) / 1e9 / self.speed - now
+                if delay <= 0:
+                    return None
+                self._cond.wait(delay)
+
+
+class RecordedResponder:
+    """用录制的请求/响应对应答请求（与ModbusSlaveSimulator接口相同，可交给PtySlaveServer/TcpSlaveServer）。
+    同一请求的多个录制响应按录制顺序循环使用；录制时超时的请求不应答；没有录制过的请求不应答"""
+
+    def __init__(self, paths, channels=None, latency_scale=1.0, start=None, end=None):
+        self.latency_scale = latency_scale  # 响应延迟为录制延迟乘以该系数（0为立即应答）
+        self.table = {}    # 从站地址+请求PDU -> [(从站地址, 响应PDU, 原始RTU响应帧或None, 延迟秒)]，None为超时
+        self.cursor = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = 0
+        self.answered = 0
+        self.unknown = 0
+        self._load(paths, channels, start, end)
+
+    def _add(self, key, response):
+        """登记key的一个录制响应（None为超时），每个请求最多保留MAX_RESPONSES_PER_REQUEST个"""
+        responses = self.table.setdefault(key, [])
+        if len(responses) < MAX_RESPONSES_PER_REQUEST:
+            responses.append(response)
+
+    def _load(self, paths, channels, start, end):
+        """读取抓包文件，按录制顺序建立请求到响应的表"""
+        pending = {}  # 通道名 -> RTU为(键, 发送时间ns)；TCP为{事务号: (键, 发送时间ns)}
+        for reader, record in read_captures(paths, start, end):
+            name, link_type = reader.channels.get(record.channel, (f"#{record.channel}", 0))
+            if channels and name not in channels:
+                continue
+            data = record.data
+            if link_type == LINK_MODBUS_RTU:
+                if record.direction == DIRECTION_TX:
+                    previous = pending.pop(name, None)
+                    if previous is not None:
+                        self._add(previous[0], None)
+                    if len(data) >= 4 and check_frame(data):
+                        pending[name] = (data[:-2], record.timestamp)
+                else:
+                    previous = pending.pop(name, None)
+                    if previous is not None and len(data) >= 4:
+                        latency = (record.timestamp - previous[1]) / 1e9
+                        self._add(previous[0], (data[0], data[1:-2], data, latency))
+            elif link_type == LINK_MODBUS_TCP and len(data) > MBAP_HEADER.size:
+                transaction_id, protocol, length, unit = MBAP_HEADER.unpack_from(data)
+                key = bytes((unit,)) + data[MBAP_HEADER.size:]
+                transactions = pending.setdefault(name, {})
+                if record.direction == DIRECTION_TX:
+                    # 与RTU相同：发出新请求时仍未应答的请求记为超时，保持录制时的顺序
+                    for previous_key, _ in transactions.values():
+                        self._add(previous_key, None)
+                    transactions.clear()
+                    transactions[transaction_id] = (key, record.timestamp)
+                else:
+                    previous = transactions.pop(transaction_id, None)
+                    if previous is not None:
+                        latency = (record.timestamp - previous[1]) / 1e9
+                        self._add(previous[0], (unit, data[MBAP_HEADER.size:], None, latency))
+        for name, previous in pending.items():
+            for key, _ in (previous.values() if isinstance(previous, dict) else [previous]):
+                self._add(key, None)
+
+    def _next(self, key):
+        """取出key的下一个录制响应，没有录制时返回False"""
+        with self._lock:
+            self.requests += 1
+            responses = self.table.get(key)
+            if not responses:
+                self.unknown += 1
+                self._local.delay = 0.0
+                return False
+            position = self.cursor.get(key, 0)
+            self.cursor[key] = (position + 1) % len(responses)
+            response = responses[position]
+            if response is not None:
+                self.answered += 1
+        self._local.delay = response[3] * self.latency_scale if response is not None else 0.0
+        return response
+
+    def response_delay(self):
+        """本线程上一次应答的延迟（秒）"""
+        return getattr(self._local, "delay", 0.0)
+
+    def handle_rtu(self, frame):
+        """处理一个RTU请求帧，返回录制的响应帧；不应答时返回None"""
+        frame = bytes(frame)
+        response = self._next(frame[:-2])
+        if not response:
+            return None
+        slave, pdu, raw, _ = response
+        return raw if raw is not None else rtu_frame(slave, pdu)
+
+    def handle_mbap(self, unit, pdu):
+        """处理一个Modbus TCP请求PDU，返回录制的响应PDU；不应答时返回None"""
+        response = self._next(bytes((unit,)) + bytes(pdu))
+        if not response:
+            return None
+        return response[1]
+
+    def stats(self):
+        """统计信息"""
+        return {"requests": self.requests, "answered": self.answered, "unknown": self.unknown,
+                "recorded": len(self.table)}
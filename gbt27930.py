@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+GB/T 27930充电通信报文
+各消息类型的CAN ID和示例数据、CAN帧打包/拆包和十六进制显示，界面和基准测试共用（不依赖tkinter）
+"""
+
+# 消息类型 -> (CAN ID, 示例数据)
+MESSAGE_TYPES = {
+    "充电握手": (0x1801F456, (0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08)),
+    "充电参数配置": (0x1802F456, (0x10, 0x20, 0x30, 0x40, 0x50, 0x60, 0x70, 0x80)),
+    "充电状态": (0x1803F456, (0xAA, 0xBB, 0xCC, 0xDD, 0xEE, 0xFF, 0x11, 0x22)),
+    "充电统计": (0x1804F456, (0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x99, 0xAA)),
+    "充电停止": (0x1805F456, (0xBB, 0xCC, 0xDD, 0xEE, 0xFF, 0x00, 0x11, 0x22)),
+}
+
+CUSTOM_MESSAGE = "自定义消息"
+CUSTOM_CAN_ID = 0x1800F456
+CAN_DATA_LENGTH = 8
+
+
+def build_message(message_type):
+    """按消息类型返回(消息名, CAN ID, 数据)，未知类型按自定义消息处理"""
+    if message_type in MESSAGE_TYPES:
+        can_id, data = MESSAGE_TYPES[message_type]
+        return message_type, can_id, bytes(data)
+    return CUSTOM_MESSAGE, CUSTOM_CAN_ID, bytes(CAN_DATA_LENGTH)
+
+
+def message_name(can_id):
+    """按CAN ID查找消息类型，未知时返回自定义消息"""
+    for name, (message_can_id, _) in MESSAGE_TYPES.items():
+        if message_can_id == can_id:
+            return name
+    return CUSTOM_MESSAGE
+
+
+def pack_can_frame(can_id, data):
+    """CAN ID（4字节大端）+ 数据"""
+    return can_id.to_bytes(4, "big") + bytes(data)
+
+
+def unpack_can_frame(frame):
+    """拆分为(CAN ID, 数据)"""
+    if len(frame) < 4:
+        raise ValueError(f"CAN帧长度不足: {len(frame)}字节")
+    return int.from_bytes(frame[:4], "big"), bytes(frame[4:])
+
+
+def format_hex(data):
+    """按空格分隔的大写十六进制显示"""
+    return bytes(data).hex(" ").upper()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+固定容量的日志环形缓冲区（不依赖tkinter）
+追加和淘汰最旧记录都是O(1)，按序号随机访问，日志视图只取可见的几十行渲染，长时间运行内存不增长
+"""
+
+DEFAULT_CAPACITY = 5000
+MIN_CAPACITY = 100
+
+
+class LogBuffer:
+    """日志行环形缓冲区：满了之后新行覆盖最旧的行"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = max(MIN_CAPACITY, int(capacity))
+        self._items = [None] * self.capacity
+        self._head = 0      # 最旧一行在_items中的位置
+        self._count = 0
+        self.total = 0      # 累计追加的行数（最新一行的序号为total-1）
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def first_seq(self):
+        """缓冲区中最旧一行的序号"""
+        return self.total - self._count
+
+    def append(self, line):
+        """追加一行，满时覆盖最旧的行"""
+        capacity = self.capacity
+        if self._count < capacity:
+            self._items[(self._head + self._count) % capacity] = line
+            self._count += 1
+        else:
+            self._items[self._head] = line
+            self._head = (self._head + 1) % capacity
+        self.total += 1
+
+    def extend(self, lines):
+        """追加多行"""
+        for line in lines:
+            self.append(line)
+
+    def __getitem__(self, index):
+        """按位置取一行，0为最旧，-1为最新"""
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("日志缓冲区索引越界")
+        return self._items[(self._head + index) % self.capacity]
+
+    def window(self, start, count):
+        """取从位置start起的最多count行（可见窗口）"""
+        start = max(0, start)
+        stop = min(self._count, start + count)
+        capacity = self.capacity
+        head = self._head
+        return [self._items[(head + index) % capacity] for index in range(start, stop)]
+
+    def lines(self):
+        """全部行，从旧到新"""
+        return self.window(0, self._count)
+
+    def clear(self):
+        """清空（序号继续累计）"""
+        self._items = [None] * self.capacity
+        self._head = 0
+        self._count = 0
+
+    def resize(self, capacity):
+        """修改容量，保留最新的行"""
+        capacity = max(MIN_CAPACITY, int(capacity))
+        if capacity == self.capacity:
+            return
+        lines = self.window(max(0, self._count - capacity), capacity)
+        self.capacity = capacity
+        self._items = lines + [None] * (capacity - len(lines))
+        self._head = 0
+        self._count = len(lines)
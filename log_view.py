@@ -0,0 +1,155 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+from log_buffer import LogBuffer, DEFAULT_CAPACITY
+
+
+class LogView:
+    """日志视图：记录保存在固定容量的环形缓冲区中，Text控件只渲染可见的几行，追加开销和内存不随运行时间增长"""
+
+    def __init__(self, parent, height=10, width=50, font=("Consolas", 9), capacity=DEFAULT_CAPACITY):
+        self.buffer = LogBuffer(capacity)
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+
+        self.text = tk.Text(self.frame, height=height, width=width, font=font, state=tk.DISABLED)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.yview)
+        self.text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+        # 暂停自动滚动时视图停在当前行，新记录照常进入缓冲区
+        self.paused_var = tk.BooleanVar(value=False)
+        self.count_var = tk.StringVar()
+        status_frame = ttk.Frame(self.frame)
+        status_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        status_frame.columnconfigure(1, weight=1)
+        ttk.Checkbutton(status_frame, text="暂停滚动", variable=self.paused_var,
+                        command=self.on_pause_toggle).grid(row=0, column=0, sticky=tk.W)
+        ttk.Label(status_frame, textvariable=self.count_var, foreground="gray").grid(row=0, column=1, sticky=tk.E)
+
+        self.line_height = tkfont.Font(font=font).metrics("linespace") or 1
+        self.rows = height
+        self.top_seq = 0  # 暂停时视图第一行的序号（按序号记录，旧行被淘汰后仍能定位）
+        self.render_pending = None
+
+        self.text.bind("<Configure>", self.on_resize)
+        self.text.bind("<MouseWheel>", self.on_mousewheel)
+        self.text.bind("<Button-4>", lambda event: self.scroll_lines(-3))
+        self.text.bind("<Button-5>", lambda event: self.scroll_lines(3))
+        self.update_count()
+
+    def grid(self, **kwargs):
+        """布局到父容器"""
+        self.frame.grid(**kwargs)
+
+    def append(self, line):
+        """追加一行，渲染合并到空闲时执行"""
+        self.buffer.append(line)
+        self.schedule_render()
+
+    def extend(self, lines):
+        """批量追加多行，只渲染一次"""
+        self.buffer.extend(lines)
+        self.schedule_render()
+
+    def clear(self):
+        """清空视图"""
+        self.buffer.clear()
+        self.top_seq = self.buffer.total
+        self.schedule_render()
+
+    def set_capacity(self, capacity):
+        """修改行数上限，保留最新的行"""
+        self.buffer.resize(capacity)
+        self.schedule_render()
+
+    def lines(self):
+        """缓冲区中的全部行（用于导出）"""
+        return self.buffer.lines()
+
+    def schedule_render(self):
+        """在空闲时渲染一次，多次调用合并为一次"""
+        if self.render_pending is None:
+            self.render_pending = self.text.after_idle(self.render)
+
+    def following(self):
+        """是否自动滚动到最新一行（未暂停）"""
+        return not self.paused_var.get()
+
+    def view_start(self):
+        """可见窗口第一行在缓冲区中的位置"""
+        count = len(self.buffer)
+        last_start = max(0, count - self.rows)
+        if self.following():
+            return last_start
+        return min(max(0, self.top_seq - self.buffer.first_seq), last_start)
+
+    def render(self):
+        """只把可见的行写入Text控件"""
+        self.render_pending = None
+        buffer = self.buffer
+        count = len(buffer)
+        start = self.view_start()
+        if not self.following():
+            self.top_seq = buffer.first_seq + start
+        lines = buffer.window(start, self.rows)
+        text = self.text
+        text.configure(state=tk.NORMAL)
+        text.delete("1.0", tk.END)
+        text.insert("1.0", "\n".join(lines))
+        text.configure(state=tk.DISABLED)
+        if self.following():
+            # 自动换行时可见行可能多于窗口高度，保证最新一行可见
+            text.see(tk.END)
+        if count:
+            self.scrollbar.set(start / count, min(1.0, (start + len(lines)) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.update_count()
+
+    def update_count(self):
+        """更新行数显示"""
+        self.count_var.set(f"{len(self.buffer)}/{self.buffer.capacity}行")
+
+    def on_resize(self, event):
+        """控件高度变化时重新计算可见行数"""
+        rows = max(1, event.height // self.line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.schedule_render()
+
+    def on_pause_toggle(self):
+        """暂停/恢复自动滚动：暂停时固定在当前可见位置"""
+        if not self.following():
+            self.top_seq = self.buffer.first_seq + self.view_start()
+        self.schedule_render()
+
+    def scroll_to(self, start):
+        """滚动到位置start：离开末尾时暂停自动滚动，回到末尾时恢复"""
+        last_start = max(0, len(self.buffer) - self.rows)
+        start = min(max(0, start), last_start)
+        self.paused_var.set(start < last_start)
+        self.top_seq = self.buffer.first_seq + start
+        self.schedule_render()
+
+    def scroll_lines(self, lines):
+        """向下（正数）或向上（负数）滚动若干行"""
+        self.scroll_to(self.view_start() + lines)
+        return "break"
+
+    def yview(self, *args):
+        """滚动条回调（moveto/scroll）"""
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.buffer)))
+        elif args[0] == "scroll":
+            amount = int(args[1])
+            if len(args) > 2 and args[2] == "pages":
+                amount *= max(1, self.rows - 1)
+            self.scroll_lines(amount)
+
+    def on_mousewheel(self, event):
+        """鼠标滚轮每格滚动3行"""
+        return self.scroll_lines(-3 if event.delta > 0 else 3)
@@ -1,10 +1,48 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import os
+import random
+import sqlite3
+import time
 import serial.tools.list_ports
 from modbus_parser import ModbusParserWindow
+from multiport_window import MultiPortWindow
+from modbus_crc import crc16, check_frame
+from modbus_frame import (ModbusRequest, READ_FUNCTIONS, READ_BIT_FUNCTIONS, WRITE_FUNCTIONS,
+                          WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER)
+from modbus_serial import SerialLink, SerialWorker, open_port
+from modbus_scheduler import PollScheduler, PollTask
+from modbus_timeout import TimeoutPolicy, format_policy
+from modbus_write_queue import WriteQueue, WriteBatch
+from modbus_image import ImageCache
+from modbus_counters import TransactionCounters, format_counters
+from modbus_metrics import BusMetrics
+from metrics_window import MetricsWindow
+from discovery_window import DiscoveryWindow
+from replay_window import ReplayWindow
+from log_view import LogView
+from log_buffer import DEFAULT_CAPACITY as LOG_CAPACITY, MIN_CAPACITY as LOG_MIN_CAPACITY
+from ui_pump import UiPump, UpdateQueue
+from frame_capture import CaptureWriter, LINK_MODBUS_RTU, LINK_CAN, DIRECTION_RX
+from frame_replay import ReplayTag
+from modbus_history import TimeSeriesStore
+from trend_window import TrendWindow
+from gbt27930 import build_message, message_name, pack_can_frame, format_hex, CAN_DATA_LENGTH
+from modbus_profile import ScanProfiler, STAGE_RENDER, STAGE_CYCLE, format_breakdown
 
 class ModernUI:
+    # 界面刷新帧率（次/秒）：串口结果和日志行按帧批量显示
+    UI_FRAME_RATE = 30
+    # 抓包文件目录（默认开启抓包，文件按大小轮转，只保留最新的若干个）
+    CAPTURE_DIRECTORY = "captures"
+    # 历史数据库（默认开启，读到的数值按点位保存，趋势图窗口查询）
+    HISTORY_DATABASE = "history.db"
+    # 最小扫描间隔（毫秒）
+    MIN_SCAN_RATE = 10
+    # 27930模拟响应的延迟（毫秒）和随机数种子（响应数据可复现）
+    CAN_RESPONSE_DELAY = 100
+    CAN_RESPONSE_SEED = 27930
+    
     def __init__(self, root):
         self.root = root
         self.root.title("工控测试软件")
@@ -12,6 +50,19 @@ class ModernUI:
         # 设置窗口默认大小为显示器窗口的一半
         self.setup_window_size()
         
+        # 日志视图的行数上限（超出后丢弃最旧的行）
+        self.log_capacity = LOG_CAPACITY
+        # 界面更新泵：串口线程的结果和各处写入的日志行按固定帧率批量显示
+        self.ui_pump = UiPump(self.root, self.UI_FRAME_RATE)
+        # 报文抓包：收发的每一帧写入二进制抓包文件
+        self.frame_capture = None
+        self.capture_var = tk.BooleanVar(value=True)
+        # 其他窗口（多串口轮询、从站扫描）登记的抓包回调，开启/关闭抓包时调用callback(抓包入口或None)
+        self.capture_listeners = []
+        # 历史数据：读到的数值写入时间序列存储
+        self.history = None
+        self.history_var = tk.BooleanVar(value=True)
+        
         # 创建菜单栏
         self.create_menu()
         
@@ -21,6 +72,10 @@ class ModernUI:
         # 绑定窗口大小改变事件
         self.root.bind('<Configure>', self.on_window_resize)
         
+        self.ui_pump.start()
+        self.toggle_capture()
+        self.toggle_history()
+        
     def setup_window_size(self):
         """设置窗口默认大小为适合显示完整内容"""
         # 获取屏幕尺寸
@@ -51,7 +106,16 @@ class ModernUI:
         menubar.add_cascade(label="测试", menu=test_menu)
         test_menu.add_command(label="modbus测试", command=self.modbus_test)
         test_menu.add_command(label="modbus解析对码", command=self.open_modbus_parser)
+        test_menu.add_command(label="多串口轮询", command=self.open_multiport)
+        test_menu.add_command(label="从站扫描", command=self.open_discovery)
+        test_menu.add_command(label="总线统计", command=self.open_metrics)
+        test_menu.add_command(label="性能分析", command=self.start_profiling)
         test_menu.add_command(label="27930测试", command=self.test_27930)
+        test_menu.add_command(label="报文回放", command=self.open_replay)
+        test_menu.add_command(label="趋势图", command=self.open_trend)
+        test_menu.add_command(label="日志行数上限", command=self.set_log_capacity)
+        test_menu.add_checkbutton(label="报文抓包", variable=self.capture_var, command=self.toggle_capture)
+        test_menu.add_checkbutton(label="数据记录", variable=self.history_var, command=self.toggle_history)
         test_menu.add_separator()
         test_menu.add_command(label="退出", command=self.root.quit)
         
@@ -168,6 +232,16 @@ class ModernUI:
         
         # 串口开关按钮
         self.serial_status = False  # 串口状态：False=关闭，True=打开
+        self.serial_worker = None  # 串口I/O线程
+        self.poll_scheduler = None  # 轮询调度器
+        self.timeout_policy = None  # 按从站自适应的超时/重试策略
+        self.write_queue = None  # 合并写队列
+        self.register_image = ImageCache()  # 各从站寄存器/线圈映像，记录变化版本
+        self.transaction_counters = TransactionCounters()  # 按从站/功能码/结果分类的事务计数
+        self.bus_metrics = BusMetrics()  # 各串口/从站的速率、延迟分布、字节数和总线占用率，主界面和多串口轮询共用
+        self.scan_profiler = None  # 性能分析进行中时为ScanProfiler
+        self.serial_results = UpdateQueue()  # 串口线程返回的事务结果，由界面更新泵按帧取出
+        self.ui_pump.add_source(self.serial_results, self.process_modbus_result, self.summarize_modbus_results)
         self.serial_button = ttk.Button(parity_frame, text="打开", command=self.toggle_serial, style="Accent.TButton", width=6)
         self.serial_button.grid(row=0, column=1)
         
@@ -233,10 +307,24 @@ class ModernUI:
         register_count_base_combo.grid(row=0, column=1)
         register_count_base_combo.bind('<<ComboboxSelected>>', self.on_register_count_base_change)
         
+        # 写入值（功能码05/06/15/16使用，多个值用空格或逗号分隔）
+        ttk.Label(settings_frame, text="写入值:").grid(row=12, column=0, sticky=tk.W, pady=2)
+        write_value_frame = ttk.Frame(settings_frame)
+        write_value_frame.grid(row=12, column=1, sticky=tk.W, pady=2)
+        
+        self.write_value_var = tk.StringVar(value="0")
+        write_value_entry = ttk.Entry(write_value_frame, textvariable=self.write_value_var, width=14)
+        write_value_entry.grid(row=0, column=0, padx=(0, 2))
+        
+        self.write_value_base_var = tk.StringVar(value="DEC")
+        write_value_base_combo = ttk.Combobox(write_value_frame, textvariable=self.write_value_base_var,
+                                             values=["DEC", "HEX"], width=4, state="readonly")
+        write_value_base_combo.grid(row=0, column=1)
+        
         # 扫描设置
-        ttk.Label(settings_frame, text="扫描:").grid(row=12, column=0, sticky=tk.W, pady=2)
+        ttk.Label(settings_frame, text="扫描:").grid(row=13, column=0, sticky=tk.W, pady=2)
         scan_rate_frame = ttk.Frame(settings_frame)
-        scan_rate_frame.grid(row=12, column=1, sticky=tk.W, pady=2)
+        scan_rate_frame.grid(row=13, column=1, sticky=tk.W, pady=2)
         
         self.scan_rate_var = tk.StringVar(value="1000")
         scan_rate_entry = ttk.Entry(scan_rate_frame, textvariable=self.scan_rate_var, width=8)
@@ -248,27 +336,27 @@ class ModernUI:
         self.scan_button = ttk.Button(scan_rate_frame, text="开始", command=self.toggle_scan, style="Accent.TButton", width=6)
         self.scan_button.grid(row=0, column=2, padx=(10, 0))
         
-        # 定时器状态
-        self.scan_timer = None
+        # 扫描状态（扫描任务由串口线程中的调度器执行）
+        self.scan_task = None
         self.scanning = False
         
         # 分隔线
         separator2 = ttk.Separator(settings_frame, orient='horizontal')
-        separator2.grid(row=13, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
+        separator2.grid(row=14, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10)
         
         # 数据显示设置
-        ttk.Label(settings_frame, text="显示设置:", font=("Arial", 10, "bold")).grid(row=14, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
+        ttk.Label(settings_frame, text="显示设置:", font=("Arial", 10, "bold")).grid(row=15, column=0, columnspan=3, sticky=tk.W, pady=(0, 5))
         
         # 数据显示格式
         self.data_format_var = tk.StringVar(value="HEX")
         format_frame = ttk.Frame(settings_frame)
-        format_frame.grid(row=15, column=0, columnspan=3, sticky=tk.W, pady=1)
+        format_frame.grid(row=16, column=0, columnspan=3, sticky=tk.W, pady=1)
         ttk.Radiobutton(format_frame, text="十六进制", variable=self.data_format_var, value="HEX").grid(row=0, column=0, padx=(0, 20))
         ttk.Radiobutton(format_frame, text="十进制", variable=self.data_format_var, value="DEC").grid(row=0, column=1)
         
         # 控制按钮
         button_frame = ttk.Frame(settings_frame)
-        button_frame.grid(row=16, column=0, columnspan=3, pady=10)
+        button_frame.grid(row=17, column=0, columnspan=3, pady=10)
         
         ttk.Button(button_frame, text="发送", command=self.send_modbus, style="Accent.TButton").grid(row=0, column=0, padx=2)
         ttk.Button(button_frame, text="清空", command=self.clear_data).grid(row=0, column=1, padx=2)
@@ -290,13 +378,9 @@ class ModernUI:
         raw_data_frame.columnconfigure(0, weight=1)
         raw_data_frame.rowconfigure(0, weight=1)
         
-        # 原始数据文本框
-        self.raw_data_text = tk.Text(raw_data_frame, height=15, width=50, font=("Consolas", 9))
-        raw_data_scrollbar = ttk.Scrollbar(raw_data_frame, orient="vertical", command=self.raw_data_text.yview)
-        self.raw_data_text.configure(yscrollcommand=raw_data_scrollbar.set)
-        
-        self.raw_data_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        raw_data_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # 原始数据视图（环形缓冲区，只渲染可见行）
+        self.raw_data_view = LogView(raw_data_frame, height=15, width=50, font=("Consolas", 9), capacity=self.log_capacity)
+        self.raw_data_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # 解码数据区域
         decode_data_frame = ttk.LabelFrame(data_frame, text="解码数据", padding="5")
@@ -304,13 +388,10 @@ class ModernUI:
         decode_data_frame.columnconfigure(0, weight=1)
         decode_data_frame.rowconfigure(0, weight=1)
         
-        # 解码数据文本框
-        self.decode_data_text = tk.Text(decode_data_frame, height=10, width=50, font=("Consolas", 9))
-        decode_data_scrollbar = ttk.Scrollbar(decode_data_frame, orient="vertical", command=self.decode_data_text.yview)
-        self.decode_data_text.configure(yscrollcommand=decode_data_scrollbar.set)
-        
-        self.decode_data_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        decode_data_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # 解码数据视图
+        self.decode_data_view = LogView(decode_data_frame, height=10, width=50, font=("Consolas", 9),
+                                        capacity=self.log_capacity)
+        self.decode_data_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
     def create_27930_interface(self):
         """创建27930测试界面"""
@@ -368,6 +449,8 @@ class ModernUI:
         
         # CAN开关按钮
         self.can_status = False  # CAN状态：False=关闭，True=打开
+        self.can_frames = UpdateQueue()  # 回放的CAN报文，由界面更新泵按帧取出
+        self.ui_pump.add_source(self.can_frames, self.handle_can_frame, self.summarize_can_frames)
         self.can_button = ttk.Button(settings_frame, text="打开", command=self.toggle_can, style="Accent.TButton", width=8)
         self.can_button.grid(row=3, column=0, columnspan=2, pady=5)
         
@@ -432,6 +515,8 @@ class ModernUI:
         # 定时器状态
         self.can_scan_timer = None
         self.can_scanning = False
+        # 27930模拟响应：固定种子的随机数，同样的发送顺序得到同样的响应
+        self.can_response_random = random.Random(self.CAN_RESPONSE_SEED)
         
         # 分隔线
         separator2 = ttk.Separator(settings_frame, orient='horizontal')
@@ -469,13 +554,10 @@ class ModernUI:
         raw_data_frame.columnconfigure(0, weight=1)
         raw_data_frame.rowconfigure(0, weight=1)
         
-        # 原始数据文本框
-        self.can_raw_data_text = tk.Text(raw_data_frame, height=15, width=50, font=("Consolas", 9))
-        can_raw_data_scrollbar = ttk.Scrollbar(raw_data_frame, orient="vertical", command=self.can_raw_data_text.yview)
-        self.can_raw_data_text.configure(yscrollcommand=can_raw_data_scrollbar.set)
-        
-        self.can_raw_data_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        can_raw_data_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # 原始数据视图
+        self.can_raw_data_view = LogView(raw_data_frame, height=15, width=50, font=("Consolas", 9),
+                                         capacity=self.log_capacity)
+        self.can_raw_data_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # 数据解析区域
         parse_data_frame = ttk.LabelFrame(data_frame, text="数据解析", padding="5")
@@ -483,13 +565,10 @@ class ModernUI:
         parse_data_frame.columnconfigure(0, weight=1)
         parse_data_frame.rowconfigure(0, weight=1)
         
-        # 数据解析文本框
-        self.can_parse_data_text = tk.Text(parse_data_frame, height=10, width=50, font=("Consolas", 9))
-        can_parse_data_scrollbar = ttk.Scrollbar(parse_data_frame, orient="vertical", command=self.can_parse_data_text.yview)
-        self.can_parse_data_text.configure(yscrollcommand=can_parse_data_scrollbar.set)
-        
-        self.can_parse_data_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        can_parse_data_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        # 数据解析视图
+        self.can_parse_data_view = LogView(parse_data_frame, height=10, width=50, font=("Consolas", 9),
+                                           capacity=self.log_capacity)
+        self.can_parse_data_view.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
     def apply_modern_style(self):
         """应用现代化样式"""
@@ -529,10 +608,21 @@ class ModernUI:
     def open_serial(self):
         """打开串口"""
         try:
-            # 这里应该实现实际的串口打开逻辑
-            # 目前只是模拟
             port = self.com_port_var.get()
             baud = int(self.baud_rate_var.get())
+            ser = open_port(port, baud, self.data_bits_var.get(), self.parity_var.get(), self.stop_bits_var.get())
+            # 串口由独立的I/O线程独占，界面线程只通过队列收发
+            self.poll_scheduler = PollScheduler()
+            self.timeout_policy = TimeoutPolicy()
+            self.write_queue = WriteQueue()
+            link = SerialLink(ser)
+            if self.frame_capture is not None:
+                link.capture = self.frame_capture.channel(port, LINK_MODBUS_RTU)
+            self.serial_worker = SerialWorker(link, self.serial_results, self.poll_scheduler,
+                                              self.timeout_policy, port=port, write_queue=self.write_queue,
+                                              metrics=self.bus_metrics)
+            self.serial_worker.profiler = self.scan_profiler
+            self.serial_worker.start()
             self.add_raw_data(f"[{self.get_timestamp()}] 串口 {port} 已打开，波特率: {baud}")
             # 更新串口状态和按钮文本
             self.serial_status = True
@@ -566,44 +656,48 @@ class ModernUI:
             
         try:
             scan_rate = int(self.scan_rate_var.get())
-            if scan_rate < 100:
-                messagebox.showwarning("警告", "扫描间隔不能小于100ms")
+            if scan_rate < self.MIN_SCAN_RATE:
+                messagebox.showwarning("警告", f"扫描间隔不能小于{self.MIN_SCAN_RATE}ms")
+                return
+            function_code, slave_addr, reg_addr, reg_count = self.get_modbus_settings()
+            if function_code not in READ_FUNCTIONS:
+                messagebox.showwarning("警告", "定时扫描只支持读功能码")
                 return
                 
+            # 按固定速率调度，下一次时间不受本次事务耗时影响
+            self.scan_task = PollTask(slave_addr, function_code, reg_addr, reg_count, scan_rate / 1000.0)
+            self.poll_scheduler.add(self.scan_task)
             self.scanning = True
-            self.scan_timer = self.root.after(scan_rate, self.scan_modbus)
             self.scan_button.config(text="停止", style="TButton")
             self.add_raw_data(f"[{self.get_timestamp()}] 开始定时扫描，间隔: {scan_rate}ms")
         except ValueError:
-            messagebox.showerror("错误", "请输入有效的扫描间隔")
+            messagebox.showerror("错误", "请输入有效的扫描间隔和参数")
             
     def stop_scan(self):
         """停止定时扫描"""
-        if self.scan_timer:
-            self.root.after_cancel(self.scan_timer)
-            self.scan_timer = None
+        if self.scan_task:
+            self.poll_scheduler.remove(self.scan_task)
+            task = self.scan_task
+            self.scan_task = None
+            self.add_raw_data(f"[{self.get_timestamp()}] 扫描 {task.runs} 次，总线跟不上而跳过 {task.overruns} 次")
+            for policy in self.timeout_policy.snapshot():
+                self.add_raw_data(f"[{self.get_timestamp()}] {format_policy(policy)}")
+            for row in self.transaction_counters.table():
+                self.add_raw_data(f"[{self.get_timestamp()}] {format_counters(row)}")
         self.scanning = False
         self.scan_button.config(text="开始", style="Accent.TButton")
         self.add_raw_data(f"[{self.get_timestamp()}] 停止定时扫描")
-        
-    def scan_modbus(self):
-        """执行一次Modbus扫描"""
-        if self.scanning and self.serial_status:
-            # 执行一次Modbus通讯
-            self.send_modbus()
-            
-            # 设置下一次扫描
-            try:
-                scan_rate = int(self.scan_rate_var.get())
-                self.scan_timer = self.root.after(scan_rate, self.scan_modbus)
-            except ValueError:
-                self.stop_scan()
-                messagebox.showerror("错误", "扫描间隔设置无效，已停止扫描")
             
     def close_serial(self):
         """关闭串口"""
         try:
-            # 这里应该实现实际的串口关闭逻辑
+            if self.scanning:
+                self.stop_scan()
+            if self.serial_worker:
+                self.serial_worker.stop()
+                self.serial_worker = None
+            # 显示关闭前已收到的结果
+            self.ui_pump.tick()
             self.add_raw_data(f"[{self.get_timestamp()}] 串口已关闭")
             # 更新串口状态和按钮文本
             self.serial_status = False
@@ -611,140 +705,154 @@ class ModernUI:
         except Exception as e:
             messagebox.showerror("错误", f"关闭串口失败: {str(e)}")
             
+    def get_modbus_settings(self):
+        """读取界面上的Modbus参数，返回(功能码, 从站地址, 寄存器地址, 寄存器数量)"""
+        function_code = int(self.function_code_var.get().split(" - ")[0])
+        
+        # 解析从站地址（支持十进制和十六进制）
+        slave_addr_str = self.slave_address_var.get().strip()
+        if self.slave_address_base_var.get() == "HEX":
+            slave_addr = int(slave_addr_str, 16)
+        else:
+            slave_addr = int(slave_addr_str)
+            
+        # 解析寄存器地址（支持十进制和十六进制）
+        reg_addr_str = self.register_address_var.get().strip()
+        if self.register_address_base_var.get() == "HEX":
+            reg_addr = int(reg_addr_str, 16)
+        else:
+            reg_addr = int(reg_addr_str)
+            
+        # 解析寄存器数量（支持十进制和十六进制）
+        reg_count_str = self.register_count_var.get().strip()
+        if self.register_count_base_var.get() == "HEX":
+            reg_count = int(reg_count_str, 16)
+        else:
+            reg_count = int(reg_count_str)
+            
+        return function_code, slave_addr, reg_addr, reg_count
+            
+    def get_write_values(self):
+        """读取界面上的写入值（空格或逗号分隔，按所选进制解析）"""
+        base = 16 if self.write_value_base_var.get() == "HEX" else 10
+        text = self.write_value_var.get().replace(",", " ")
+        values = [int(value, base) for value in text.split()]
+        if not values:
+            raise ValueError("请输入写入值")
+        return values
+            
     def send_modbus(self):
         """发送Modbus数据"""
         try:
             # 获取设置参数
-            function_code = self.function_code_var.get().split(" - ")[0]
-            
-            # 解析从站地址（支持十进制和十六进制）
-            slave_addr_str = self.slave_address_var.get().strip()
-            if self.slave_address_base_var.get() == "HEX":
-                if slave_addr_str.upper().startswith('0X'):
-                    slave_addr = int(slave_addr_str, 16)
-                else:
-                    slave_addr = int(slave_addr_str, 16)
-            else:
-                slave_addr = int(slave_addr_str)
-                
-            # 解析寄存器地址（支持十进制和十六进制）
-            reg_addr_str = self.register_address_var.get().strip()
-            if self.register_address_base_var.get() == "HEX":
-                if reg_addr_str.upper().startswith('0X'):
-                    reg_addr = int(reg_addr_str, 16)
-                else:
-                    reg_addr = int(reg_addr_str, 16)
-            else:
-                reg_addr = int(reg_addr_str)
-                
-            # 解析寄存器数量（支持十进制和十六进制）
-            reg_count_str = self.register_count_var.get().strip()
-            if self.register_count_base_var.get() == "HEX":
-                if reg_count_str.upper().startswith('0X'):
-                    reg_count = int(reg_count_str, 16)
-                else:
-                    reg_count = int(reg_count_str, 16)
-            else:
-                reg_count = int(reg_count_str)
+            function_code, slave_addr, reg_addr, reg_count = self.get_modbus_settings()
             
             # 构建Modbus请求帧
-            if function_code in ["01", "02", "03", "04"]:
+            if function_code in READ_FUNCTIONS:
                 # 读操作
-                # 构建数据包（不包含CRC）
-                request_data = [slave_addr, int(function_code), reg_addr >> 8, reg_addr & 0xFF, reg_count >> 8, reg_count & 0xFF]
-                
-                # 计算CRC
-                crc = self.calculate_crc16(request_data)
-                crc_low = crc & 0xFF
-                crc_high = (crc >> 8) & 0xFF
-                
-                # 添加CRC到数据包
-                request_data.extend([crc_low, crc_high])
+                if not self.serial_status:
+                    messagebox.showwarning("警告", "请先打开串口")
+                    return
+                request = ModbusRequest(slave_addr, function_code, reg_addr, reg_count)
+                request_data = request.frame
+                crc_low = request_data[-2]
+                crc_high = request_data[-1]
                 
                 # 转换为十六进制字符串显示
                 request_hex = " ".join([f"{b:02X}" for b in request_data])
                 
                 self.add_raw_data(f"[{self.get_timestamp()}] 发送: {request_hex}")
-                self.add_decode_data(f"[{self.get_timestamp()}] 发送: 从站{slave_addr}, 功能码{function_code}, 地址{reg_addr}, 数量{reg_count} - CRC:低{crc_low:02X},高{crc_high:02X}")
+                self.add_decode_data(f"[{self.get_timestamp()}] 发送: 从站{slave_addr}, 功能码{function_code:02d}, 地址{reg_addr}, 数量{reg_count} - CRC:低{crc_low:02X},高{crc_high:02X}")
                 
-                # 模拟接收响应
-                self.simulate_response(slave_addr, function_code, reg_count)
+                # 交给串口线程发送，响应由界面更新泵在界面线程中显示
+                self.serial_worker.submit(request)
                 
             else:
-                # 写操作（简化处理）
-                self.add_raw_data(f"[{self.get_timestamp()}] 发送写命令: 功能码{function_code}")
-                self.add_decode_data(f"[{self.get_timestamp()}] 发送Modbus写命令: 从站{slave_addr}, 功能码{function_code}")
+                # 写操作：加入合并写队列，相邻地址的写合并为一次功能码15/16，由串口线程按优先级发送
+                if not self.serial_status:
+                    messagebox.showwarning("警告", "请先打开串口")
+                    return
+                values = self.get_write_values()
+                if function_code in (WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER):
+                    # 多个值时逐个写到连续地址，由写队列合并
+                    for offset, value in enumerate(values):
+                        self.write_queue.write(slave_addr, function_code, reg_addr + offset, [value])
+                else:
+                    self.write_queue.write(slave_addr, function_code, reg_addr, values)
+                self.add_decode_data(f"[{self.get_timestamp()}] 写入队列: 从站{slave_addr}, 功能码{function_code:02d}, 地址{reg_addr}, 数量{len(values)}")
                 
         except ValueError as e:
             messagebox.showerror("错误", f"参数错误: {str(e)}")
         except Exception as e:
             messagebox.showerror("错误", f"发送失败: {str(e)}")
             
-    def simulate_response(self, slave_addr, function_code, reg_count):
-        """模拟Modbus响应"""
-        import random
-        import time
-        
-        # 模拟延迟
-        time.sleep(0.1)
-        
-        # 生成模拟数据
-        if function_code in ["01", "02"]:
-            # 线圈/离散输入
-            data_bytes = reg_count
-            # 生成随机线圈状态数据
-            coil_data = []
-            for _ in range(reg_count):
-                coil_data.append(random.randint(0, 1))
+    def process_modbus_result(self, result, render=True):
+        """界面更新泵取出的一条串口结果（在界面线程中运行），render为False时只统计不显示"""
+        profiler = self.scan_profiler
+        if profiler is None:
+            self.handle_modbus_result(result, render)
+            return
+        # 性能分析：界面线程的处理和显示计为render阶段
+        profiler.attach()
+        with profiler.stages.span(STAGE_RENDER):
+            self.handle_modbus_result(result, render)
+        if profiler.cycle_done():
+            self.finish_profiling()
+                
+    def handle_modbus_result(self, result, render=True):
+        """统计一次事务结果，更新映像并显示"""
+        self.transaction_counters.record(result)
+        changes = self.register_image.apply(result)
+        if self.history is not None and not isinstance(result.request.tag, ReplayTag):
+            # 回放的结果不写入历史数据
+            self.history.append_result(result, result.port or self.com_port_var.get())
+        if render:
+            self.show_modbus_result(result, changes)
             
-            # 构建响应数据包（不包含CRC）
-            response_data = [slave_addr, int(function_code), data_bytes]
+    def summarize_modbus_results(self, skipped, dropped):
+        """过载时一帧内未逐条显示的结果汇总为一行"""
+        failed = sum(1 for result in skipped if not result.ok)
+        text = f"[{self.get_timestamp()}] 界面过载：省略 {len(skipped)} 条结果的显示（失败 {failed} 条，已计入统计）"
+        if dropped:
+            text += f"，结果队列溢出丢弃 {dropped} 条"
+        self.add_decode_data(text)
             
-            # 添加线圈数据
-            for coil in coil_data:
-                response_data.append(coil)
-                
-        else:
-            # 寄存器
-            data_bytes = reg_count * 2
-            # 生成随机寄存器数据
-            register_data = []
-            for _ in range(reg_count):
-                register_value = random.randint(0, 65535)
-                register_data.append(register_value >> 8)  # 高字节
-                register_data.append(register_value & 0xFF)  # 低字节
+    def show_modbus_result(self, result, changes=0):
+        """显示一次Modbus事务的响应，changes为本次响应使映像中变化的点数"""
+        request = result.request
+        function_code = f"{request.function_code:02d}"
+        elapsed_ms = result.elapsed * 1000
+        
+        if isinstance(request.tag, (PollTask, WriteBatch, ReplayTag)):
+            # 扫描任务、合并写和回放的请求不经过send_modbus，在这里补充显示发送的帧
+            request_hex = " ".join([f"{b:02X}" for b in request.frame])
+            self.add_raw_data(f"[{self.get_timestamp()}] 发送: {request_hex}")
             
-            # 构建响应数据包（不包含CRC）
-            response_data = [slave_addr, int(function_code), data_bytes]
+        if result.response:
+            # 转换为十六进制字符串显示
+            response_hex = " ".join([f"{b:02X}" for b in result.response])
+            self.add_raw_data(f"[{self.get_timestamp()}] 接收: {response_hex}")
             
-            # 添加寄存器数据
-            response_data.extend(register_data)
-        
-        # 计算CRC
-        crc = self.calculate_crc16(response_data)
-        crc_low = crc & 0xFF
-        crc_high = (crc >> 8) & 0xFF
-        
-        # 添加CRC到响应数据包
-        response_data.extend([crc_low, crc_high])
-        
-        # 转换为十六进制字符串显示
-        response_hex = " ".join([f"{b:02X}" for b in response_data])
-        
-        self.add_raw_data(f"[{self.get_timestamp()}] 接收: {response_hex}")
-        
-        # 验证CRC并合并显示
-        crc_result = self.verify_crc_silent(response_data)
-        if crc_result:
-            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{slave_addr}, 功能码{function_code}, 数据{data_bytes}字节 - CRC:低{crc_low:02X},高{crc_high:02X} - 成功")
-        else:
+        if result.ok and request.function_code in WRITE_FUNCTIONS:
+            merged = request.tag.merged if isinstance(request.tag, WriteBatch) else 1
+            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{request.slave}, 功能码{function_code}, 地址{request.address}, 数量{request.count} - 写入成功 ({elapsed_ms:.1f}ms, 合并{merged}个地址)")
+        elif result.ok:
+            crc_low = result.response[-2]
+            crc_high = result.response[-1]
+            data_bytes = len(result.response) - 5
+            if self.data_format_var.get() == "HEX" and request.function_code not in READ_BIT_FUNCTIONS:
+                values = " ".join([f"{v:04X}" for v in result.values])
+            else:
+                values = " ".join([str(v) for v in result.values])
+            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{request.slave}, 功能码{function_code}, 数据{data_bytes}字节 - CRC:低{crc_low:02X},高{crc_high:02X} - 成功 ({elapsed_ms:.1f}ms, 变化{changes}个)")
+            self.add_decode_data(f"  数据: {values}")
+        elif result.response and not check_frame(result.response):
             # 获取接收到的CRC值用于错误显示
-            received_crc_low = response_data[-2]
-            received_crc_high = response_data[-1]
-            received_crc = (received_crc_high << 8) | received_crc_low
-            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{slave_addr}, 功能码{function_code}, 数据{data_bytes}字节 - CRC:低{crc_low:02X},高{crc_high:02X} - CRC错误({received_crc:04X})")
-        
-
+            received_crc = (result.response[-1] << 8) | result.response[-2]
+            calculated_crc = crc16(result.response[:-2])
+            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{request.slave}, 功能码{function_code} - CRC:低{calculated_crc & 0xFF:02X},高{calculated_crc >> 8:02X} - CRC错误({received_crc:04X})")
+        else:
+            self.add_decode_data(f"[{self.get_timestamp()}] 响应: 从站{request.slave}, 功能码{function_code} - {result.error} [{result.status}]")
         
     def on_slave_address_base_change(self, event=None):
         """从站地址进制改变事件"""
@@ -907,19 +1015,8 @@ class ModernUI:
         
     def verify_crc_silent(self, data):
         """验证CRC校验码（静默模式，只返回结果）"""
-        if len(data) < 3:  # 至少需要从站地址、功能码和CRC（2字节）
-            return False
-            
-        # 提取数据部分（不包括CRC）
-        data_without_crc = data[:-2]
-        received_crc_low = data[-2]
-        received_crc_high = data[-1]
-        received_crc = (received_crc_high << 8) | received_crc_low
-        
-        # 计算数据部分的CRC
-        calculated_crc = self.calculate_crc16(data_without_crc)
-        
-        return calculated_crc == received_crc
+        # 对整帧（含CRC）计算CRC，结果为0即校验正确
+        return check_frame(data)
         
     def verify_crc(self, data):
         """验证CRC校验码"""
@@ -944,41 +1041,42 @@ class ModernUI:
             return False
         
     def calculate_crc16(self, data):
-        """计算CRC16校验码（Modbus标准）"""
-        crc = 0xFFFF
-        for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x0001:
-                    crc = (crc >> 1) ^ 0xA001
-                else:
-                    crc = crc >> 1
-        return crc
+        """计算CRC16校验码（Modbus标准，查表法）"""
+        return crc16(data)
     
     def calculate_crc(self, data):
         """计算CRC校验码（兼容旧接口）"""
-        # 将十六进制字符串转换为字节列表
-        data_bytes = []
-        for i in range(0, len(data), 2):
-            if i + 1 < len(data):
-                data_bytes.append(int(data[i:i+2], 16))
-        
-        return self.calculate_crc16(data_bytes)
+        # 将十六进制字符串转换为字节
+        return crc16(bytes.fromhex(data[:len(data) - len(data) % 2]))
         
     def clear_data(self):
         """清空数据显示"""
-        self.raw_data_text.delete(1.0, tk.END)
-        self.decode_data_text.delete(1.0, tk.END)
+        for view in (self.raw_data_view, self.decode_data_view):
+            self.ui_pump.discard(view)
+            view.clear()
         
     def add_raw_data(self, data):
         """添加原始数据"""
-        self.raw_data_text.insert(tk.END, data + "\n")
-        self.raw_data_text.see(tk.END)
+        self.ui_pump.write(self.raw_data_view, data)
         
     def add_decode_data(self, data):
         """添加解码数据"""
-        self.decode_data_text.insert(tk.END, data + "\n")
-        self.decode_data_text.see(tk.END)
+        self.ui_pump.write(self.decode_data_view, data)
+        
+    def log_views(self):
+        """全部日志视图"""
+        return (self.raw_data_view, self.decode_data_view, self.can_raw_data_view, self.can_parse_data_view)
+        
+    def set_log_capacity(self):
+        """设置日志视图保留的行数上限"""
+        capacity = simpledialog.askinteger("日志行数上限", "每个日志视图保留的行数（超出后丢弃最旧的行）:",
+                                           parent=self.root, initialvalue=self.log_capacity,
+                                           minvalue=LOG_MIN_CAPACITY, maxvalue=1000000)
+        if not capacity:
+            return
+        self.log_capacity = capacity
+        for view in self.log_views():
+            view.set_capacity(capacity)
         
     def get_timestamp(self):
         """获取时间戳"""
@@ -1135,7 +1233,16 @@ class ModernUI:
         """执行一次27930扫描"""
         if self.can_scanning and self.can_status:
             # 执行一次27930通讯
-            self.send_27930()
+            profiler = self.scan_profiler
+            if profiler is None:
+                self.send_27930()
+            else:
+                # 27930扫描在界面线程中完成组帧、模拟收发和显示，整体计为一个周期
+                profiler.attach()
+                with profiler.stages.span(STAGE_CYCLE):
+                    self.send_27930()
+                if profiler.cycle_done():
+                    self.finish_profiling()
             
             # 设置下一次扫描
             try:
@@ -1172,52 +1279,20 @@ class ModernUI:
                 receiver_addr = int(receiver_addr_str)
             
             # 根据消息类型构建27930数据包
-            if message_type == "充电握手":
-                # 充电握手消息
-                can_id = 0x1801F456  # 示例CAN ID
-                data = [0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08]
-                message_info = f"充电握手 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
-                
-            elif message_type == "充电参数配置":
-                # 充电参数配置消息
-                can_id = 0x1802F456
-                data = [0x10, 0x20, 0x30, 0x40, 0x50, 0x60, 0x70, 0x80]
-                message_info = f"充电参数配置 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
-                
-            elif message_type == "充电状态":
-                # 充电状态消息
-                can_id = 0x1803F456
-                data = [0xAA, 0xBB, 0xCC, 0xDD, 0xEE, 0xFF, 0x11, 0x22]
-                message_info = f"充电状态 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
-                
-            elif message_type == "充电统计":
-                # 充电统计消息
-                can_id = 0x1804F456
-                data = [0x33, 0x44, 0x55, 0x66, 0x77, 0x88, 0x99, 0xAA]
-                message_info = f"充电统计 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
-                
-            elif message_type == "充电停止":
-                # 充电停止消息
-                can_id = 0x1805F456
-                data = [0xBB, 0xCC, 0xDD, 0xEE, 0xFF, 0x00, 0x11, 0x22]
-                message_info = f"充电停止 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
-                
-            else:
-                # 自定义消息
-                can_id = 0x1800F456
-                data = [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]
-                message_info = f"自定义消息 - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
+            name, can_id, data = build_message(message_type)
+            message_info = f"{name} - 发送方:{sender_addr:02X}, 接收方:{receiver_addr:02X}"
             
             # 构建CAN数据包
-            can_data = [can_id >> 24, (can_id >> 16) & 0xFF, (can_id >> 8) & 0xFF, can_id & 0xFF] + data
+            can_data = pack_can_frame(can_id, data)
+            self.capture_can_frame(can_data, received=False)
             
             # 转换为十六进制字符串显示
-            can_hex = " ".join([f"{b:02X}" for b in can_data])
+            can_hex = format_hex(can_data)
             
             self.add_can_raw_data(f"[{self.get_timestamp()}] 发送: {can_hex}")
             self.add_can_parse_data(f"[{self.get_timestamp()}] {message_info}")
             self.add_can_parse_data(f"  CAN ID: {can_id:08X}")
-            self.add_can_parse_data(f"  数据: {' '.join([f'{d:02X}' for d in data])}")
+            self.add_can_parse_data(f"  数据: {format_hex(data)}")
             
             # 模拟接收响应
             self.simulate_27930_response(can_id, data, message_type)
@@ -1228,50 +1303,185 @@ class ModernUI:
             messagebox.showerror("错误", f"发送失败: {str(e)}")
     
     def simulate_27930_response(self, can_id, data, message_type):
-        """模拟27930响应"""
-        import random
-        import time
-        
-        # 模拟延迟
-        time.sleep(0.1)
-        
-        # 生成响应数据
-        response_data = []
-        for _ in range(8):
-            response_data.append(random.randint(0, 255))
-        
+        """模拟27930响应：数据在发送时按固定种子生成，延迟后由after()在界面线程中显示，不阻塞界面"""
+        response_data = bytes(self.can_response_random.getrandbits(8) for _ in range(CAN_DATA_LENGTH))
+        self.root.after(self.CAN_RESPONSE_DELAY, self.show_27930_response, can_id, response_data, message_type)
+    
+    def show_27930_response(self, can_id, response_data, message_type):
+        """显示一帧模拟的27930响应"""
         # 构建响应CAN数据包
-        response_can_data = [can_id >> 24, (can_id >> 16) & 0xFF, (can_id >> 8) & 0xFF, can_id & 0xFF] + response_data
+        response_can_data = pack_can_frame(can_id, response_data)
+        self.capture_can_frame(response_can_data, received=True)
         
         # 转换为十六进制字符串显示
-        response_hex = " ".join([f"{b:02X}" for b in response_can_data])
+        response_hex = format_hex(response_can_data)
         
         self.add_can_raw_data(f"[{self.get_timestamp()}] 接收: {response_hex}")
         
         # 解析响应数据
         self.add_can_parse_data(f"[{self.get_timestamp()}] 响应: {message_type}")
         self.add_can_parse_data(f"  CAN ID: {can_id:08X}")
-        self.add_can_parse_data(f"  响应数据: {' '.join([f'{d:02X}' for d in response_data])}")
+        self.add_can_parse_data(f"  响应数据: {format_hex(response_data)}")
     
     def clear_27930_data(self):
         """清空27930数据显示"""
-        self.can_raw_data_text.delete(1.0, tk.END)
-        self.can_parse_data_text.delete(1.0, tk.END)
+        for view in (self.can_raw_data_view, self.can_parse_data_view):
+            self.ui_pump.discard(view)
+            view.clear()
     
     def add_can_raw_data(self, data):
         """添加CAN原始数据"""
-        self.can_raw_data_text.insert(tk.END, data + "\n")
-        self.can_raw_data_text.see(tk.END)
+        self.ui_pump.write(self.can_raw_data_view, data)
     
     def add_can_parse_data(self, data):
         """添加CAN解析数据"""
-        self.can_parse_data_text.insert(tk.END, data + "\n")
-        self.can_parse_data_text.see(tk.END)
+        self.ui_pump.write(self.can_parse_data_view, data)
     
+    def handle_can_frame(self, frame, render=True):
+        """显示一帧回放的CAN报文（界面更新泵在界面线程中调用）"""
+        if not render:
+            return
+        direction = "接收" if frame.direction == DIRECTION_RX else "发送"
+        self.add_can_raw_data(f"[{self.get_timestamp()}] {direction}: {format_hex(pack_can_frame(frame.can_id, frame.data))}")
+        self.add_can_parse_data(f"[{self.get_timestamp()}] 回放{direction}: {message_name(frame.can_id)}")
+        self.add_can_parse_data(f"  CAN ID: {frame.can_id:08X}")
+        self.add_can_parse_data(f"  数据: {format_hex(frame.data)}")
+    
+    def summarize_can_frames(self, skipped, dropped):
+        """过载时一帧内未逐条显示的CAN报文汇总为一行"""
+        text = f"[{self.get_timestamp()}] 界面过载：省略 {len(skipped)} 帧CAN报文的显示"
+        if dropped:
+            text += f"，队列溢出丢弃 {dropped} 帧"
+        self.add_can_parse_data(text)
+    
+    def capture_can_frame(self, frame, received):
+        """记录一帧CAN报文（CAN ID 4字节 + 数据）"""
+        if self.frame_capture is None:
+            return
+        channel = self.frame_capture.channel(f"CAN{self.can_channel_var.get()}", LINK_CAN)
+        if received:
+            channel.rx(frame)
+        else:
+            channel.tx(frame)
+    
+    def toggle_capture(self):
+        """开启/关闭报文抓包"""
+        if self.capture_var.get() and self.frame_capture is None:
+            try:
+                self.frame_capture = CaptureWriter(self.CAPTURE_DIRECTORY)
+            except OSError as e:
+                self.capture_var.set(False)
+                self.add_raw_data(f"[{self.get_timestamp()}] 无法开启报文抓包: {e}")
+                return
+            if self.serial_worker is not None:
+                self.serial_worker.link.capture = self.frame_capture.channel(self.com_port_var.get(), LINK_MODBUS_RTU)
+            for callback in self.capture_listeners:
+                callback(self.frame_capture)
+        elif not self.capture_var.get() and self.frame_capture is not None:
+            self.stop_capture()
+            
+    def stop_capture(self):
+        """关闭抓包文件（写入时间索引）"""
+        capture = self.frame_capture
+        if capture is None:
+            return
+        self.frame_capture = None
+        if self.serial_worker is not None:
+            self.serial_worker.link.capture = None
+        for callback in self.capture_listeners:
+            callback(None)
+        capture.close()
+        stats = capture.stats()
+        self.add_raw_data(f"[{self.get_timestamp()}] 报文抓包已关闭: {stats['records']} 帧, 文件 {stats['path']}")
+    
+    def toggle_history(self):
+        """开启/关闭数据记录"""
+        if self.history_var.get() and self.history is None:
+            try:
+                self.history = TimeSeriesStore(self.HISTORY_DATABASE)
+            except sqlite3.Error as e:
+                self.history_var.set(False)
+                self.add_raw_data(f"[{self.get_timestamp()}] 无法开启数据记录: {e}")
+        elif not self.history_var.get() and self.history is not None:
+            self.stop_history()
+
+    def stop_history(self):
+        """写盘剩余的采样并关闭历史数据库"""
+        history = self.history
+        if history is None:
+            return
+        self.history = None
+        history.close()
+
+    def add_capture_listener(self, callback):
+        """登记抓包回调，立即以当前抓包入口（未开启时为None）调用一次"""
+        self.capture_listeners.append(callback)
+        callback(self.frame_capture)
+
+    def remove_capture_listener(self, callback):
+        """取消登记抓包回调，并以None调用一次（链路不再记录）"""
+        if callback in self.capture_listeners:
+            self.capture_listeners.remove(callback)
+            callback(None)
+
     def open_modbus_parser(self):
         """打开Modbus解析对码窗口"""
         parser_window = ModbusParserWindow(self.root)
 
+    def open_multiport(self):
+        """打开多串口轮询窗口"""
+        MultiPortWindow(self.root, self)
+
+    def open_discovery(self):
+        """打开从站扫描窗口"""
+        DiscoveryWindow(self.root, self)
+
+    def open_replay(self):
+        """打开报文回放窗口"""
+        ReplayWindow(self.root, self)
+
+    def open_trend(self):
+        """打开趋势图窗口"""
+        if self.history is None:
+            messagebox.showinfo("提示", "请先在测试菜单中开启数据记录")
+            return
+        TrendWindow(self.root, self.history)
+        
+    def open_metrics(self):
+        """打开总线统计窗口"""
+        MetricsWindow(self.root, self.bus_metrics)
+
+    def start_profiling(self):
+        """对之后的N个扫描周期做性能分析（cProfile和分阶段耗时），完成后保存到当前目录"""
+        if self.scan_profiler is not None:
+            messagebox.showinfo("提示", f"性能分析进行中，已完成 {self.scan_profiler.completed}/{self.scan_profiler.cycles} 个周期")
+            return
+        cycles = simpledialog.askinteger("性能分析", "分析的扫描周期数:", parent=self.root,
+                                         initialvalue=200, minvalue=1)
+        if not cycles:
+            return
+        output = os.path.join(os.getcwd(), time.strftime("profile_%Y%m%d_%H%M%S"))
+        profiler = self.scan_profiler = ScanProfiler(cycles, output)
+        # 日志视图的批量追加和渲染在界面更新泵每帧末尾执行，同样计为render阶段
+        self.ui_pump.profile_span = lambda: profiler.stages.span(STAGE_RENDER)
+        if self.serial_worker:
+            self.serial_worker.profiler = self.scan_profiler
+        self.add_raw_data(f"[{self.get_timestamp()}] 开始性能分析，{cycles} 个扫描周期")
+        
+    def finish_profiling(self):
+        """保存性能分析结果并显示分阶段耗时"""
+        profiler = self.scan_profiler
+        self.scan_profiler = None
+        self.ui_pump.profile_span = None
+        try:
+            stats_path, stages_path = profiler.save()
+        except OSError as e:
+            messagebox.showerror("错误", f"保存性能分析结果失败: {str(e)}")
+            return
+        self.add_raw_data(f"[{self.get_timestamp()}] 性能分析完成: {stats_path or '无cProfile数据'}, {stages_path}")
+        for line in format_breakdown(profiler.breakdown()).splitlines():
+            self.add_raw_data(f"[{self.get_timestamp()}] {line}")
+
 
 def main():
     """主函数"""
@@ -1288,6 +1498,8 @@ def main():
     
     # 启动应用
     root.mainloop()
+    app.stop_capture()
+    app.stop_history()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
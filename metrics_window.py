@@ -0,0 +1,178 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from modbus_metrics import MetricsExporter, write_snapshot, FORMAT_PROMETHEUS, FORMAT_JSON
+
+
+class MetricsWindow:
+    """总线统计窗口：按串口和从站显示请求速率、错误、延迟百分位数、收发字节、总线占用率和调度滞后，可导出快照"""
+
+    REFRESH_INTERVAL = 1000  # 刷新间隔（ms）
+
+    def __init__(self, parent, metrics):
+        self.parent = parent
+        self.metrics = metrics  # BusMetrics，由串口线程累计
+        self.window = tk.Toplevel(parent)
+        self.window.title("总线统计")
+        self.window.geometry("900x450")
+        self.window.minsize(700, 300)
+
+        self.exporter = None
+        self.refresh_timer = None
+
+        self.create_interface()
+        self.refresh()
+
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def create_interface(self):
+        """创建界面"""
+        self.status_var = tk.StringVar()
+        self.export_path_var = tk.StringVar(value="modbus_metrics.prom")
+        self.export_interval_var = tk.StringVar(value="10")
+        self.export_format_var = tk.StringVar(value=FORMAT_PROMETHEUS)
+
+        main_frame = ttk.Frame(self.window, padding="5")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(0, weight=1)
+
+        # 串口为一级节点，从站为二级节点
+        columns = ("requests", "errors", "rate", "p50", "p95", "p99", "bytes", "busy", "lag")
+        self.tree = ttk.Treeview(main_frame, columns=columns)
+        self.tree.heading("#0", text="串口/从站")
+        self.tree.column("#0", width=120)
+        for column, text, width in (("requests", "请求", 70), ("errors", "失败", 60), ("rate", "次/秒", 60),
+                                    ("p50", "p50 ms", 60), ("p95", "p95 ms", 60), ("p99", "p99 ms", 60),
+                                    ("bytes", "发送/接收字节", 120), ("busy", "总线占用", 70),
+                                    ("lag", "调度滞后p99 ms", 100)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=tk.E)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        # 导出
+        export_frame = ttk.LabelFrame(main_frame, text="导出", padding="5")
+        export_frame.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        export_frame.columnconfigure(1, weight=1)
+
+        ttk.Label(export_frame, text="文件:").grid(row=0, column=0, sticky=tk.W)
+        ttk.Entry(export_frame, textvariable=self.export_path_var).grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5)
+        ttk.Button(export_frame, text="浏览", command=self.browse_export_path, width=6).grid(row=0, column=2)
+        ttk.Combobox(export_frame, textvariable=self.export_format_var, values=[FORMAT_PROMETHEUS, FORMAT_JSON],
+                     state="readonly", width=6).grid(row=0, column=3, padx=5)
+        ttk.Label(export_frame, text="间隔(s):").grid(row=0, column=4)
+        ttk.Entry(export_frame, textvariable=self.export_interval_var, width=6).grid(row=0, column=5, padx=5)
+        self.auto_export_button = ttk.Button(export_frame, text="定时导出", command=self.toggle_auto_export)
+        self.auto_export_button.grid(row=0, column=6)
+        ttk.Button(export_frame, text="导出一次", command=self.export_once).grid(row=0, column=7, padx=5)
+        ttk.Button(export_frame, text="清零", command=self.reset_metrics).grid(row=0, column=8)
+
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+
+    def format_row(self, entry, lag=""):
+        """把快照中的一项格式化为表格行"""
+        return (entry["requests"], entry["errors"], f"{entry['rate']:.1f}", f"{entry['p50_ms']:.1f}",
+                f"{entry['p95_ms']:.1f}", f"{entry['p99_ms']:.1f}", f"{entry['bytes_out']}/{entry['bytes_in']}",
+                f"{entry['utilisation'] * 100:.1f}%", lag)
+
+    def update_table(self):
+        """按当前快照刷新表格，保留已有节点和展开状态"""
+        snapshot = self.metrics.snapshot()
+        seen = set()
+        for entry in snapshot["ports"]:
+            port_id = f"port:{entry['port']}"
+            seen.add(port_id)
+            values = self.format_row(entry, f"{entry['lag_p99_ms']:.1f}")
+            if self.tree.exists(port_id):
+                self.tree.item(port_id, values=values)
+            else:
+                self.tree.insert("", tk.END, iid=port_id, text=entry["port"] or "主界面串口", values=values, open=True)
+        for entry in snapshot["slaves"]:
+            slave_id = f"slave:{entry['port']}:{entry['slave']}"
+            seen.add(slave_id)
+            values = self.format_row(entry)
+            if self.tree.exists(slave_id):
+                self.tree.item(slave_id, values=values)
+            else:
+                self.tree.insert(f"port:{entry['port']}", tk.END, iid=slave_id, text=f"从站{entry['slave']}",
+                                 values=values)
+        for port_id in self.tree.get_children():
+            for slave_id in self.tree.get_children(port_id):
+                if slave_id not in seen:
+                    self.tree.delete(slave_id)
+            if port_id not in seen:
+                self.tree.delete(port_id)
+
+        total = sum(entry["requests"] for entry in snapshot["ports"])
+        status = f"统计 {snapshot['uptime_s']:.0f}s, 共 {total} 次请求"
+        if self.exporter is not None:
+            status += f", 已定时导出 {self.exporter.exports} 次"
+            if self.exporter.last_error:
+                status += f"（最近一次失败: {self.exporter.last_error}）"
+        self.status_var.set(status)
+
+    def refresh(self):
+        """定时刷新（在界面线程中运行）"""
+        self.update_table()
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def browse_export_path(self):
+        """选择导出文件"""
+        if self.export_format_var.get() == FORMAT_JSON:
+            filetypes = [("JSON文件", "*.json"), ("所有文件", "*.*")]
+        else:
+            filetypes = [("Prometheus文本", "*.prom"), ("所有文件", "*.*")]
+        path = filedialog.asksaveasfilename(parent=self.window, title="导出统计", filetypes=filetypes,
+                                            defaultextension=filetypes[0][1][1:])
+        if path:
+            self.export_path_var.set(path)
+
+    def export_once(self):
+        """立即导出一次快照"""
+        path = self.export_path_var.get().strip()
+        if not path:
+            messagebox.showwarning("警告", "请输入导出文件", parent=self.window)
+            return
+        try:
+            write_snapshot(self.metrics, path, self.export_format_var.get())
+            self.status_var.set(f"已导出到 {path}")
+        except OSError as e:
+            messagebox.showerror("错误", f"导出失败: {str(e)}", parent=self.window)
+
+    def toggle_auto_export(self):
+        """开始/停止定时导出"""
+        if self.exporter is not None:
+            self.exporter.stop()
+            self.exporter = None
+            self.auto_export_button.config(text="定时导出")
+            return
+        path = self.export_path_var.get().strip()
+        try:
+            interval = float(self.export_interval_var.get())
+            if not path or interval <= 0:
+                raise ValueError("文件不能为空，间隔必须大于0")
+        except ValueError as e:
+            messagebox.showerror("错误", f"参数错误: {str(e)}", parent=self.window)
+            return
+        self.exporter = MetricsExporter(self.metrics, path, interval, self.export_format_var.get())
+        self.exporter.start()
+        self.auto_export_button.config(text="停止导出")
+
+    def reset_metrics(self):
+        """清零统计"""
+        self.metrics.reset()
+        self.tree.delete(*self.tree.get_children())
+        self.update_table()
+
+    def on_closing(self):
+        """窗口关闭事件"""
+        if self.refresh_timer is not None:
+            self.window.after_cancel(self.refresh_timer)
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.window.destroy()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus事务分类计数
+把每次事务归类为成功、异常响应（按异常码）、CRC错误、超时、格式错误、非预期来源或传输错误，
+按(从站, 功能码, 分类)累计计数；记录一次只是一次字典查找和加一
+"""
+
+import threading
+
+from modbus_frame import STATUSES, STATUS_EXCEPTION, exception_name
+
+
+class TransactionCounters:
+    """按从站、功能码和结果分类累计的事务计数（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {}            # (从站, 功能码, 分类) -> 次数
+        self.exception_counts = {}  # (从站, 功能码, 异常码) -> 次数
+
+    def record(self, result):
+        """记录一次事务结果，返回分类"""
+        request = result.request
+        status = result.status
+        key = (request.slave, request.function_code, status)
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if status == STATUS_EXCEPTION:
+                code_key = (request.slave, request.function_code, result.error.exception_code)
+                self.exception_counts[code_key] = self.exception_counts.get(code_key, 0) + 1
+        return status
+
+    def reset(self):
+        """清零"""
+        with self._lock:
+            self.counts = {}
+            self.exception_counts = {}
+
+    def totals(self):
+        """各分类的总次数"""
+        totals = dict.fromkeys(STATUSES, 0)
+        with self._lock:
+            for (slave, function_code, status), count in self.counts.items():
+                totals[status] += count
+        return totals
+
+    def table(self):
+        """
+        按(从站, 功能码)汇总的计数表：[{"slave", "function_code", "total", 各分类次数, "exceptions": {异常码: 次数}}]
+        """
+        rows = {}
+        with self._lock:
+            for (slave, function_code, status), count in self.counts.items():
+                row = rows.get((slave, function_code))
+                if row is None:
+                    row = rows[(slave, function_code)] = dict(
+                        slave=slave, function_code=function_code, total=0, exceptions={}, **dict.fromkeys(STATUSES, 0))
+                row[status] += count
+                row["total"] += count
+            for (slave, function_code, code), count in self.exception_counts.items():
+                rows[(slave, function_code)]["exceptions"][code] = count
+        return [rows[key] for key in sorted(rows)]
+
+
+def format_counters(row):
+    """把table()中的一行格式化为文本，只列出非零的分类"""
+    parts = [f"{status} {row[status]}" for status in STATUSES if row[status]]
+    text = f"从站{row['slave']} 功能码{row['function_code']:02d}: 共 {row['total']} 次, " + ", ".join(parts)
+    if row["exceptions"]:
+        text += " (" + ", ".join(f"异常码{code:02X} {exception_name(code)} {count}次"
+                                 for code, count in sorted(row["exceptions"].items())) + ")"
+    return text
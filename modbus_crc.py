@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus CRC16校验模块
+查表法计算CRC16（多项式0xA001，初值0xFFFF），支持增量计算和批量校验
+"""
+
+CRC16_INIT = 0xFFFF
+
+
+def _build_crc16_table():
+    """生成256项CRC16查找表"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC16_TABLE = _build_crc16_table()
+
+
+def crc16(data, crc=CRC16_INIT):
+    """计算CRC16校验码，data可以是bytes/bytearray/memoryview或整数列表"""
+    table = CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def crc16_bytes(data):
+    """返回CRC16的两个字节（低字节在前，符合Modbus RTU帧顺序）"""
+    crc = crc16(data)
+    return bytes((crc & 0xFF, crc >> 8))
+
+
+def append_crc(data):
+    """在数据后追加CRC16，返回完整的bytes帧"""
+    return bytes(data) + crc16_bytes(data)
+
+
+def check_frame(frame):
+    """校验带CRC的完整帧，正确时返回True"""
+    if len(frame) < 3:  # 至少需要1字节数据和2字节CRC
+        return False
+    # 对整帧（含CRC）计算CRC，结果为0说明校验正确
+    return crc16(frame) == 0
+
+
+def verify_frames(frames):
+    """批量校验多个帧，返回与输入顺序一致的布尔值列表"""
+    table = CRC16_TABLE
+    results = []
+    append = results.append
+    for frame in frames:
+        if len(frame) < 3:
+            append(False)
+            continue
+        crc = CRC16_INIT
+        for byte in frame:
+            crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+        append(crc == 0)
+    return results
+
+
+class Crc16:
+    """增量CRC16计算器，可以随串口数据到达逐段喂入"""
+
+    def __init__(self, data=b""):
+        self.crc = CRC16_INIT
+        self.length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data):
+        """喂入一段数据，返回当前CRC"""
+        self.crc = crc16(data, self.crc)
+        self.length += len(data)
+        return self.crc
+
+    def reset(self):
+        """重置为初始状态"""
+        self.crc = CRC16_INIT
+        self.length = 0
+
+    @property
+    def value(self):
+        """当前CRC值"""
+        return self.crc
+
+    def digest(self):
+        """当前CRC的两个字节（低字节在前）"""
+        return bytes((self.crc & 0xFF, self.crc >> 8))
+
+    def is_valid(self):
+        """已喂入的数据包含CRC时，判断整帧校验是否正确"""
+        return self.length >= 3 and self.crc == 0
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus从站地址扫描
+对地址1-247逐个发送一个很小的读请求（功能码03读1个寄存器），超时按波特率算出的帧传输时间加少量余量，
+115200波特率下整轮扫描只需几秒；之后各轮用更长的超时重新探测：串口只探测有迹象的地址（响应迟到、CRC错误），
+Modbus TCP（网关后的从站可能比首轮超时慢，迟到的响应又会因事务号不符被丢弃而看不到迹象）重新探测全部无响应地址，
+有响应的从站再逐个试探功能码01-04，记录哪些返回数据、哪些返回异常码；
+同一串口上只能串行探测（半双工总线），多个串口由各自的线程并行扫描
+"""
+
+import threading
+import time
+
+from modbus_frame import (
+    ModbusRequest, READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS,
+    STATUS_OK, STATUS_EXCEPTION, STATUS_TIMEOUT, STATUS_LINK_ERROR,
+)
+from modbus_serial import char_time, frame_gap
+
+FIRST_ADDRESS = 1
+LAST_ADDRESS = 247
+
+# 探测用的请求和响应长度（字节）：功能码03读1个寄存器
+PROBE_REQUEST_LENGTH = 8
+PROBE_RESPONSE_LENGTH = 7
+
+# 从站处理请求的时间余量（秒），大多数设备在几毫秒内响应
+TURNAROUND_MARGIN = 0.01
+# 无波特率的链路（Modbus TCP）的首轮超时
+NETWORK_PROBE_TIMEOUT = 0.05
+# 各轮探测的超时倍数，第一轮之后只重新探测有迹象的地址
+DEFAULT_PASSES = (1, 4, 16)
+MAX_PROBE_TIMEOUT = 1.0
+
+# 能力探测的功能码（只读，不向未知设备写入）
+PROBE_FUNCTIONS = (READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+
+# 能力探测结果
+SUPPORT_DATA = "data"
+SUPPORT_EXCEPTION = "exception"
+SUPPORT_NO_RESPONSE = "no_response"
+
+
+def probe_timeout(baudrate):
+    """首轮探测超时（秒）：请求和响应的传输时间 + 两个t3.5间隔 + 从站处理余量"""
+    if not baudrate:
+        return NETWORK_PROBE_TIMEOUT
+    transfer = (PROBE_REQUEST_LENGTH + PROBE_RESPONSE_LENGTH) * char_time(baudrate)
+    return transfer + 2 * frame_gap(baudrate) + TURNAROUND_MARGIN
+
+
+class SlaveInfo:
+    """扫描到的一个从站"""
+
+    def __init__(self, port, slave, timeout, latency):
+        self.port = port
+        self.slave = slave
+        self.timeout = timeout    # 探测到时使用的超时（秒）
+        self.latency = latency    # 探测请求的响应时间（秒）
+        self.functions = {}       # 功能码 -> (SUPPORT_*, 异常码或None)
+
+    def supported(self):
+        """返回数据的功能码"""
+        return [code for code, (support, exception_code) in sorted(self.functions.items()) if support == SUPPORT_DATA]
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        return {
+            "port": self.port,
+            "slave": self.slave,
+            "latency_ms": round(self.latency * 1000, 3),
+            "probe_timeout_ms": round(self.timeout * 1000, 1),
+            "functions": {f"{code:02d}": support if exception_code is None else f"{support}:{exception_code:02X}"
+                          for code, (support, exception_code) in sorted(self.functions.items())},
+        }
+
+    def summary(self):
+        """一行文本摘要"""
+        parts = []
+        for code, (support, exception_code) in sorted(self.functions.items()):
+            if support == SUPPORT_DATA:
+                parts.append(f"{code:02d}:数据")
+            elif support == SUPPORT_EXCEPTION:
+                parts.append(f"{code:02d}:异常{exception_code:02X}")
+            else:
+                parts.append(f"{code:02d}:无响应")
+        return f"从站{self.slave} 响应 {self.latency * 1000:.1f}ms" + (f", 功能码 {' '.join(parts)}" if parts else "")
+
+
+def probe(link, slave, timeout, function_code=READ_HOLDING_REGISTERS):
+    """发送一个读1个点的请求，返回ModbusResult"""
+    return link.transact(ModbusRequest(slave, function_code, 0, 1), timeout)
+
+
+def probe_functions(link, info, timeout, functions=PROBE_FUNCTIONS):
+    """逐个试探功能码，记录到info.functions"""
+    for function_code in functions:
+        result = probe(link, info.slave, timeout, function_code)
+        status = result.status
+        if status == STATUS_OK:
+            info.functions[function_code] = (SUPPORT_DATA, None)
+        elif status == STATUS_EXCEPTION:
+            info.functions[function_code] = (SUPPORT_EXCEPTION, result.error.exception_code)
+        else:
+            info.functions[function_code] = (SUPPORT_NO_RESPONSE, None)
+
+
+def sweep(link, port=None, addresses=None, passes=DEFAULT_PASSES, functions=PROBE_FUNCTIONS,
+          on_event=None, should_stop=None, full_reprobe=None):
+    """
+    在一个链路上扫描从站，返回按地址排序的SlaveInfo列表
+    passes为各轮超时相对首轮超时的倍数：第一轮探测全部地址，之后各轮用更长的超时重新探测全部无响应的地址；
+    full_reprobe为None时按链路决定：串口只重新探测有迹象的地址——响应迟到被下一次探测收到（报文中的从站地址）、
+    CRC错误或响应不完整的地址，无波特率的网络链路重新探测全部无响应地址；True/False强制其中一种
+    functions为空时不做能力探测
+    on_event(事件, 数据)报告进度：("probe", (轮次, 地址))、("found", SlaveInfo)、("pass", (轮次, 下一轮待探测数))、
+    ("functions", SlaveInfo)（能力探测完成）
+    """
+    if addresses is None:
+        addresses = range(FIRST_ADDRESS, LAST_ADDRESS + 1)
+    addresses = list(addresses)
+    valid = set(addresses)
+    baudrate = getattr(link, "baudrate", None)
+    base_timeout = probe_timeout(baudrate)
+    if full_reprobe is None:
+        # 网络链路丢弃事务号不符的迟到响应，迟到不会留下迹象，只能全部重新探测
+        full_reprobe = not baudrate
+    pending = addresses
+    found = {}
+    for index, factor in enumerate(passes):
+        timeout = min(MAX_PROBE_TIMEOUT, base_timeout * factor)
+        suspects = set()
+        for slave in pending:
+            if should_stop is not None and should_stop():
+                return [found[slave] for slave in sorted(found)]
+            if on_event is not None:
+                on_event("probe", (index, slave))
+            result = probe(link, slave, timeout)
+            status = result.status
+            if status in (STATUS_OK, STATUS_EXCEPTION):
+                # 异常响应同样说明该地址有从站
+                info = found[slave] = SlaveInfo(port, slave, timeout, result.elapsed)
+                if status == STATUS_OK:
+                    info.functions[READ_HOLDING_REGISTERS] = (SUPPORT_DATA, None)
+                else:
+                    info.functions[READ_HOLDING_REGISTERS] = (SUPPORT_EXCEPTION, result.error.exception_code)
+                if on_event is not None:
+                    on_event("found", info)
+            elif status == STATUS_LINK_ERROR:
+                raise result.error
+            elif status != STATUS_TIMEOUT:
+                # 收到了字节但不是本地址的有效响应：可能是本地址响应受损，也可能是之前某个地址的迟到响应
+                suspects.add(slave)
+                if result.response and result.response[0] in valid:
+                    suspects.add(result.response[0])
+        if full_reprobe:
+            pending = [slave for slave in addresses if slave not in found]
+        else:
+            pending = sorted(suspects - set(found))
+        if on_event is not None:
+            on_event("pass", (index, len(pending)))
+        if not pending:
+            break
+    if functions:
+        for slave in sorted(found):
+            if should_stop is not None and should_stop():
+                break
+            info = found[slave]
+            # 能力探测用已知的响应时间确定超时，慢从站不会被误判为不支持
+            timeout = min(MAX_PROBE_TIMEOUT, max(info.timeout, info.latency * 2 + TURNAROUND_MARGIN))
+            probe_functions(link, info, timeout, [code for code in functions if code not in info.functions])
+            if on_event is not None:
+                on_event("functions", info)
+    return [found[slave] for slave in sorted(found)]
+
+
+class DiscoveryRun:
+    """多串口并行扫描：每个链路一个线程，结果按串口汇总"""
+
+    def __init__(self, links, addresses=None, passes=DEFAULT_PASSES, functions=PROBE_FUNCTIONS, on_event=None,
+                 full_reprobe=None):
+        self.links = links  # 串口名 -> 链路
+        self.addresses = list(addresses) if addresses is not None else list(range(FIRST_ADDRESS, LAST_ADDRESS + 1))
+        self.passes = passes
+        self.functions = functions
+        self.full_reprobe = full_reprobe
+        self.on_event = on_event  # on_event(串口, 事件, 数据)，在扫描线程中调用
+        self.results = {}  # 串口名 -> [SlaveInfo]
+        self.errors = {}   # 串口名 -> 异常
+        self.started = 0.0
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def _run_port(self, port, link):
+        """一个串口的扫描线程"""
+        def on_event(event, data):
+            if self.on_event is not None:
+                self.on_event(port, event, data)
+        try:
+            self.results[port] = sweep(link, port, self.addresses, self.passes, self.functions,
+                                       on_event, self._stop_event.is_set, self.full_reprobe)
+        except Exception as e:
+            self.errors[port] = e
+            on_event("error", e)
+
+    def start(self):
+        """启动各串口的扫描线程"""
+        self.started = time.perf_counter()
+        for port, link in self.links.items():
+            thread = threading.Thread(target=self._run_port, args=(port, link), name=f"modbus-discover-{port}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def running(self):
+        """是否还有串口在扫描"""
+        return any(thread.is_alive() for thread in self._threads)
+
+    def join(self, timeout=None):
+        """等待全部串口扫描完成"""
+        for thread in self._threads:
+            thread.join(timeout)
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def stop(self):
+        """请求停止（当前探测完成后退出）"""
+        self._stop_event.set()
+
+    def slaves(self):
+        """全部串口扫描到的从站"""
+        return [info for port in self.links for info in self.results.get(port, [])]
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus帧构建与解码模块（不依赖tkinter）
+提供PDU/RTU帧构建、响应长度推算和响应数据解码，供界面、命令行和各传输层共用
+"""
+
+import struct
+
+from modbus_crc import crc16, check_frame
+
+# 功能码
+READ_COILS = 0x01
+READ_DISCRETE_INPUTS = 0x02
+READ_HOLDING_REGISTERS = 0x03
+READ_INPUT_REGISTERS = 0x04
+WRITE_SINGLE_COIL = 0x05
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_COILS = 0x0F
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+READ_BIT_FUNCTIONS = (READ_COILS, READ_DISCRETE_INPUTS)
+READ_REGISTER_FUNCTIONS = (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+READ_FUNCTIONS = READ_BIT_FUNCTIONS + READ_REGISTER_FUNCTIONS
+WRITE_BIT_FUNCTIONS = (WRITE_SINGLE_COIL, WRITE_MULTIPLE_COILS)
+WRITE_REGISTER_FUNCTIONS = (WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_REGISTERS)
+WRITE_FUNCTIONS = WRITE_BIT_FUNCTIONS + WRITE_REGISTER_FUNCTIONS
+
+# 数据表名（与线圈/寄存器映像的属性名一致）及各功能码访问的数据表
+COILS = "coils"
+DISCRETE_INPUTS = "discrete_inputs"
+HOLDING_REGISTERS = "holding_registers"
+INPUT_REGISTERS = "input_registers"
+FUNCTION_TABLES = {
+    READ_COILS: COILS,
+    READ_DISCRETE_INPUTS: DISCRETE_INPUTS,
+    READ_HOLDING_REGISTERS: HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS: INPUT_REGISTERS,
+    WRITE_SINGLE_COIL: COILS,
+    WRITE_SINGLE_REGISTER: HOLDING_REGISTERS,
+    WRITE_MULTIPLE_COILS: COILS,
+    WRITE_MULTIPLE_REGISTERS: HOLDING_REGISTERS,
+}
+# 每个数据表的地址空间大小
+TABLE_SIZE = 65536
+
+# 协议规定的单次读取上限
+MAX_READ_BITS = 2000
+MAX_READ_REGISTERS = 125
+# 协议规定的单次写入上限
+MAX_WRITE_BITS = 1968
+MAX_WRITE_REGISTERS = 123
+
+_READ_PDU = struct.Struct(">BHH")
+_WRITE_MULTIPLE_PDU = struct.Struct(">BHHB")
+
+
+class ModbusError(Exception):
+    """Modbus通讯错误基类"""
+
+
+class ModbusTimeoutError(ModbusError):
+    """从站响应超时"""
+
+
+class ModbusCrcError(ModbusError):
+    """响应CRC校验失败"""
+
+
+class ModbusFrameError(ModbusError):
+    """响应帧格式错误（长度、从站地址或功能码不匹配）"""
+
+
+class ModbusSourceError(ModbusFrameError):
+    """响应来自非预期的从站（从站地址或单元号不匹配）"""
+
+
+class ModbusExceptionError(ModbusError):
+    """从站返回异常响应（功能码|0x80 + 异常码）"""
+
+    def __init__(self, function_code, exception_code):
+        self.function_code = function_code
+        self.exception_code = exception_code
+        super().__init__(f"功能码{function_code:02d}异常响应，异常码{exception_code:02X}"
+                         f"（{exception_name(exception_code)}）")
+
+
+# 异常码及含义
+EXCEPTION_CODES = {
+    0x01: "非法功能",
+    0x02: "非法数据地址",
+    0x03: "非法数据值",
+    0x04: "从站设备故障",
+    0x05: "确认（请求已接受，处理需要较长时间）",
+    0x06: "从站设备忙",
+    0x08: "存储奇偶性差错",
+    0x0A: "网关路径不可用",
+    0x0B: "网关目标设备响应失败",
+}
+
+
+def exception_name(exception_code):
+    """异常码的含义"""
+    return EXCEPTION_CODES.get(exception_code, "未知异常码")
+
+
+# 事务结果分类
+STATUS_OK = "ok"
+STATUS_EXCEPTION = "exception"
+STATUS_CRC_ERROR = "crc_error"
+STATUS_TIMEOUT = "timeout"
+STATUS_MALFORMED = "malformed"
+STATUS_UNEXPECTED_SOURCE = "unexpected_source"
+STATUS_LINK_ERROR = "link_error"
+STATUSES = (STATUS_OK, STATUS_EXCEPTION, STATUS_CRC_ERROR, STATUS_TIMEOUT, STATUS_MALFORMED,
+            STATUS_UNEXPECTED_SOURCE, STATUS_LINK_ERROR)
+
+
+def classify_error(error):
+    """把事务错误归类为STATUSES之一"""
+    if error is None:
+        return STATUS_OK
+    if isinstance(error, ModbusExceptionError):
+        return STATUS_EXCEPTION
+    if isinstance(error, ModbusCrcError):
+        return STATUS_CRC_ERROR
+    if isinstance(error, ModbusTimeoutError):
+        return STATUS_TIMEOUT
+    if isinstance(error, ModbusSourceError):
+        return STATUS_UNEXPECTED_SOURCE
+    if isinstance(error, ModbusFrameError):
+        return STATUS_MALFORMED
+    # 串口/网络异常等传输层错误
+    return STATUS_LINK_ERROR
+
+
+def parse_function_code(text):
+    """把界面上的功能码文本（如"03 - 读保持寄存器"或"03"）转换为整数"""
+    return int(str(text).split(" - ")[0], 10)
+
+
+def build_read_pdu(function_code, address, count):
+    """构建读请求PDU（功能码 + 起始地址 + 数量）"""
+    return _READ_PDU.pack(function_code, address, count)
+
+
+def encode_bits(values):
+    """把0/1列表编码为线圈数据字节（低位在前）"""
+    data = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value:
+            data[i >> 3] |= 1 << (i & 7)
+    return bytes(data)
+
+
+def check_write_values(function_code, values):
+    """检查写入值的范围（线圈为0/1，寄存器为0-65535），超出范围时抛出ValueError，不截断写入其他值"""
+    if function_code in WRITE_BIT_FUNCTIONS:
+        for value in values:
+            if value not in (0, 1):
+                raise ValueError(f"线圈值应为0或1: {value}")
+    else:
+        for value in values:
+            if not 0 <= value <= 0xFFFF:
+                raise ValueError(f"寄存器值应为0-65535: {value}")
+
+
+def build_write_pdu(function_code, address, values):
+    """构建写请求PDU：05/06写单个值，15/16写多个值"""
+    check_write_values(function_code, values)
+    if function_code == WRITE_SINGLE_COIL:
+        return _READ_PDU.pack(function_code, address, 0xFF00 if values[0] else 0x0000)
+    if function_code == WRITE_SINGLE_REGISTER:
+        return _READ_PDU.pack(function_code, address, values[0])
+    count = len(values)
+    if function_code == WRITE_MULTIPLE_COILS:
+        if not 1 <= count <= MAX_WRITE_BITS:
+            raise ValueError(f"写线圈数量应为1-{MAX_WRITE_BITS}")
+        data = encode_bits(values)
+    elif function_code == WRITE_MULTIPLE_REGISTERS:
+        if not 1 <= count <= MAX_WRITE_REGISTERS:
+            raise ValueError(f"写寄存器数量应为1-{MAX_WRITE_REGISTERS}")
+        data = struct.pack(f">{count}H", *values)
+    else:
+        raise ValueError(f"不是写功能码: {function_code:02d}")
+    return _WRITE_MULTIPLE_PDU.pack(function_code, address, count, len(data)) + data
+
+
+def rtu_frame(slave, pdu):
+    """给PDU加上从站地址和CRC，生成RTU帧"""
+    adu = bytes((slave,)) + pdu
+    crc = crc16(adu)
+    return adu + bytes((crc & 0xFF, crc >> 8))
+
+
+def build_read_request(slave, function_code, address, count):
+    """构建读请求RTU帧"""
+    return rtu_frame(slave, build_read_pdu(function_code, address, count))
+
+
+def build_write_request(slave, function_code, address, values):
+    """构建写请求RTU帧"""
+    return rtu_frame(slave, build_write_pdu(function_code, address, values))
+
+
+def expected_response_length(function_code, count):
+    """推算正常响应RTU帧的总长度（含从站地址和CRC）"""
+    if function_code in READ_BIT_FUNCTIONS:
+        return 5 + (count + 7) // 8
+    if function_code in READ_REGISTER_FUNCTIONS:
+        return 5 + count * 2
+    # 写操作响应固定为 地址+功能码+4字节+CRC
+    return 8
+
+
+def decode_registers(data):
+    """把寄存器数据字节（大端）解码为整数列表"""
+    return list(struct.unpack(f">{len(data) // 2}H", data[:len(data) // 2 * 2]))
+
+
+def decode_bits(data, count):
+    """把线圈/离散输入数据字节（低位在前）解码为0/1列表"""
+    bits = []
+    for i in range(count):
+        bits.append((data[i >> 3] >> (i & 7)) & 1)
+    return bits
+
+
+def check_response(frame, slave, function_code):
+    """检查RTU响应帧的CRC、从站地址、功能码，异常响应时抛出ModbusExceptionError"""
+    if len(frame) < 5:
+        raise ModbusFrameError(f"响应长度不足: {len(frame)}字节")
+    if not check_frame(frame):
+        raise ModbusCrcError("响应CRC校验失败")
+    if frame[0] != slave:
+        raise ModbusSourceError(f"从站地址不匹配: 期望{slave}, 收到{frame[0]}")
+    if frame[1] == (function_code | 0x80):
+        raise ModbusExceptionError(function_code, frame[2])
+    if frame[1] != function_code:
+        raise ModbusFrameError(f"功能码不匹配: 期望{function_code:02d}, 收到{frame[1]:02d}")
+
+
+def decode_read_pdu(pdu, function_code, count):
+    """解码读响应PDU（功能码 + 字节数 + 数据），返回数值列表"""
+    byte_count = pdu[1]
+    data = pdu[2:2 + byte_count]
+    if len(data) != byte_count:
+        raise ModbusFrameError("响应数据长度与字节数不一致")
+    if function_code in READ_BIT_FUNCTIONS:
+        if byte_count < (count + 7) // 8:
+            raise ModbusFrameError("响应数据字节数不足")
+        return decode_bits(data, count)
+    if byte_count < count * 2:
+        raise ModbusFrameError("响应数据字节数不足")
+    return decode_registers(data[:count * 2])
+
+
+def check_write_echo(pdu, request_pdu):
+    """写响应应回显请求的地址和值（05/06）或地址和数量（15/16）"""
+    if len(pdu) < 5 or pdu[1:5] != request_pdu[1:5]:
+        raise ModbusFrameError("写响应的地址或数量与请求不一致")
+
+
+def decode_read_response(frame, slave, function_code, count):
+    """校验并解码读响应RTU帧，返回数值列表"""
+    check_response(frame, slave, function_code)
+    return decode_read_pdu(frame[1:-2], function_code, count)
+
+
+class ModbusRequest:
+    """一次Modbus RTU请求"""
+
+    __slots__ = ("slave", "function_code", "address", "count", "frame", "expected_length", "tag")
+
+    def __init__(self, slave, function_code, address, count, frame=None, tag=None):
+        self.slave = slave
+        self.function_code = function_code
+        self.address = address
+        self.count = count
+        if frame is None:
+            frame = build_read_request(slave, function_code, address, count)
+        self.frame = frame
+        self.expected_length = expected_response_length(function_code, count)
+        self.tag = tag
+
+    @classmethod
+    def write(cls, slave, function_code, address, values, tag=None):
+        """创建写请求，values为寄存器值或线圈0/1列表"""
+        return cls(slave, function_code, address, len(values),
+                   build_write_request(slave, function_code, address, values), tag)
+
+    @property
+    def pdu(self):
+        """请求PDU（去掉从站地址和CRC），用于Modbus TCP"""
+        return self.frame[1:-2]
+
+    def __repr__(self):
+        return (f"ModbusRequest(slave={self.slave}, fc={self.function_code:02d}, "
+                f"address={self.address}, count={self.count})")
+
+
+class ModbusResult:
+    """一次Modbus事务的结果：请求、原始响应、解码值或错误"""
+
+    __slots__ = ("request", "response", "values", "error", "elapsed", "timestamp", "port")
+
+    def __init__(self, request, response=b"", values=None, error=None, elapsed=0.0, timestamp=0.0, port=None):
+        self.request = request
+        self.response = response
+        self.values = values
+        self.error = error
+        self.elapsed = elapsed
+        self.timestamp = timestamp
+        self.port = port  # 多串口轮询时标记结果来自哪个串口
+
+    @property
+    def ok(self):
+        """事务是否成功"""
+        return self.error is None
+
+    @property
+    def status(self):
+        """事务结果分类（STATUS_*）"""
+        return classify_error(self.error)
+
+    def decode(self):
+        """根据请求解码响应，失败时记录错误"""
+        request = self.request
+        try:
+            response = self.response
+            if not response:
+                raise ModbusTimeoutError("响应超时")
+            if len(response) < request.expected_length and not (len(response) >= 5 and response[1] & 0x80):
+                # 超时前只收到部分字节
+                raise ModbusFrameError(f"响应不完整: 期望{request.expected_length}字节, 收到{len(response)}字节")
+            if request.function_code in READ_FUNCTIONS:
+                self.values = decode_read_response(self.response, request.slave,
+                                                   request.function_code, request.count)
+            else:
+                check_response(self.response, request.slave, request.function_code)
+                check_write_echo(self.response[1:-2], request.pdu)
+                self.values = []
+        except ModbusError as e:
+            self.error = e
+        return self
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+轮询数值的时间序列存储（标准库sqlite3，WAL模式，不依赖tkinter）
+每个点位（串口, 从站, 数据表, 地址）一条序列。采样只追加到内存中的块（加锁后追加到array，不做磁盘I/O），
+后台线程定时把有新数据的块写入数据库：每块一行，时间戳和数值分别差分编码后zlib压缩成列，
+并保存块的起止时间、最小值、最大值、总和和最后值。写满的块不再改写，未写满的块每次写盘时整行更新。
+范围查询按(序列, 结束时间)索引只读取相关的块；降采样读取时完全落在一个时间桶内的块直接用块摘要，不解压。
+1秒1次、变化不频繁的数值压缩后每个采样约1字节，超过保留天数的块定时删除
+"""
+
+import bisect
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+
+from modbus_frame import FUNCTION_TABLES, READ_FUNCTIONS, parse_function_code
+
+DEFAULT_FLUSH_INTERVAL = 10.0   # 写盘间隔（秒），异常退出时最多丢失这段时间内的采样
+DEFAULT_CHUNK_SAMPLES = 1024    # 每块的采样数，写满后开始新块
+DEFAULT_MIN_INTERVAL = 1.0      # 同一点位两次采样的最小间隔（秒），更快的轮询结果不入库；0为全部保存
+MIN_INTERVAL_TOLERANCE = 0.1    # 最小间隔允许的抖动比例，按该间隔轮询时不会因为定时抖动丢采样
+DEFAULT_RETENTION_DAYS = 30    # 默认保留天数，0为不限
+PRUNE_INTERVAL = 3600.0         # 按保留天数删除旧数据的间隔（秒）
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    port TEXT NOT NULL,
+    slave INTEGER NOT NULL,
+    tbl TEXT NOT NULL,
+    address INTEGER NOT NULL,
+    UNIQUE (port, slave, tbl, address)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    series_id INTEGER NOT NULL,
+    start_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min_value INTEGER NOT NULL,
+    max_value INTEGER NOT NULL,
+    sum_value INTEGER NOT NULL,
+    last_value INTEGER NOT NULL,
+    times BLOB NOT NULL,
+    vals BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chunks_series_end ON chunks (series_id, end_ms);
+"""
+
+
+def encode_column(values):
+    """差分编码（小端int64）后压缩"""
+    deltas = array("q", values)
+    for index in range(len(deltas) - 1, 0, -1):
+        deltas[index] -= deltas[index - 1]
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes())
+
+
+def decode_column(blob):
+    """encode_column的逆过程，返回array('q')"""
+    values = array("q")
+    values.frombytes(zlib.decompress(blob))
+    if sys.byteorder == "big":
+        values.byteswap()
+    total = 0
+    for index, delta in enumerate(values):
+        total += delta
+        values[index] = total
+    return values
+
+
+class _Chunk:
+    """内存中的一块：chunk_id为数据库中的行号（尚未写入时为None）"""
+
+    __slots__ = ("series", "times", "values", "chunk_id", "dirty")
+
+    def __init__(self, series):
+        self.series = series
+        self.times = array("q")
+        self.values = array("q")
+        self.chunk_id = None
+        self.dirty = False
+
+
+class _Series:
+    """一个点位（串口, 从站, 数据表, 地址）：数据库中的序列号、正在追加的块和已写满尚未写盘的块"""
+
+    __slots__ = ("key", "series_id", "last_ms", "chunk", "sealed")
+
+    def __init__(self, key):
+        self.key = key
+        self.series_id = None
+        self.last_ms = None  # 最后一个采样的时间，更早或间隔过短的采样不保存，块内和块间时间都递增
+        self.chunk = _Chunk(self)
+        self.sealed = []  # 已写满、尚未写盘的块
+
+
+class Bucket:
+    """降采样的一个时间桶"""
+
+    __slots__ = ("start", "count", "min", "max", "sum", "last", "last_ms")
+
+    def __init__(self, start):
+        self.start = start  # 毫秒
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = 0
+        self.last = None
+        self.last_ms = None
+
+    def merge(self, count, low, high, total, last, last_ms):
+        """合并一段采样的统计"""
+        self.count += count
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.sum += total
+        if self.last_ms is None or last_ms >= self.last_ms:
+            self.last, self.last_ms = last, last_ms
+
+    @property
+    def average(self):
+        """平均值，没有采样时为None"""
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        return {"start_ms": self.start, "count": self.count, "min": self.min, "max": self.max,
+                "avg": self.average, "last": self.last}
+
+
+def parse_series_key(text):
+    """解析序列键 串口:从站:数据表:地址（数据表可写功能码，如 COM1:1:03:100）"""
+    try:
+        port, slave, table, address = text.rsplit(":", 3)
+        if table.isdigit():
+            table = FUNCTION_TABLES[parse_function_code(table)]
+        elif table not in FUNCTION_TABLES.values():
+            raise KeyError(table)
+        return port, int(slave, 0), table, int(address, 0)
+    except (ValueError, KeyError) as e:
+        raise ValueError(f"序列格式应为 串口:从站:数据表或功能码:地址: {text} ({e})")
+
+
+def format_series_key(key):
+    """把序列键格式化为 串口:从站:数据表:地址（parse_series_key的逆操作）"""
+    port, slave, table, address = key
+    return f"{port}:{slave}:{table}:{address}"
+
+
+class TimeSeriesStore:
+    """点位数值的时间序列存储：append只写内存，后台线程定时写盘；查询合并数据库和内存中尚未写盘的采样"""
+
+    def __init__(self, path, flush_interval=DEFAULT_FLUSH_INTERVAL, chunk_samples=DEFAULT_CHUNK_SAMPLES,
+                 min_interval=DEFAULT_MIN_INTERVAL, retention_days=DEFAULT_RETENTION_DAYS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.chunk_samples = chunk_samples
+        self.min_interval_ms = round(min_interval * 1000 * (1 - MIN_INTERVAL_TOLERANCE))
+        self.retention_days = retention_days
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db_lock = threading.Lock()  # 数据库连接和"块是否已写盘"的状态
+        self._lock = threading.Lock()     # 内存中的序列和块
+        self._series = {}
+        for series_id, port, slave, table, address in self._db.execute(
+                "SELECT id, port, slave, tbl, address FROM series"):
+            key = (port, slave, table, address)
+            series = self._series[key] = _Series(key)
+            series.series_id = series_id
+        by_id = {series.series_id: series for series in self._series.values()}
+        for series_id, last_ms in self._db.execute("SELECT series_id, MAX(end_ms) FROM chunks GROUP BY series_id"):
+            if series_id in by_id:
+                by_id[series_id].last_ms = last_ms
+        self.samples = 0
+        self.skipped = 0   # 间隔小于min_interval而未保存的采样
+        self.flushes = 0
+        self._last_prune = 0.0
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="modbus-history", daemon=True)
+        self._thread.start()
+
+    def append(self, key, timestamp, value):
+        """追加一个采样（任意线程），key为(串口, 从站, 数据表, 地址)，timestamp为秒"""
+        timestamp_ms = round(timestamp * 1000)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(key)
+            self._append(series, timestamp_ms, value)
+
+    def _append(self, series, timestamp_ms, value):
+        """追加一个采样到序列的当前块（调用方持有_lock），时间不递增或间隔过短时跳过"""
+        if series.last_ms is not None and (timestamp_ms <= series.last_ms
+                                           or timestamp_ms - series.last_ms < self.min_interval_ms):
+            self.skipped += 1
+            return
+        series.last_ms = timestamp_ms
+        chunk = series.chunk
+        times = chunk.times
+        times.append(timestamp_ms)
+        chunk.values.append(value)
+        chunk.dirty = True
+        self.samples += 1
+        if len(times) >= self.chunk_samples:
+            series.sealed.append(chunk)
+            series.chunk = _Chunk(series)
+
+    def append_result(self, result, port=None):
+        """保存一次成功的读事务中各地址的数值"""
+        request = result.request
+        if not result.ok or request.function_code not in READ_FUNCTIONS or not result.values:
+            return
+        port = port if port is not None else result.port
+        table = FUNCTION_TABLES[request.function_code]
+        timestamp_ms = round((result.timestamp or time.time()) * 1000)
+        slave = request.slave
+        address = request.address
+        with self._lock:
+            for offset, value in enumerate(result.values):
+                key = (port, slave, table, address + offset)
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series(key)
+                self._append(series, timestamp_ms, value)
+
+    def series_keys(self):
+        """全部序列的键，按键排序"""
+        with self._lock:
+            return sorted(self._series)
+
+    def flush(self):
+        """把内存中的新采样写盘（整个过程持有数据库锁，查询不会看到已从内存取出、尚未写入数据库的块）"""
+        with self._db_lock:
+            with self._lock:
+                pending = []
+                for series in self._series.values():
+                    for chunk in series.sealed:
+                        pending.append((chunk, chunk.times[:], chunk.values[:]))
+                    series.sealed = []
+                    chunk = series.chunk
+                    if chunk.dirty:
+                        pending.append((chunk, chunk.times[:], chunk.values[:]))
+                        chunk.dirty = False
+            if not pending:
+                return 0
+            db = self._db
+            with db:
+                for chunk, times, values in pending:
+                    series = chunk.series
+                    if series.series_id is None:
+                        port, slave, table, address = series.key
+                        series.series_id = db.execute(
+                            "INSERT INTO series (port, slave, tbl, address) VALUES (?, ?, ?, ?)",
+                            (port, slave, table, address)).lastrowid
+                    row = (series.series_id, times[0], times[-1], len(times), min(values), max(values),
+                           sum(values), values[-1], encode_column(times), encode_column(values))
+                    if chunk.chunk_id is not None:
+                        updated = db.execute(
+                            "UPDATE chunks SET series_id = ?, start_ms = ?, end_ms = ?, count = ?, min_value = ?, "
+                            "max_value = ?, sum_value = ?, last_value = ?, times = ?, vals = ? WHERE id = ?",
+                            row + (chunk.chunk_id,)).rowcount
+                        if not updated:
+                            # 该块已写盘的部分被prune删除，重新插入整块
+                            chunk.chunk_id = None
+                    if chunk.chunk_id is None:
+                        chunk.chunk_id = db.execute(
+                            "INSERT INTO chunks (series_id, start_ms, end_ms, count, min_value, max_value, sum_value, "
+                            "last_value, times, vals) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row).lastrowid
+            self.flushes += 1
+        return len(pending)
+
+    def prune(self, before):
+        """删除结束时间早于before（秒）的块，返回删除的块数"""
+        with self._db_lock:
+            with self._db:
+                cursor = self._db.execute("DELETE FROM chunks WHERE end_ms < ?", (int(before * 1000),))
+        return cursor.rowcount
+
+    def _run(self):
+        """写盘线程"""
+        while not self._stop_event.wait(self.flush_interval):
+            self._flush_and_prune()
+
+    def _flush_and_prune(self):
+        """定时写盘，并按保留天数删除旧数据"""
+        try:
+            self.flush()
+            now = time.time()
+            if self.retention_days and now - self._last_prune >= PRUNE_INTERVAL:
+                self._last_prune = now
+                self.prune(now - self.retention_days * 86400)
+        except sqlite3.Error as e:
+            print(f"历史数据写盘失败: {e}", file=sys.stderr)
+
+    def close(self):
+        """写盘剩余采样并关闭数据库"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._flush_and_prune()
+        with self._db_lock:
+            self._db.close()
+
+    def _chunks(self, key, start_ms, end_ms):
+        """与[start_ms, end_ms]重叠的块：数据库中的行和内存中尚未写盘的块，
+        返回[(起始ms, 结束ms, 数量, 最小值, 最大值, 总和, 最后值, 时间列, 数值列)]，时间列和数值列为array或压缩数据"""
+        with self._db_lock:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    return []
+                memory = []
+                for chunk in series.sealed + [series.chunk]:
+                    if chunk.times:
+                        memory.append((chunk.chunk_id, chunk.times[:], chunk.values[:]))
+                series_id = series.series_id
+            rows = []
+            if series_id is not None:
+                rows = self._db.execute(
+                    "SELECT id, start_ms, end_ms, count, min_value, max_value, sum_value, last_value, times, vals "
+                    "FROM chunks "
+                    "WHERE series_id = ? AND end_ms >= ? AND start_ms <= ? ORDER BY start_ms",
+                    (series_id, start_ms, end_ms)).fetchall()
+        in_memory = {chunk_id for chunk_id, _, _ in memory if chunk_id is not None}
+        chunks = [row[1:] for row in rows if row[0] not in in_memory]
+        for _, times, values in memory:
+            if times[0] <= end_ms and times[-1] >= start_ms:
+                chunks.append((times[0], times[-1], len(times), min(values), max(values), sum(values), values[-1],
+                               times, values))
+        chunks.sort(key=lambda chunk: chunk[0])
+        return chunks
+
+    def time_range(self, key):
+        """序列第一个和最后一个采样的时间（秒），没有采样时为(None, None)"""
+        with self._db_lock:
+            with self._lock:
+                series = self._series.get(key)
+                if series is None:
+                    return None, None
+                first = last = None
+                for chunk in series.sealed + [series.chunk]:
+                    if chunk.times:
+                        first = chunk.times[0] if first is None else min(first, chunk.times[0])
+                        last = chunk.times[-1] if last is None else max(last, chunk.times[-1])
+                series_id = series.series_id
+            if series_id is not None:
+                low, high = self._db.execute("SELECT MIN(start_ms), MAX(end_ms) FROM chunks WHERE series_id = ?",
+                                             (series_id,)).fetchone()
+                if low is not None:
+                    first = low if first is None else min(first, low)
+                    last = high if last is None else max(last, high)
+        if first is None:
+            return None, None
+        return first / 1000, last / 1000
+
+    def query(self, key, start=None, end=None):
+        """读取[start, end]（秒，含两端）内的原始采样，返回[(时间戳秒, 数值)]"""
+        start_ms = int(start * 1000) if start is not None else -(1 << 62)
+        end_ms = int(end * 1000) if end is not None else 1 << 62
+        samples = []
+        for chunk in self._chunks(key, start_ms, end_ms):
+            times, values = chunk[7], chunk[8]
+            if not isinstance(times, array):
+                times, values = decode_column(times), decode_column(values)
+            position = bisect.bisect_left(times, start_ms)
+            stop = bisect.bisect_right(times, end_ms)
+            samples.extend(zip([timestamp_ms / 1000 for timestamp_ms in times[position:stop]], values[position:stop]))
+        return samples
+
+    def downsample(self, key, start, end, buckets):
+        """把[start, end]（秒）等分为buckets个时间桶，返回有数据的Bucket列表（最小值、最大值、平均值、最后值）"""
+        start_ms = int(start * 1000)
+        end_ms = int(end * 1000)
+        buckets = max(1, int(buckets))
+        width = max(1, -(-(end_ms - start_ms + 1) // buckets))
+        result = {}
+
+        def bucket(index):
+            entry = result.get(index)
+            if entry is None:
+                entry = result[index] = Bucket(start_ms + index * width)
+            return entry
+
+        for first, last, count, low, high, total, last_value, times, values in self._chunks(key, start_ms, end_ms):
+            if first >= start_ms and last <= end_ms and (first - start_ms) // width == (last - start_ms) // width:
+                # 整块落在一个时间桶内：直接合并块摘要，不解压
+                bucket((first - start_ms) // width).merge(count, low, high, total, last_value, last)
+                continue
+            if not isinstance(times, array):
+                times, values = decode_column(times), decode_column(values)
+            position = bisect.bisect_left(times, start_ms)
+            stop = bisect.bisect_right(times, end_ms)
+            while position < stop:
+                index = (times[position] - start_ms) // width
+                boundary = min(stop, bisect.bisect_left(times, start_ms + (index + 1) * width, position, stop))
+                segment = values[position:boundary]
+                bucket(index).merge(len(segment), min(segment), max(segment), sum(segment), segment[-1],
+                                    times[boundary - 1])
+                position = boundary
+        return [result[index] for index in sorted(result)]
+
+    def stats(self):
+        """采样数、跳过数、点位数、写盘次数和数据库文件大小（含WAL文件，关闭后也可调用）"""
+        size = 0
+        for path in (self.path, self.path + "-wal"):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return {"samples": self.samples, "skipped": self.skipped, "series": len(self._series),
+                "flushes": self.flushes, "bytes": size, "path": self.path}
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus寄存器映像缓存
+按从站保存线圈、离散输入、保持寄存器、输入寄存器的影子映像（寄存器用array('H')，位用bytearray），
+响应到达时原地更新，未变化的块用切片比较快速跳过；每次变化记录全局版本号，
+使用方用changes_since(版本号)只取变化的点位，代价与变化数量成正比，而不必重新比较整个映像
+"""
+
+import bisect
+import threading
+from array import array
+
+from modbus_frame import (
+    FUNCTION_TABLES, TABLE_SIZE, COILS, DISCRETE_INPUTS, HOLDING_REGISTERS, INPUT_REGISTERS,
+    READ_FUNCTIONS, WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_COILS, decode_bits,
+    decode_registers,
+)
+
+BIT_TABLES = (COILS, DISCRETE_INPUTS)
+REGISTER_TABLES = (HOLDING_REGISTERS, INPUT_REGISTERS)
+
+# 变化日志默认保留的条目数，超出后最早的一半被丢弃，过旧的版本号需要全量刷新
+DEFAULT_LOG_SIZE = 65536
+
+
+def written_values(request):
+    """从写请求中取出写入的值（功能码05/06/15/16）"""
+    pdu = request.pdu
+    function_code = pdu[0]
+    if function_code == WRITE_SINGLE_COIL:
+        return [1 if pdu[3] == 0xFF else 0]
+    if function_code == WRITE_SINGLE_REGISTER:
+        return decode_registers(pdu[3:5])
+    if function_code == WRITE_MULTIPLE_COILS:
+        return decode_bits(pdu[6:], request.count)
+    return decode_registers(pdu[6:6 + request.count * 2])
+
+
+class SlaveShadow:
+    """一个从站的影子映像，数据表在首次更新时才分配"""
+
+    def __init__(self, slave):
+        self.slave = slave
+        self.tables = {}
+        self.known = {}  # 数据表 -> bytearray，1表示该地址已从从站读到过
+
+    def table(self, name):
+        """取数据表，不存在时分配"""
+        values = self.tables.get(name)
+        if values is None:
+            if name in BIT_TABLES:
+                values = bytearray(TABLE_SIZE)
+            else:
+                values = array("H", bytes(TABLE_SIZE * 2))
+            self.tables[name] = values
+            self.known[name] = bytearray(TABLE_SIZE)
+        return values
+
+
+class ImageCache:
+    """全部从站的寄存器映像和变化日志（线程安全）"""
+
+    def __init__(self, log_size=DEFAULT_LOG_SIZE):
+        self.log_size = log_size
+        self.slaves = {}
+        self.version = 0
+        self._log_versions = array("Q")  # 与_log一一对应，单调不减，用于二分查找
+        self._log = []                   # (从站, 数据表, 地址)
+        self._log_start = 0              # 日志中最早可查询的版本号
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.unchanged = 0
+
+    def shadow(self, slave):
+        """取从站的影子映像，不存在时创建"""
+        shadow = self.slaves.get(slave)
+        if shadow is None:
+            shadow = self.slaves[slave] = SlaveShadow(slave)
+        return shadow
+
+    def update(self, slave, table_name, address, values):
+        """用一段连续的值更新映像，返回变化的点数"""
+        count = len(values)
+        if not count or address + count > TABLE_SIZE:
+            return 0
+        with self._lock:
+            shadow = self.shadow(slave)
+            table = shadow.table(table_name)
+            known = shadow.known[table_name]
+            end = address + count
+            if table_name in BIT_TABLES:
+                new = bytes(1 if value else 0 for value in values)
+            else:
+                new = array("H", values)
+            old = table[address:end]
+            all_known = known.find(0, address, end) < 0
+            self.updates += 1
+            if all_known and old == new:
+                # 绝大多数轮询没有变化：一次C层切片比较即可跳过
+                self.unchanged += 1
+                return 0
+            self.version += 1
+            version = self.version
+            changes = 0
+            log = self._log
+            log_versions = self._log_versions
+            for offset in range(count):
+                if old[offset] != new[offset] or not known[address + offset]:
+                    log.append((slave, table_name, address + offset))
+                    log_versions.append(version)
+                    changes += 1
+            table[address:end] = new
+            if not all_known:
+                known[address:end] = b"\x01" * count
+            if len(log) > self.log_size * 2:
+                self._trim()
+            return changes
+
+    def _trim(self):
+        """丢弃较早的一半日志（调用方持有锁），被丢弃部分的版本号之后只能全量刷新"""
+        cut = len(self._log) - self.log_size
+        # 不把同一版本拆成两半
+        while cut < len(self._log) and self._log_versions[cut] == self._log_versions[cut - 1]:
+            cut += 1
+        self._log_start = self._log_versions[cut - 1]
+        del self._log[:cut]
+        del self._log_versions[:cut]
+
+    def apply(self, result):
+        """用一次成功的事务结果更新映像（读响应或已确认的写），返回变化的点数"""
+        if not result.ok:
+            return 0
+        request = result.request
+        table_name = FUNCTION_TABLES.get(request.function_code)
+        if table_name is None:
+            return 0
+        if request.function_code in READ_FUNCTIONS:
+            values = result.values
+        else:
+            values = written_values(request)
+        return self.update(request.slave, table_name, request.address, values)
+
+    def changes_since(self, version, slave=None):
+        """
+        返回(当前版本号, 变化点集合{(从站, 数据表, 地址)})；集合为None表示version过旧，日志已丢弃，需要全量刷新
+        slave不为None时只返回该从站的变化
+        """
+        with self._lock:
+            current = self.version
+            if version >= current:
+                return current, set()
+            if version < self._log_start:
+                return current, None
+            start = bisect.bisect_right(self._log_versions, version)
+            changed = self._log[start:]
+        if slave is None:
+            return current, set(changed)
+        return current, {point for point in changed if point[0] == slave}
+
+    def get(self, slave, table_name, address, count=1):
+        """读取映像中的一段值（未读到过的地址为0）"""
+        with self._lock:
+            shadow = self.slaves.get(slave)
+            if shadow is None or table_name not in shadow.tables:
+                return [0] * count
+            return list(shadow.tables[table_name][address:address + count])
+
+    def known(self, slave, table_name, address):
+        """该地址是否已从从站读到过"""
+        with self._lock:
+            shadow = self.slaves.get(slave)
+            if shadow is None or table_name not in shadow.known:
+                return False
+            return bool(shadow.known[table_name][address])
+
+    def stats(self):
+        """统计信息"""
+        return {"version": self.version, "slaves": len(self.slaves), "updates": self.updates,
+                "unchanged": self.unchanged, "log_entries": len(self._log)}
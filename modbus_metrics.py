@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus总线指标
+在I/O线程中按串口和从站累计请求数、结果分类、收发字节、总线占用时间和固定分桶的延迟直方图，
+另记录调度滞后（轮询任务实际发出时间晚于截止时间的量）；记录一次只需一次加锁、几次字典查找和一次二分查找，
+可以常开；快照可导出为Prometheus文本格式（node_exporter textfile）或JSON
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+from modbus_frame import STATUSES, STATUS_OK
+
+# 延迟直方图的桶上界（秒），最后还有一个+Inf桶
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+# 导出格式
+FORMAT_PROMETHEUS = "prom"
+FORMAT_JSON = "json"
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图，百分位数按桶内线性插值估算"""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """记录一个样本"""
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction):
+        """估算百分位数（秒），没有样本时返回0"""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if index == len(LATENCY_BUCKETS):
+                    # +Inf桶没有上界，只能返回最后一个有限上界
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                upper = LATENCY_BUCKETS[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return LATENCY_BUCKETS[-1]
+
+    def mean(self):
+        """平均值（秒）"""
+        return self.sum / self.count if self.count else 0.0
+
+
+class SeriesMetrics:
+    """一个串口或一个从站的累计指标"""
+
+    __slots__ = ("requests", "statuses", "bytes_out", "bytes_in", "busy", "latency")
+
+    def __init__(self):
+        self.requests = 0
+        self.statuses = dict.fromkeys(STATUSES, 0)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.busy = 0.0  # 事务占用总线的累计时间（秒）
+        self.latency = LatencyHistogram()  # 成功事务的响应时间
+
+    def record(self, result, status):
+        """累计一次事务"""
+        self.requests += 1
+        self.statuses[status] += 1
+        self.bytes_out += len(result.request.frame)
+        self.bytes_in += len(result.response)
+        self.busy += result.elapsed
+        if status == STATUS_OK:
+            self.latency.observe(result.elapsed)
+
+    def summary(self, uptime):
+        """汇总为字典，uptime为统计时长（秒）"""
+        latency = self.latency
+        return {
+            "requests": self.requests,
+            "ok": self.statuses[STATUS_OK],
+            "errors": self.requests - self.statuses[STATUS_OK],
+            "statuses": dict(self.statuses),
+            "rate": self.requests / uptime if uptime > 0 else 0.0,
+            "bytes_out": self.bytes_out,
+            "bytes_in": self.bytes_in,
+            "busy_s": self.busy,
+            "utilisation": min(1.0, self.busy / uptime) if uptime > 0 else 0.0,
+            "avg_ms": latency.mean() * 1000,
+            "p50_ms": latency.quantile(0.50) * 1000,
+            "p95_ms": latency.quantile(0.95) * 1000,
+            "p99_ms": latency.quantile(0.99) * 1000,
+        }
+
+
+class BusMetrics:
+    """按串口和从站累计的总线指标（线程安全，I/O线程记录，界面线程或导出线程读取）"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清零，重新开始计时"""
+        with self._lock:
+            self.started = self.clock()
+            self.ports = {}   # 串口 -> SeriesMetrics
+            self.slaves = {}  # (串口, 从站) -> SeriesMetrics
+            self.lag = {}     # 串口 -> LatencyHistogram（调度滞后）
+
+    def record(self, result):
+        """记录一次事务结果（result.port为None时记在空串口名下）"""
+        port = result.port or ""
+        key = (port, result.request.slave)
+        status = result.status
+        with self._lock:
+            series = self.ports.get(port)
+            if series is None:
+                series = self.ports[port] = SeriesMetrics()
+            series.record(result, status)
+            series = self.slaves.get(key)
+            if series is None:
+                series = self.slaves[key] = SeriesMetrics()
+            series.record(result, status)
+
+    def record_lag(self, port, lag):
+        """记录一次轮询任务的调度滞后（秒）"""
+        port = port or ""
+        with self._lock:
+            histogram = self.lag.get(port)
+            if histogram is None:
+                histogram = self.lag[port] = LatencyHistogram()
+            histogram.observe(max(0.0, lag))
+
+    def uptime(self):
+        """统计时长（秒）"""
+        return self.clock() - self.started
+
+    def snapshot(self):
+        """当前指标快照：{"uptime_s", "ports": [...], "slaves": [...]}，每项含计数、速率、占用率和延迟百分位数"""
+        with self._lock:
+            uptime = self.uptime()
+            ports = []
+            for port in sorted(self.ports):
+                entry = {"port": port}
+                entry.update(self.ports[port].summary(uptime))
+                lag = self.lag.get(port)
+                entry["lag_p50_ms"] = lag.quantile(0.50) * 1000 if lag else 0.0
+                entry["lag_p99_ms"] = lag.quantile(0.99) * 1000 if lag else 0.0
+                ports.append(entry)
+            slaves = []
+            for port, slave in sorted(self.slaves):
+                entry = {"port": port, "slave": slave}
+                entry.update(self.slaves[(port, slave)].summary(uptime))
+                slaves.append(entry)
+        return {"timestamp": time.time(), "uptime_s": uptime, "ports": ports, "slaves": slaves}
+
+    def to_json(self):
+        """JSON格式的快照"""
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus文本格式（计数器、直方图和占用率）"""
+        lines = []
+        with self._lock:
+            uptime = self.uptime()
+            lines.append("# HELP modbus_uptime_seconds Time since the metrics were reset.")
+            lines.append("# TYPE modbus_uptime_seconds gauge")
+            lines.append(f"modbus_uptime_seconds {uptime:.3f}")
+
+            lines.append("# HELP modbus_requests_total Modbus transactions by port, slave and result status.")
+            lines.append("# TYPE modbus_requests_total counter")
+            for (port, slave), series in sorted(self.slaves.items()):
+                for status, count in series.statuses.items():
+                    if count:
+                        lines.append(f"modbus_requests_total{_labels(port=port, slave=slave, status=status)} {count}")
+
+            for name, attribute, text in (("modbus_bytes_sent_total", "bytes_out", "Bytes sent to the bus."),
+                                          ("modbus_bytes_received_total", "bytes_in", "Bytes received from the bus.")):
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} counter")
+                for (port, slave), series in sorted(self.slaves.items()):
+                    lines.append(f"{name}{_labels(port=port, slave=slave)} {getattr(series, attribute)}")
+
+            lines.append("# HELP modbus_bus_busy_seconds_total Time spent in transactions per port.")
+            lines.append("# TYPE modbus_bus_busy_seconds_total counter")
+            for port, series in sorted(self.ports.items()):
+                lines.append(f"modbus_bus_busy_seconds_total{_labels(port=port)} {series.busy:.6f}")
+
+            lines.append("# HELP modbus_bus_utilisation Fraction of time the port was busy since reset.")
+            lines.append("# TYPE modbus_bus_utilisation gauge")
+            for port, series in sorted(self.ports.items()):
+                utilisation = min(1.0, series.busy / uptime) if uptime > 0 else 0.0
+                lines.append(f"modbus_bus_utilisation{_labels(port=port)} {utilisation:.6f}")
+
+            lines.append("# HELP modbus_response_seconds Response time of successful transactions.")
+            lines.append("# TYPE modbus_response_seconds histogram")
+            for (port, slave), series in sorted(self.slaves.items()):
+                _histogram_lines(lines, "modbus_response_seconds", series.latency, port=port, slave=slave)
+
+            lines.append("# HELP modbus_schedule_lag_seconds Delay between a poll task's due time and its dispatch.")
+            lines.append("# TYPE modbus_schedule_lag_seconds histogram")
+            for port, histogram in sorted(self.lag.items()):
+                _histogram_lines(lines, "modbus_schedule_lag_seconds", histogram, port=port)
+        return "\n".join(lines) + "\n"
+
+    def export(self, fmt=FORMAT_PROMETHEUS):
+        """按格式导出文本"""
+        if fmt == FORMAT_JSON:
+            return self.to_json()
+        if fmt == FORMAT_PROMETHEUS:
+            return self.to_prometheus()
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+
+def _labels(**labels):
+    """生成Prometheus标签文本，转义反斜杠、引号和换行"""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _histogram_lines(lines, name, histogram, **labels):
+    """追加一个直方图的_bucket/_sum/_count行（桶为累计值）"""
+    cumulative = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels(**labels, le=f'{bound:g}')} {cumulative}")
+    lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum:.6f}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+
+
+def write_snapshot(metrics, path, fmt=FORMAT_PROMETHEUS):
+    """把快照写到文件：先写临时文件再替换，采集程序不会读到写了一半的文件"""
+    text = metrics.export(fmt)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+class MetricsExporter(threading.Thread):
+    """后台线程：按固定间隔把指标快照写到文件，停止时再写一次"""
+
+    def __init__(self, metrics, path, interval=10.0, fmt=FORMAT_PROMETHEUS):
+        super().__init__(name="modbus-metrics", daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.fmt = fmt
+        self.exports = 0
+        self.last_error = None
+        self._stop_event = threading.Event()
+
+    def export_now(self):
+        """立即导出一次，失败时记录错误而不中断线程"""
+        try:
+            write_snapshot(self.metrics, self.path, self.fmt)
+            self.exports += 1
+            self.last_error = None
+        except OSError as e:
+            self.last_error = e
+
+    def run(self):
+        """线程主循环"""
+        while not self._stop_event.wait(self.interval):
+            self.export_now()
+
+    def stop(self, timeout=1.0):
+        """停止线程并写出最终快照"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+        self.export_now()
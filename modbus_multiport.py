@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多串口并行轮询模块
+每个串口有独立的I/O线程（SerialWorker）、轮询调度器和超时策略，互不阻塞；
+全部结果汇总到同一个结果队列（ModbusResult.port标记来源串口），总吞吐随串口数近似线性增长
+"""
+
+import queue
+
+from frame_capture import LINK_MODBUS_RTU
+from modbus_scheduler import PollScheduler
+from modbus_serial import SerialLink, SerialWorker, open_port, DEFAULT_TIMEOUT
+from modbus_timeout import TimeoutPolicy
+from modbus_write_queue import WriteQueue
+
+
+class PortChannel:
+    """一个串口通道：链路、调度器、超时策略、合并写队列和I/O线程"""
+
+    def __init__(self, name, link, result_queue, policy_options=None, metrics=None, link_type=LINK_MODBUS_RTU):
+        self.name = name
+        self.link = link
+        self.link_type = link_type  # 抓包时的链路类型
+        self.scheduler = PollScheduler()
+        self.policy = TimeoutPolicy(**(policy_options or {}))
+        self.writes = WriteQueue()
+        self.worker = SerialWorker(link, result_queue, self.scheduler, self.policy,
+                                   name=f"modbus-{name}", port=name, write_queue=self.writes,
+                                   metrics=metrics)
+
+    def stats(self):
+        """通道统计：各任务执行情况和各从站超时策略"""
+        return {"port": self.name, "tasks": self.scheduler.stats(), "slaves": self.policy.snapshot()}
+
+
+class MultiPortPoller:
+    """多串口轮询：按串口名管理通道，所有通道的结果进入同一个队列"""
+
+    def __init__(self, result_queue=None, policy_options=None, metrics=None):
+        self.results = result_queue if result_queue is not None else queue.Queue()
+        self.policy_options = policy_options
+        self.metrics = metrics  # BusMetrics，各串口共用，按串口名区分
+        self.channels = {}
+        self.running = False
+        self.capture = None  # CaptureWriter等抓包入口，各串口的收发帧都记录
+
+    def add_link(self, name, link, link_type=LINK_MODBUS_RTU):
+        """添加一个已打开的链路（SerialLink或接口相同的链路），link_type为抓包时的链路类型"""
+        if name in self.channels:
+            raise ValueError(f"串口{name}已存在")
+        channel = self.channels[name] = PortChannel(name, link, self.results, self.policy_options, self.metrics,
+                                                    link_type)
+        if self.capture is not None and link.capture is None:
+            link.capture = self.capture.channel(name, link_type)
+        if self.running:
+            channel.worker.start()
+        return channel
+
+    def add_port(self, name, baudrate=9600, bytesize=8, parity="N", stopbits="1", timeout=DEFAULT_TIMEOUT):
+        """打开串口并添加为通道"""
+        ser = open_port(name, baudrate, bytesize, parity, stopbits)
+        return self.add_link(name, SerialLink(ser, timeout))
+
+    def add_task(self, name, task):
+        """把轮询任务加入指定串口的调度器（每个任务对象只能属于一个串口）"""
+        return self.channels[name].scheduler.add(task)
+
+    def remove_task(self, name, task):
+        """从指定串口的调度器中移除任务"""
+        self.channels[name].scheduler.remove(task)
+
+    def submit(self, name, request):
+        """向指定串口提交一个手动请求"""
+        self.channels[name].worker.submit(request)
+
+    def write(self, name, slave, function_code, address, values):
+        """向指定串口的合并写队列加入写操作"""
+        self.channels[name].writes.write(slave, function_code, address, values)
+
+    def set_capture(self, capture):
+        """开启（capture为CaptureWriter等抓包入口）或关闭全部串口的抓包"""
+        self.capture = capture
+        for channel in self.channels.values():
+            channel.link.capture = capture.channel(channel.name, channel.link_type) if capture is not None else None
+
+    def set_profiler(self, profiler):
+        """对全部串口的I/O线程开启（profiler为ScanProfiler）或取消性能分析"""
+        for channel in self.channels.values():
+            channel.worker.profiler = profiler
+
+    def start(self):
+        """启动全部串口的I/O线程"""
+        self.running = True
+        for channel in self.channels.values():
+            if not channel.worker.is_alive():
+                channel.worker.start()
+
+    def stop(self):
+        """停止全部I/O线程并关闭串口"""
+        self.running = False
+        for channel in self.channels.values():
+            channel.worker.stop()
+
+    def stats(self):
+        """各串口的统计信息"""
+        return [channel.stats() for channel in self.channels.values()]
@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 import os
 import json
 import datetime
+from modbus_crc import check_frame
+from modbus_frame import exception_name
 
 class ModbusParserWindow:
     """Modbus解析对码窗口"""
@@ -70,7 +72,7 @@ class ModbusParserWindow:
         
         # 配置输入框架的网格权重，让内容垂直分布
         input_frame.columnconfigure(1, weight=1)
-        input_frame.rowconfigure(11, weight=1)  # 让最后一个按钮区域扩展
+        input_frame.rowconfigure(12, weight=1)  # 让最后一个按钮区域扩展
         
         # 功能码选择
         ttk.Label(input_frame, text="功能码:").grid(row=0, column=0, sticky=tk.W, pady=2)
@@ -81,6 +83,7 @@ class ModbusParserWindow:
                                                  "15 - 写多个线圈", "16 - 写多个寄存器"], 
                                           width=25, state="readonly")
         function_code_combo.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=2)
+        self.function_code_combo = function_code_combo
         function_code_combo.bind('<<ComboboxSelected>>', self.on_function_code_change)
         
         # 数据输入
@@ -89,37 +92,42 @@ class ModbusParserWindow:
         data_entry = ttk.Entry(input_frame, textvariable=self.data_input_var, width=35)
         data_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), pady=2)
         
+        # 起始地址：读响应中的第i个点位按 起始地址+i 查找注释，解析读请求时自动填入
+        ttk.Label(input_frame, text="起始地址:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.start_address_var = tk.StringVar(value="0")
+        ttk.Entry(input_frame, textvariable=self.start_address_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=2)
+        
         # 解析按钮
         ttk.Button(input_frame, text="解析数据", command=self.parse_data, 
-                  style="Accent.TButton").grid(row=2, column=0, columnspan=2, pady=10)
+                  style="Accent.TButton").grid(row=3, column=0, columnspan=2, pady=10)
         
         # 分隔线
         separator = ttk.Separator(input_frame, orient='horizontal')
-        separator.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=10)
+        separator.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=10)
         
         # 注释管理
-        ttk.Label(input_frame, text="注释管理:", font=("Arial", 10, "bold")).grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
+        ttk.Label(input_frame, text="注释管理:", font=("Arial", 10, "bold")).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=(0, 5))
         
-        ttk.Button(input_frame, text="保存注释", command=self.save_annotations).grid(row=5, column=0, pady=2)
-        ttk.Button(input_frame, text="加载注释", command=self.load_annotations).grid(row=5, column=1, pady=2)
-        ttk.Button(input_frame, text="导出注释", command=self.export_annotations).grid(row=6, column=0, pady=2)
-        ttk.Button(input_frame, text="清空注释", command=self.clear_annotations).grid(row=6, column=1, pady=2)
+        ttk.Button(input_frame, text="保存注释", command=self.save_annotations).grid(row=6, column=0, pady=2)
+        ttk.Button(input_frame, text="加载注释", command=self.load_annotations).grid(row=6, column=1, pady=2)
+        ttk.Button(input_frame, text="导出注释", command=self.export_annotations).grid(row=7, column=0, pady=2)
+        ttk.Button(input_frame, text="清空注释", command=self.clear_annotations).grid(row=7, column=1, pady=2)
         
         # 注释编辑区域
-        ttk.Label(input_frame, text="注释编辑:", font=("Arial", 10, "bold")).grid(row=7, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
+        ttk.Label(input_frame, text="注释编辑:", font=("Arial", 10, "bold")).grid(row=8, column=0, columnspan=2, sticky=tk.W, pady=(10, 5))
         
-        ttk.Label(input_frame, text="键值:").grid(row=8, column=0, sticky=tk.W, pady=2)
+        ttk.Label(input_frame, text="键值:").grid(row=9, column=0, sticky=tk.W, pady=2)
         self.annotation_key_var = tk.StringVar()
         annotation_key_entry = ttk.Entry(input_frame, textvariable=self.annotation_key_var, width=25)
-        annotation_key_entry.grid(row=8, column=1, sticky=(tk.W, tk.E), pady=2)
+        annotation_key_entry.grid(row=9, column=1, sticky=(tk.W, tk.E), pady=2)
         
-        ttk.Label(input_frame, text="注释:").grid(row=9, column=0, sticky=tk.W, pady=2)
+        ttk.Label(input_frame, text="注释:").grid(row=10, column=0, sticky=tk.W, pady=2)
         self.annotation_value_var = tk.StringVar()
         annotation_value_entry = ttk.Entry(input_frame, textvariable=self.annotation_value_var, width=25)
-        annotation_value_entry.grid(row=9, column=1, sticky=(tk.W, tk.E), pady=2)
+        annotation_value_entry.grid(row=10, column=1, sticky=(tk.W, tk.E), pady=2)
         
         annotation_button_frame = ttk.Frame(input_frame)
-        annotation_button_frame.grid(row=10, column=0, columnspan=2, pady=5)
+        annotation_button_frame.grid(row=11, column=0, columnspan=2, pady=5)
         
         ttk.Button(annotation_button_frame, text="添加/更新", command=self.add_annotation).grid(row=0, column=0, padx=2)
         ttk.Button(annotation_button_frame, text="删除", command=self.delete_annotation).grid(row=0, column=1, padx=2)
@@ -127,7 +135,7 @@ class ModbusParserWindow:
         
         # 注释格式帮助按钮 - 放在底部，让它填满剩余空间
         help_button = ttk.Button(input_frame, text="注释格式帮助", command=self.show_annotation_help)
-        help_button.grid(row=11, column=0, columnspan=2, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
+        help_button.grid(row=12, column=0, columnspan=2, pady=5, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # 右侧解析结果显示区域 - 确保填满整个右侧区域
         result_frame = ttk.Frame(self.function_code_frame)
@@ -188,8 +196,13 @@ class ModbusParserWindow:
             if not all(c in '0123456789ABCDEFabcdef' for c in data_str):
                 raise ValueError("数据格式错误，请输入有效的十六进制数据")
             
+            # 读请求：记下起始地址，之后解析的响应按它查找点位注释
+            if function_code in ["01", "02", "03", "04"] and len(data_str) >= 12 and int(data_str[2:4], 16) == int(function_code):
+                self.start_address_var.set(str(int(data_str[4:8], 16)))
+            start_address = int(self.start_address_var.get().strip() or "0", 0)
+            
             # 解析数据
-            result = self.parse_modbus_data(function_code, data_str)
+            result = self.parse_modbus_data(function_code, data_str, start_address)
             
             # 显示结果
             self.result_text.delete(1.0, tk.END)
@@ -201,8 +214,26 @@ class ModbusParserWindow:
             messagebox.showerror("解析错误", str(e))
             self.status_var.set("数据解析失败")
             
-    def parse_modbus_data(self, function_code, data_str):
-        """解析Modbus数据"""
+    def load_frame(self, frame, response=False, start_address=None):
+        """载入一帧RTU报文并解析（报文回放调用）；读功能码的正常响应按本窗口的格式只取 字节数+数据+CRC，
+        start_address为对应请求的起始地址"""
+        if start_address is not None:
+            self.start_address_var.set(str(start_address))
+        function_code = frame[1] & 0x7F
+        code = f"{function_code:02d}"
+        self.function_code_var.set(code)
+        for value in self.function_code_combo.cget("values"):
+            if value.startswith(code + " - "):
+                self.function_code_var.set(value)
+                break
+        data = frame
+        if response and not frame[1] & 0x80 and function_code in (0x01, 0x02, 0x03, 0x04):
+            data = frame[2:]
+        self.data_input_var.set(" ".join([f"{b:02X}" for b in data]))
+        self.parse_data()
+        
+    def parse_modbus_data(self, function_code, data_str, start_address=0):
+        """解析Modbus数据，start_address为读响应第一个点位的地址"""
         result = []
         
         # 添加功能码说明
@@ -228,11 +259,18 @@ class ModbusParserWindow:
         result.append(f"原始数据: {' '.join([f'{b:02X}' for b in data_bytes])}\n")
         result.append(f"数据长度: {len(data_bytes)} 字节\n")
         
+        # 异常响应：从机地址 + (功能码|0x80) + 异常码 + CRC，共5字节且CRC正确
+        # （读响应的输入为 字节数 + 数据 + CRC，首个数据字节≥0x80是正常数据，不能只看最高位）
+        if (len(data_bytes) == 5 and function_code.isdigit()
+                and data_bytes[1] == int(function_code) | 0x80 and check_frame(bytes(data_bytes))):
+            result.extend(self.parse_exception_data(data_bytes, function_code))
+            return "".join(result)
+        
         # 根据功能码进行不同解析
         if function_code in ["01", "02"]:
-            result.extend(self.parse_coil_data(data_bytes, function_code))
+            result.extend(self.parse_coil_data(data_bytes, function_code, start_address))
         elif function_code in ["03", "04"]:
-            result.extend(self.parse_register_data(data_bytes, function_code))
+            result.extend(self.parse_register_data(data_bytes, function_code, start_address))
         elif function_code in ["05", "06"]:
             result.extend(self.parse_single_write_data(data_bytes, function_code))
         elif function_code in ["15", "16"]:
@@ -242,7 +280,44 @@ class ModbusParserWindow:
             
         return "".join(result)
         
-    def parse_coil_data(self, data_bytes, function_code):
+    def parse_exception_data(self, data_bytes, function_code):
+        """解析异常响应报文"""
+        result = []
+        
+        # 各异常码的常见原因，便于排查总线问题
+        exception_hints = {
+            0x01: "从站不支持该功能码",
+            0x02: "起始地址或 起始地址+数量 超出从站的数据范围",
+            0x03: "数量或写入值超出从站允许的范围",
+            0x04: "从站执行请求时发生不可恢复的错误",
+            0x05: "从站已接受请求，处理需要较长时间，稍后查询结果",
+            0x06: "从站正在处理长时间命令，稍后重试",
+            0x08: "从站存储区奇偶校验错误",
+            0x0A: "网关无法分配到目标设备的路径，检查网关配置",
+            0x0B: "网关目标设备无响应，检查目标设备是否在线",
+        }
+        
+        original_code = data_bytes[1] & 0x7F
+        exception_code = data_bytes[2]
+        result.append("=== 从机异常响应报文解析 ===\n")
+        result.append(f"{data_bytes[0]:02X}：从机地址 ({data_bytes[0]})\n")
+        result.append(f"{data_bytes[1]:02X}：功能码 ({original_code:02d} + 0x80，表示异常响应)\n")
+        result.append(f"{exception_code:02X}：异常码 ({exception_code:02d} - {exception_name(exception_code)})\n")
+        if exception_code in exception_hints:
+            result.append(f"  可能原因：{exception_hints[exception_code]}\n")
+        if len(data_bytes) >= 5:
+            crc_status = "正确" if check_frame(bytes(data_bytes[:5])) else "错误"
+            result.append(f"{data_bytes[3]:02X} {data_bytes[4]:02X}：CRC校验 ({crc_status})\n")
+            if len(data_bytes) > 5:
+                result.append(f"注意：异常响应应为5字节，多出{len(data_bytes) - 5}字节\n")
+        else:
+            result.append("异常响应报文格式错误，缺少CRC校验\n")
+        if function_code.isdigit() and original_code != int(function_code):
+            result.append(f"注意：报文中的功能码{original_code:02d}与所选功能码{function_code}不一致\n")
+            
+        return result
+        
+    def parse_coil_data(self, data_bytes, function_code, start_address=0):
         """解析线圈/离散输入数据"""
         result = []
         
@@ -265,6 +340,7 @@ class ModbusParserWindow:
             # 这是响应报文
             result.append("=== 从机响应报文解析 ===\n")
             result.append(f"{data_bytes[0]:02X}：字节数 ({data_bytes[0]} 字节)\n")
+            ranges = self.annotation_ranges(f"{function_code}_")
             
             # 解析每个字节的位
             for i in range(1, min(len(data_bytes), data_bytes[0] + 1)):
@@ -277,11 +353,10 @@ class ModbusParserWindow:
                     bit_status = "ON" if bit_value == 1 else "OFF"
                     
                     # 计算全局位位置
-                    global_bit_pos = (i - 1) * 8 + bit_pos
+                    global_bit_pos = start_address + (i - 1) * 8 + bit_pos
                     
                     # 获取注释
-                    annotation_key = f"{function_code}_{global_bit_pos}"
-                    annotation = self.annotations.get(annotation_key, "")
+                    annotation = self.point_annotation(f"{function_code}_", global_bit_pos, ranges)
                     
                     # 根据功能码显示不同的文本
                     if function_code == "01":
@@ -294,7 +369,7 @@ class ModbusParserWindow:
                 
         return result
         
-    def parse_register_data(self, data_bytes, function_code):
+    def parse_register_data(self, data_bytes, function_code, start_address=0):
         """解析寄存器数据"""
         result = []
         
@@ -321,6 +396,7 @@ class ModbusParserWindow:
             # 解析寄存器值（每个寄存器2字节）
             register_count = data_bytes[0] // 2
             result.append(f"寄存器数量: {register_count}\n")
+            ranges = self.annotation_ranges(f"{function_code}_reg_")
             
             for i in range(register_count):
                 if 1 + i * 2 + 1 < len(data_bytes):
@@ -328,17 +404,36 @@ class ModbusParserWindow:
                     low_byte = data_bytes[1 + i * 2 + 1]
                     register_value = (high_byte << 8) | low_byte
                     
-                    result.append(f"寄存器 {i}: {register_value:04X} ({register_value})")
+                    result.append(f"寄存器 {start_address + i}: {register_value:04X} ({register_value})")
                     
                     # 获取注释
-                    annotation_key = f"{function_code}_reg_{i}"
-                    annotation = self.annotations.get(annotation_key, "")
+                    annotation = self.point_annotation(f"{function_code}_reg_", start_address + i, ranges)
                     if annotation:
                         result.append(f" - {annotation}")
                     result.append("\n")
                 
         return result
         
+    def annotation_ranges(self, prefix):
+        """注释中以prefix开头的区间键（如 03_reg_100-199），返回[(起始地址, 结束地址, 注释)]"""
+        ranges = []
+        for key, value in self.annotations.items():
+            if key.startswith(prefix):
+                first, sep, last = key[len(prefix):].partition("-")
+                if sep and first.isdigit() and last.isdigit():
+                    ranges.append((int(first), int(last), value))
+        return ranges
+        
+    def point_annotation(self, prefix, address, ranges):
+        """点位的注释：优先用该地址自己的注释，否则用包含该地址的区间注释"""
+        annotation = self.annotations.get(f"{prefix}{address}", "")
+        if annotation:
+            return annotation
+        for first, last, value in ranges:
+            if first <= address <= last:
+                return value
+        return ""
+        
     def parse_single_write_data(self, data_bytes, function_code):
         """解析单个写操作数据"""
         result = []
@@ -554,14 +649,16 @@ class ModbusParserWindow:
         help_text = """注释键值格式说明：
 
 1. 线圈/离散输入位注释：
-   - 格式: 功能码_位位置
+   - 格式: 功能码_位地址（起始地址+位位置）
    - 示例: 01_0, 01_1, 02_15
+   - 区间: 01_0-15（寄存器地图探测生成，区间内没有单独注释的位使用）
    - 说明: 用于标识具体的开关量点位
 
 2. 寄存器注释：
-   - 格式: 功能码_reg_寄存器索引
+   - 格式: 功能码_reg_寄存器地址（起始地址+寄存器索引）
    - 示例: 03_reg_0, 04_reg_1
-   - 说明: 用于标识具体的寄存器地址
+   - 区间: 03_reg_100-199（寄存器地图探测生成，区间内没有单独注释的寄存器使用）
+   - 说明: 用于标识具体的寄存器地址；解析读请求时自动填入起始地址
 
 3. 单个写操作注释：
    - 格式: 功能码_addr_地址
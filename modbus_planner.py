@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus读请求合并规划模块
+把分散的寄存器/线圈点位合并成尽量少的读请求：相邻点位直接合并，间隙小于一次往返开销时跨间隙合并，
+遵守协议上限（125个寄存器/2000个线圈）和单个设备的长度限制，响应再按点位拆分
+"""
+
+from modbus_frame import (
+    ModbusRequest, READ_FUNCTIONS, READ_BIT_FUNCTIONS, MAX_READ_BITS, MAX_READ_REGISTERS,
+)
+from modbus_serial import char_time, frame_gap
+
+# 从站处理请求的典型时间（秒），用于估算一次往返的固定开销
+DEFAULT_TURNAROUND = 0.01
+
+
+def protocol_limit(function_code):
+    """功能码对应的单次读取数量上限"""
+    return MAX_READ_BITS if function_code in READ_BIT_FUNCTIONS else MAX_READ_REGISTERS
+
+
+def default_max_gap(function_code, baudrate=9600, turnaround=DEFAULT_TURNAROUND):
+    """估算值得跨越的最大间隙：多读间隙的传输时间不超过一次额外往返的开销"""
+    char = char_time(baudrate)
+    # 额外往返：8字节请求 + 5字节响应头和CRC + 两个帧间隔 + 从站处理时间
+    round_trip = 13 * char + 2 * frame_gap(baudrate) + turnaround
+    # 每多读一个点位增加的字节数
+    per_item = 1.0 / 8 if function_code in READ_BIT_FUNCTIONS else 2.0
+    return int(round_trip / (per_item * char))
+
+
+def points_from_annotations(annotations, slave):
+    """从注释键（如 01_5、03_reg_100，区间键 03_reg_100-199 展开为每个地址）提取读点位，返回[(从站, 功能码, 地址)]"""
+    points = []
+    for key in annotations:
+        parts = key.split("_")
+        first, _, last = parts[-1].partition("-")
+        try:
+            function_code = int(parts[0], 10)
+            first = int(first, 10)
+            last = int(last, 10) if last else first
+        except ValueError:
+            continue
+        if function_code in READ_FUNCTIONS:
+            points.extend((slave, function_code, address) for address in range(first, last + 1))
+    return points
+
+
+class ReadBlock:
+    """一个合并后的读请求，以及它覆盖的点位地址"""
+
+    def __init__(self, slave, function_code, address, count, points):
+        self.slave = slave
+        self.function_code = function_code
+        self.address = address
+        self.count = count
+        self.points = points
+
+    def request(self):
+        """生成对应的ModbusRequest"""
+        return ModbusRequest(self.slave, self.function_code, self.address, self.count, tag=self)
+
+    def split(self, values):
+        """把响应数值拆分到各个点位，返回{(从站, 功能码, 地址): 值}"""
+        base = self.address
+        key = (self.slave, self.function_code)
+        return {key + (address,): values[address - base] for address in self.points}
+
+    def __repr__(self):
+        return (f"ReadBlock(slave={self.slave}, fc={self.function_code:02d}, "
+                f"address={self.address}, count={self.count}, points={len(self.points)})")
+
+
+def plan_reads(points, baudrate=9600, max_gap=None, device_options=None, turnaround=DEFAULT_TURNAROUND):
+    """
+    把点位合并成读请求
+    points: 可迭代的(从站, 功能码, 地址)
+    max_gap: 允许跨越的最大间隙（点位数），None表示按波特率估算
+    device_options: {从站: {"max_count": 单次最大数量, "max_gap": 最大间隙}}，
+                    用于不支持长读取或存在不可读地址空洞的设备
+    """
+    device_options = device_options or {}
+    groups = {}
+    for slave, function_code, address in points:
+        if function_code not in READ_FUNCTIONS:
+            raise ValueError(f"功能码{function_code:02d}不是读功能码")
+        groups.setdefault((slave, function_code), set()).add(address)
+
+    blocks = []
+    for (slave, function_code), addresses in sorted(groups.items()):
+        options = device_options.get(slave, {})
+        limit = min(protocol_limit(function_code), options.get("max_count", protocol_limit(function_code)))
+        gap_limit = options.get("max_gap", max_gap)
+        if gap_limit is None:
+            gap_limit = default_max_gap(function_code, baudrate, turnaround)
+
+        ordered = sorted(addresses)
+        start = last = ordered[0]
+        members = [start]
+        for address in ordered[1:]:
+            if address - last - 1 <= gap_limit and address - start + 1 <= limit:
+                members.append(address)
+            else:
+                blocks.append(ReadBlock(slave, function_code, start, last - start + 1, members))
+                start = address
+                members = [address]
+            last = address
+        blocks.append(ReadBlock(slave, function_code, start, last - start + 1, members))
+    return blocks
+
+
+def split_results(results):
+    """把一组ModbusResult（请求的tag为ReadBlock）拆分为点位数值字典，失败的请求跳过"""
+    values = {}
+    for result in results:
+        block = result.request.tag
+        if result.ok and isinstance(block, ReadBlock):
+            values.update(block.split(result.values))
+    return values
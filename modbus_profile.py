@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描周期性能分析
+对N个扫描周期开启cProfile（I/O线程和界面线程各用一个Profile，结束时合并保存为.pstats），
+同时用perf_counter_ns按阶段（build组帧、transmit发送、wait等待响应、decode解码、render显示）累计耗时，
+分阶段结果保存为JSON，可以与另一次运行的结果逐阶段比较
+"""
+
+import cProfile
+import json
+import pstats
+import threading
+import time
+
+# 扫描周期的阶段
+STAGE_BUILD = "build"        # 取到期任务、合并写组帧
+STAGE_TRANSMIT = "transmit"  # 等待t3.5静默间隔并写串口
+STAGE_WAIT = "wait"          # 等待并读取响应
+STAGE_DECODE = "decode"      # CRC校验和解码
+STAGE_RENDER = "render"      # 界面/输出线程处理和显示结果
+STAGE_CYCLE = "cycle"  # 不便拆分的整个周期（如27930扫描）
+STAGES = (STAGE_BUILD, STAGE_TRANSMIT, STAGE_WAIT, STAGE_DECODE, STAGE_RENDER, STAGE_CYCLE)
+
+
+class _Span:
+    """with语句计时一个阶段"""
+
+    __slots__ = ("timer", "stage", "start")
+
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.add(self.stage, time.perf_counter_ns() - self.start)
+
+
+class StageTimer:
+    """按阶段累计的耗时（纳秒，线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}  # 阶段 -> [次数, 总耗时ns, 最大耗时ns]
+
+    def add(self, stage, elapsed_ns):
+        """累计一次阶段耗时"""
+        with self._lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += elapsed_ns
+            if elapsed_ns > entry[2]:
+                entry[2] = elapsed_ns
+
+    def span(self, stage):
+        """返回计时该阶段的上下文管理器"""
+        return _Span(self, stage)
+
+    def breakdown(self):
+        """各阶段的次数、总耗时、平均和最大耗时及占比，按STAGES顺序排列"""
+        with self._lock:
+            stages = {stage: list(entry) for stage, entry in self.stages.items()}
+        total = sum(entry[1] for stage, entry in stages.items() if stage != STAGE_CYCLE) or 1
+        order = [stage for stage in STAGES if stage in stages] + sorted(set(stages) - set(STAGES))
+        return {stage: {
+            "count": stages[stage][0],
+            "total_ms": stages[stage][1] / 1e6,
+            "avg_us": stages[stage][1] / stages[stage][0] / 1e3,
+            "max_us": stages[stage][2] / 1e3,
+            "share": stages[stage][1] / total if stage != STAGE_CYCLE else 1.0,
+        } for stage in order}
+
+
+class ScanProfiler:
+    """
+    对cycles个扫描周期做性能分析：各线程调用attach()开启本线程的cProfile，
+    周期数达到后finish()，各线程在下一次循环调用detach()，最后save()合并保存
+    """
+
+    def __init__(self, cycles, output):
+        self.cycles = cycles
+        self.output = output  # 输出文件前缀，生成 前缀.pstats 和 前缀.stages.json
+        self.stages = StageTimer()
+        self.completed = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+        self._profiles = {}    # 线程号 -> cProfile.Profile
+        self._detached = {}    # 线程号 -> threading.Event，Profile已在其线程中停止
+        self._finished = threading.Event()
+
+    @property
+    def finished(self):
+        """周期数已达到或已手动结束"""
+        return self._finished.is_set()
+
+    def attach(self):
+        """在当前线程开启cProfile（每个线程只开启一次）"""
+        ident = threading.get_ident()
+        with self._lock:
+            if self.finished or ident in self._profiles:
+                return
+            profile = self._profiles[ident] = cProfile.Profile()
+            self._detached[ident] = threading.Event()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12起cProfile作用于全部线程，已有线程开启时其他线程无需再开
+            with self._lock:
+                del self._profiles[ident]
+                del self._detached[ident]
+
+    def detach(self):
+        """在当前线程停止cProfile"""
+        ident = threading.get_ident()
+        with self._lock:
+            profile = self._profiles.get(ident)
+            detached = self._detached.get(ident)
+        if profile is not None and not detached.is_set():
+            profile.disable()
+            detached.set()
+
+    def cycle_done(self):
+        """完成一个扫描周期，达到周期数时返回True（只返回一次）"""
+        with self._lock:
+            if self.finished:
+                return False
+            self.completed += 1
+            if self.completed < self.cycles:
+                return False
+        self.finish()
+        return True
+
+    def finish(self):
+        """结束分析（调用线程的Profile同时停止）"""
+        if not self.finished:
+            self.elapsed = time.perf_counter() - self.started
+            self._finished.set()
+        self.detach()
+
+    def breakdown(self):
+        """分阶段结果"""
+        return {
+            "cycles": self.completed,
+            "elapsed_s": self.elapsed or time.perf_counter() - self.started,
+            "stages": self.stages.breakdown(),
+        }
+
+    def save(self, timeout=2.5):
+        """
+        等待各线程停止Profile后合并保存，返回(pstats文件, 分阶段JSON文件)；
+        超时仍未停止的线程不计入（其Profile只能在本线程中停止）
+        """
+        self.finish()
+        deadline = time.perf_counter() + timeout
+        stats = None
+        with self._lock:
+            profiles = list(self._profiles.items())
+        for ident, profile in profiles:
+            if not self._detached[ident].wait(max(0.0, deadline - time.perf_counter())):
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        stats_path = f"{self.output}.pstats"
+        if stats is not None:
+            stats.dump_stats(stats_path)
+        else:
+            stats_path = None
+        stages_path = f"{self.output}.stages.json"
+        with open(stages_path, "w", encoding="utf-8") as f:
+            json.dump(self.breakdown(), f, ensure_ascii=False, indent=2)
+        return stats_path, stages_path
+
+
+def format_breakdown(breakdown):
+    """把分阶段结果格式化为多行文本"""
+    lines = [f"{breakdown['cycles']} 个周期, 用时 {breakdown['elapsed_s']:.2f}s"]
+    for stage, entry in breakdown["stages"].items():
+        lines.append(f"  {stage:<9} 次数 {entry['count']:>7}, 平均 {entry['avg_us']:>9.1f}us, "
+                     f"最大 {entry['max_us']:>9.1f}us, 占比 {entry['share'] * 100:5.1f}%")
+    return "\n".join(lines)
+
+
+def compare_breakdowns(baseline, current):
+    """逐阶段比较两次运行的平均耗时，返回多行文本"""
+    lines = ["阶段      基准平均us   本次平均us   变化"]
+    stages = list(current["stages"]) + [stage for stage in baseline["stages"] if stage not in current["stages"]]
+    for stage in stages:
+        before = baseline["stages"].get(stage, {}).get("avg_us")
+        after = current["stages"].get(stage, {}).get("avg_us")
+        if before is None or after is None:
+            change = "—"
+        elif before:
+            change = f"{(after - before) / before * 100:+.1f}%"
+        else:
+            change = ""
+        lines.append(f"{stage:<9} {before if before is not None else 0:>11.1f} "
+                     f"{after if after is not None else 0:>12.1f}   {change}")
+    return "\n".join(lines)
+
+
+def load_breakdown(path):
+    """读取保存的分阶段结果"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus寄存器地图探测
+对无文档的设备，用尽量长的读请求找出某个从站、某个功能码下可读的地址区间：
+可读区间内每次按协议上限整块读取，遇到"非法数据地址"异常时二分查找区间边界，每个边界只需log(N)次请求；
+不可读的空白段按步长跳跃探测，探测到可读地址后再二分回找区间起点。
+结果按区间写入注释文件（如 01_5-20、03_reg_100-199，每个区间一条），解析窗口和poll --annotations可直接使用
+"""
+
+import json
+import os
+import time
+
+from modbus_frame import (
+    ModbusError, ModbusRequest, READ_FUNCTIONS, READ_BIT_FUNCTIONS, MAX_READ_BITS, MAX_READ_REGISTERS, TABLE_SIZE,
+    STATUS_OK, STATUS_EXCEPTION, STATUS_TIMEOUT, STATUS_LINK_ERROR,
+)
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+
+# 默认探测范围（很多设备的地址在0-9999之内）
+DEFAULT_FIRST = 0
+DEFAULT_LAST = 9999
+# 空白段的跳跃步长：短于步长的孤立可读区间可能漏掉，步长为1时逐个探测
+DEFAULT_STRIDE = 16
+# 超时、设备忙等非确定结果的重试次数
+DEFAULT_RETRIES = 2
+
+ANNOTATION_LABEL = "自动发现"
+
+
+class RegisterMapError(ModbusError):
+    """探测无法继续（功能码不支持、从站无响应等）"""
+
+
+def annotation_key(function_code, first, last=None):
+    """注释键：位为 功能码_地址，寄存器为 功能码_reg_地址；last不同于first时为区间 功能码_reg_起始-结束"""
+    address = f"{first}-{last}" if last is not None and last != first else f"{first}"
+    if function_code in READ_BIT_FUNCTIONS:
+        return f"{function_code:02d}_{address}"
+    return f"{function_code:02d}_reg_{address}"
+
+
+class RegisterRange:
+    """一个可读区间：区间内的地址都可读，单次读取不超过设备上限"""
+
+    def __init__(self, first, last):
+        self.first = first
+        self.last = last
+
+    @property
+    def count(self):
+        """区间内的寄存器数"""
+        return self.last - self.first + 1
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        return {"first": self.first, "last": self.last, "count": self.count}
+
+    def __repr__(self):
+        return f"RegisterRange({self.first}-{self.last})"
+
+
+class RegisterMapper:
+    """对一个从站的一个读功能码探测可读区间"""
+
+    def __init__(self, link, slave, function_code, timeout=None, stride=DEFAULT_STRIDE, max_count=None,
+                 retries=DEFAULT_RETRIES, silent_invalid=False, on_event=None):
+        if function_code not in READ_FUNCTIONS:
+            raise ValueError(f"只能探测读功能码01-04: {function_code}")
+        self.link = link
+        self.slave = slave
+        self.function_code = function_code
+        self.timeout = timeout
+        limit = MAX_READ_BITS if function_code in READ_BIT_FUNCTIONS else MAX_READ_REGISTERS
+        # 设备的单次读取上限，收到"非法数据值"异常时下调
+        self.max_count = min(limit, max_count) if max_count else limit
+        self.stride = max(1, min(stride, self.max_count))
+        self.retries = retries
+        self.silent_invalid = silent_invalid  # 不可读地址不响应（而不是返回异常）的设备
+        self.on_event = on_event  # on_event(事件, 数据)：("request", (地址, 数量, 是否可读))、("range", RegisterRange)
+        self.requests = 0
+        self.elapsed = 0.0
+
+    def readable(self, address, count):
+        """读取[address, address+count)是否成功"""
+        for attempt in range(self.retries + 1):
+            result = self.link.transact(ModbusRequest(self.slave, self.function_code, address, count), self.timeout)
+            self.requests += 1
+            status = result.status
+            if status == STATUS_OK:
+                return self._report(address, count, True)
+            if status == STATUS_EXCEPTION:
+                code = result.error.exception_code
+                if code == ILLEGAL_DATA_ADDRESS:
+                    return self._report(address, count, False)
+                if code == ILLEGAL_DATA_VALUE:
+                    if count > 1:
+                        # 数量超过设备上限：之后的整块读取不再超过本次数量
+                        self.max_count = min(self.max_count, count - 1)
+                    return self._report(address, count, False)
+                if code == ILLEGAL_FUNCTION:
+                    raise RegisterMapError(f"从站{self.slave}不支持功能码{self.function_code:02d}")
+                # 设备故障/忙等：重试
+            elif status == STATUS_LINK_ERROR:
+                raise result.error
+        if status == STATUS_TIMEOUT and self.silent_invalid:
+            return self._report(address, count, False)
+        raise RegisterMapError(f"从站{self.slave}地址{address}数量{count}: 重试{self.retries}次后仍失败: {result.error}")
+
+    def _report(self, address, count, ok):
+        """通知一次探测请求的结果，返回ok"""
+        if self.on_event is not None:
+            self.on_event("request", (address, count, ok))
+        return ok
+
+    def _run_length(self, address, limit, known=1):
+        """从address开始可一次读取的最大数量（不超过limit），known为已知可读的数量"""
+        if known >= limit or self.readable(address, limit):
+            return limit
+        good, bad = known, limit
+        while bad - good > 1:
+            mid = (good + bad) // 2
+            if self.readable(address, mid):
+                good = mid
+            else:
+                bad = mid
+        return good
+
+    def _run_start(self, invalid, valid):
+        """在(invalid, valid]中二分查找可读区间的起点（到valid为止可以一次读取的最小地址）"""
+        bad, good = invalid, valid
+        while good - bad > 1:
+            mid = (good + bad) // 2
+            if self.readable(mid, valid - mid + 1):
+                good = mid
+            else:
+                bad = mid
+        return good
+
+    def _next_readable(self, invalid, last):
+        """从不可读的地址invalid起按步长跳跃，返回(下一个可读区间的起点, 已知可读数量)，没有时返回(None, 0)"""
+        probe = invalid
+        while probe < last:
+            probe = min(probe + self.stride, last)
+            if self.readable(probe, 1):
+                start = self._run_start(invalid, probe)
+                return start, probe - start + 1
+            invalid = probe
+        return None, 0
+
+    def map(self, first=DEFAULT_FIRST, last=DEFAULT_LAST):
+        """探测[first, last]内的可读区间，返回RegisterRange列表（相邻的区间之间不能一次读取）"""
+        last = min(last, TABLE_SIZE - 1)
+        start_time = time.perf_counter()
+        ranges = []
+        current = None  # 因数量上限截断、可能延续的区间
+        address = first
+        while address <= last:
+            known = 1
+            if current is not None and not self.readable(address - 1, 2):
+                # 与上一块跨边界读取失败：上一块结束（下一个地址可能属于另一个区间）
+                self._emit_range(current)
+                current = None
+            if current is None and not self.readable(address, 1):
+                address, known = self._next_readable(address, last)
+                if address is None:
+                    break
+            limit = min(self.max_count, last - address + 1)
+            length = self._run_length(address, limit, min(known, limit))
+            if current is not None:
+                current.last = address + length - 1
+            else:
+                current = RegisterRange(address, address + length - 1)
+                ranges.append(current)
+            address += length
+            if length < min(self.max_count, limit):
+                # 下一个地址不能与本区间一起读取：区间结束，下一个地址单独探测
+                self._emit_range(current)
+                current = None
+        if current is not None:
+            self._emit_range(current)
+        self.elapsed = time.perf_counter() - start_time
+        return ranges
+
+    def _emit_range(self, current):
+        """通知发现一个可读区间"""
+        if self.on_event is not None:
+            self.on_event("range", current)
+
+
+def to_annotations(ranges, function_code, label=ANNOTATION_LABEL):
+    """把可读区间转换为注释键值，每个区间一条（不按地址展开）"""
+    annotations = {}
+    for register_range in ranges:
+        text = f"{label} {register_range.first}-{register_range.last}"
+        annotations[annotation_key(function_code, register_range.first, register_range.last)] = text
+    return annotations
+
+
+def save_annotations(path, ranges, function_code, label=ANNOTATION_LABEL):
+    """把可读区间合并到注释文件，已有的注释不覆盖，返回新增的键数"""
+    annotations = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            annotations = json.load(f)
+    added = 0
+    for key, value in to_annotations(ranges, function_code, label).items():
+        if key not in annotations:
+            annotations[key] = value
+            added += 1
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(annotations, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return added
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus RTU流式帧解码模块
+输入任意分段到达的原始字节和到达时间戳，按波特率计算的t1.5/t3.5帧间隔和功能码/字节数推算的帧长切分帧，
+遇到噪声时逐字节用CRC扫描重新同步；输出的帧是接收数据块的memoryview切片，不复制数据
+"""
+
+import time
+
+from modbus_crc import crc16
+from modbus_serial import char_time
+
+# RTU帧最大长度
+MAX_ADU_LENGTH = 256
+# 最短RTU帧：从站地址 + 功能码 + CRC
+MIN_ADU_LENGTH = 4
+# 标准功能码；不在表中的字节组合视为噪声
+KNOWN_FUNCTIONS = frozenset((1, 2, 3, 4, 5, 6, 7, 8, 11, 12, 15, 16, 17, 20, 21, 22, 23, 24, 43))
+
+REQUEST = "request"
+RESPONSE = "response"
+EXCEPTION = "exception"
+
+
+class RtuFrame:
+    """解码出的一帧：data为memoryview，timestamp_ns为首字节所在数据块的到达时间"""
+
+    __slots__ = ("data", "timestamp_ns", "kind", "timing_error")
+
+    def __init__(self, data, timestamp_ns, kind=None, timing_error=False):
+        self.data = data
+        self.timestamp_ns = timestamp_ns
+        self.kind = kind
+        self.timing_error = timing_error
+
+    @property
+    def slave(self):
+        """从站地址"""
+        return self.data[0]
+
+    @property
+    def function_code(self):
+        """功能码（异常响应时包含0x80位）"""
+        return self.data[1]
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bytes__(self):
+        return self.data.tobytes()
+
+    def __repr__(self):
+        return f"RtuFrame({self.kind}, {self.data.hex(' ').upper()})"
+
+
+class RtuFrameDecoder:
+    """
+    Modbus RTU流式解码器
+    mode: "request"只解码主站请求，"response"只解码从站响应，"both"用于监听总线上的双向报文
+    strict_timing: 为True时，帧内字符间隔超过t1.5的帧标记timing_error
+    """
+
+    def __init__(self, baudrate=9600, mode="both", strict_timing=False):
+        self.baudrate = baudrate
+        self.mode = mode
+        self.strict_timing = strict_timing
+        self.char_ns = int(char_time(baudrate) * 1e9)
+        if baudrate > 19200:
+            # 规范规定高波特率下使用固定的t1.5=750us、t3.5=1750us
+            self.t15_ns = 750000
+            self.t35_ns = 1750000
+        else:
+            self.t15_ns = int(1.5 * self.char_ns)
+            self.t35_ns = int(3.5 * self.char_ns)
+        self._pending = b""
+        self._pending_ts = 0
+        self._last_ts = None
+        self._timing_error = False
+        # 统计
+        self.frames = 0
+        self.noise_bytes = 0
+        self.bytes_in = 0
+
+    def _candidate_lengths(self, buf, pos, available):
+        """
+        根据功能码和字节数推算可能的帧长
+        返回(长度列表, 类型列表)；数据不足以判断时返回None；不是合法帧头时返回空列表
+        """
+        slave = buf[pos]
+        function_code = buf[pos + 1]
+        if slave > 247:
+            return (), ()
+        if function_code & 0x80:
+            if function_code & 0x7F in KNOWN_FUNCTIONS and self.mode != REQUEST:
+                return (5,), (EXCEPTION,)
+            return (), ()
+        if function_code not in KNOWN_FUNCTIONS:
+            return (), ()
+        mode = self.mode
+        if function_code <= 4:
+            if mode == REQUEST:
+                return (8,), (REQUEST,)
+            if available < 3:
+                return None
+            if mode == RESPONSE:
+                return (5 + buf[pos + 2],), (RESPONSE,)
+            return (8, 5 + buf[pos + 2]), (REQUEST, RESPONSE)
+        if function_code in (5, 6):
+            return (8,), (REQUEST if mode == REQUEST else RESPONSE,)
+        if function_code in (15, 16):
+            if mode == RESPONSE:
+                return (8,), (RESPONSE,)
+            if available < 7:
+                return None
+            if mode == REQUEST:
+                return (9 + buf[pos + 6],), (REQUEST,)
+            return (8, 9 + buf[pos + 6]), (RESPONSE, REQUEST)
+        # 其他功能码的帧长无法推算，只能依靠t3.5间隔确定帧尾
+        return (-1,), (None,)
+
+    def _scan(self, buf, timestamp_ns, final):
+        """扫描缓冲区，返回(帧列表, 已消耗的字节数)；final为True表示t3.5间隔已到，缓冲区内不会再有后续字节"""
+        frames = []
+        view = memoryview(buf)
+        length = len(buf)
+        pos = 0
+        while length - pos >= MIN_ADU_LENGTH:
+            candidates = self._candidate_lengths(buf, pos, length - pos)
+            if candidates is None:
+                break
+            lengths, kinds = candidates
+            matched = False
+            need_more = False
+            for frame_length, kind in zip(lengths, kinds):
+                if frame_length < 0:
+                    # 帧长未知：t3.5间隔到达后整段作为一帧
+                    if not final:
+                        need_more = length - pos < MAX_ADU_LENGTH
+                        continue
+                    frame_length = length - pos
+                if pos + frame_length > length:
+                    need_more = True
+                    continue
+                if crc16(view[pos:pos + frame_length]) == 0:
+                    frames.append(RtuFrame(view[pos:pos + frame_length], timestamp_ns, kind, self._timing_error))
+                    pos += frame_length
+                    matched = True
+                    break
+            if matched:
+                continue
+            if need_more and not final:
+                break
+            # 当前位置不是有效帧头：丢弃一个字节，继续用CRC扫描重新同步
+            pos += 1
+            self.noise_bytes += 1
+        if final:
+            self.noise_bytes += length - pos
+            pos = length
+        self.frames += len(frames)
+        return frames, pos
+
+    def feed(self, data, timestamp_ns=None):
+        """
+        输入一段原始字节，返回解码出的帧列表
+        timestamp_ns为这段数据最后一个字节的到达时间（纳秒，默认取time.perf_counter_ns()）
+        """
+        if timestamp_ns is None:
+            timestamp_ns = time.perf_counter_ns()
+        self.bytes_in += len(data)
+        frames = []
+        # 本段首字节的估计到达时间
+        first_ts = timestamp_ns - len(data) * self.char_ns
+        if self._pending and self._last_ts is not None:
+            gap = first_ts - self._last_ts
+            if gap >= self.t35_ns:
+                # 帧间隔已到：缓冲区中的残留字节自成一段
+                frames, _ = self._scan(self._pending, self._pending_ts, True)
+                self._pending = b""
+                self._timing_error = False
+            elif gap > self.t15_ns and self.strict_timing:
+                self._timing_error = True
+        self._last_ts = timestamp_ns
+
+        if self._pending:
+            buf = self._pending + bytes(data)
+            buf_ts = self._pending_ts
+        else:
+            buf = data if isinstance(data, bytes) else bytes(data)
+            buf_ts = first_ts
+        new_frames, consumed = self._scan(buf, buf_ts, False)
+        if new_frames:
+            frames.extend(new_frames)
+            self._timing_error = False
+        if consumed < len(buf):
+            # 只复制未完成的尾部
+            self._pending = bytes(buf[consumed:])
+            if consumed:
+                self._pending_ts = first_ts
+            else:
+                self._pending_ts = buf_ts
+        else:
+            self._pending = b""
+        return frames
+
+    def flush(self):
+        """线路静默超过t3.5时调用，处理缓冲区中的残留字节"""
+        if not self._pending:
+            return []
+        frames, _ = self._scan(self._pending, self._pending_ts, True)
+        self._pending = b""
+        self._timing_error = False
+        return frames
+
+    def stats(self):
+        """解码统计"""
+        return {"bytes_in": self.bytes_in, "frames": self.frames, "noise_bytes": self.noise_bytes}
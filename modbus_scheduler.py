@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus轮询调度模块
+按截止时间调度多个轮询任务：每个任务有独立周期和优先级，采用固定速率计时（不累积漂移），
+周期为0的任务作为后台任务填充总线空闲时间，总线跟不上时统计超时未执行（overrun）次数
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+from modbus_frame import ModbusRequest
+
+
+class PollTask:
+    """一个轮询任务：从站、功能码、地址范围、周期（秒）和优先级（数值越小越优先）"""
+
+    def __init__(self, slave, function_code, address, count, period, priority=10, name=None, block=None):
+        self.slave = slave
+        self.function_code = function_code
+        self.address = address
+        self.count = count
+        self.period = period
+        self.priority = priority
+        self.name = name or f"{slave}:{function_code:02d}:{address}+{count}"
+        self.request = ModbusRequest(slave, function_code, address, count, tag=self)
+        self.block = block  # 由合并规划生成时对应的ReadBlock，用于把响应拆分到点位
+        self.active = True
+        self.next_due = 0.0
+        # 统计
+        self.runs = 0
+        self.overruns = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+
+    @classmethod
+    def from_block(cls, block, period, priority=10):
+        """由合并规划得到的ReadBlock创建轮询任务"""
+        return cls(block.slave, block.function_code, block.address, block.count, period, priority, block=block)
+
+    def copy(self):
+        """复制任务参数（不含统计），用于把同一任务加入另一个串口的调度器"""
+        return PollTask(self.slave, self.function_code, self.address, self.count, self.period,
+                        self.priority, self.name, self.block)
+
+    @property
+    def is_background(self):
+        """周期为0的任务只在总线空闲时执行"""
+        return self.period <= 0
+
+    def stats(self):
+        """任务统计信息"""
+        return {
+            "name": self.name,
+            "period_ms": self.period * 1000,
+            "priority": self.priority,
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "avg_lag_ms": self.total_lag / self.runs * 1000 if self.runs else 0.0,
+            "max_lag_ms": self.max_lag * 1000,
+        }
+
+    def __repr__(self):
+        return f"PollTask({self.name}, period={self.period * 1000:.0f}ms, priority={self.priority})"
+
+
+class PollScheduler:
+    """截止时间调度器（线程安全，可以在界面线程增删任务，在I/O线程取任务）"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._waiting = []      # 未到期的周期任务：(截止时间, 序号, 任务)
+        self._ready = []        # 已到期的周期任务：(优先级, 截止时间, 序号, 任务)
+        self._background = []   # 后台任务，轮流执行
+        self._background_index = 0
+        self.overruns = 0
+        self.on_overrun = None  # 回调：on_overrun(task, missed)
+
+    def add(self, task, start=None):
+        """添加任务，默认立即开始"""
+        with self._lock:
+            task.active = True
+            if task.is_background:
+                self._background.append(task)
+                return task
+            task.next_due = self.clock() if start is None else start
+            heapq.heappush(self._waiting, (task.next_due, next(self._seq), task))
+        return task
+
+    def remove(self, task):
+        """移除任务（堆中的条目在取出时丢弃）"""
+        with self._lock:
+            task.active = False
+            if task in self._background:
+                self._background.remove(task)
+
+    def clear(self):
+        """移除全部任务"""
+        with self._lock:
+            for entry in self._waiting:
+                entry[-1].active = False
+            for entry in self._ready:
+                entry[-1].active = False
+            for task in self._background:
+                task.active = False
+            self._waiting = []
+            self._ready = []
+            self._background = []
+
+    def tasks(self):
+        """当前全部任务"""
+        with self._lock:
+            tasks = [entry[-1] for entry in self._waiting + self._ready if entry[-1].active]
+            return tasks + list(self._background)
+
+    def _promote(self, now):
+        """把已到期的任务从等待堆移入就绪堆（调用方持有锁）"""
+        waiting = self._waiting
+        while waiting and waiting[0][0] <= now:
+            due, seq, task = heapq.heappop(waiting)
+            if task.active:
+                heapq.heappush(self._ready, (task.priority, due, seq, task))
+
+    def due_priority(self, now=None):
+        """已到期的周期任务中最高的优先级（数值最小），没有到期任务时返回None；后台任务不计入"""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            self._promote(now)
+            ready = self._ready
+            while ready and not ready[0][-1].active:
+                heapq.heappop(ready)
+            return ready[0][0] if ready else None
+
+    def next_task(self, now=None):
+        """取下一个要执行的任务，返回(任务, 0)；没有任务到期时返回(None, 距下一个到期的秒数)"""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            waiting = self._waiting
+            ready = self._ready
+            self._promote(now)
+            while ready:
+                task = heapq.heappop(ready)[-1]
+                if task.active:
+                    lag = now - task.next_due
+                    task.total_lag += lag
+                    if lag > task.max_lag:
+                        task.max_lag = lag
+                    return task, 0.0
+            if self._background:
+                self._background_index = (self._background_index + 1) % len(self._background)
+                return self._background[self._background_index], 0.0
+            if waiting:
+                return None, waiting[0][0] - now
+            return None, None
+
+    def complete(self, task, now=None):
+        """任务执行完毕：按固定速率计算下一次截止时间，错过的周期计为overrun"""
+        if now is None:
+            now = self.clock()
+        task.runs += 1
+        if task.is_background or not task.active:
+            return
+        due = task.next_due + task.period
+        missed = 0
+        if due <= now:
+            # 总线跟不上：跳过已错过的周期，保持原有时间网格
+            missed = int((now - due) // task.period) + 1
+            due += missed * task.period
+            task.overruns += missed
+        with self._lock:
+            self.overruns += missed
+            task.next_due = due
+            heapq.heappush(self._waiting, (due, next(self._seq), task))
+        if missed and self.on_overrun:
+            self.on_overrun(task, missed)
+
+    def stats(self):
+        """全部任务的统计信息"""
+        return [task.stats() for task in self.tasks()]
+
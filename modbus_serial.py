@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus RTU串口传输模块
+SerialLink在当前线程内完成一次请求/响应；SerialWorker在独立线程中独占串口，
+从请求队列取请求，把解码后的结果放入结果队列，界面线程只需定时取结果
+"""
+
+import queue
+import threading
+import time
+
+import serial
+
+from modbus_frame import ModbusResult
+from modbus_profile import STAGE_BUILD, STAGE_TRANSMIT, STAGE_WAIT, STAGE_DECODE
+from modbus_scheduler import PollTask
+
+# 默认响应超时（秒）
+DEFAULT_TIMEOUT = 0.5
+
+PARITY_MAP = {
+    "无": serial.PARITY_NONE,
+    "奇校验": serial.PARITY_ODD,
+    "偶校验": serial.PARITY_EVEN,
+    "N": serial.PARITY_NONE,
+    "O": serial.PARITY_ODD,
+    "E": serial.PARITY_EVEN,
+}
+
+STOPBITS_MAP = {
+    "1": serial.STOPBITS_ONE,
+    "1.5": serial.STOPBITS_ONE_POINT_FIVE,
+    "2": serial.STOPBITS_TWO,
+}
+
+
+def open_port(port, baudrate=9600, bytesize=8, parity="N", stopbits="1", timeout=DEFAULT_TIMEOUT):
+    """打开串口，port既可以是设备名（COM3、/dev/ttyUSB0）也可以是pyserial URL（loop://）"""
+    return serial.serial_for_url(
+        port,
+        baudrate=int(baudrate),
+        bytesize=int(bytesize),
+        parity=PARITY_MAP.get(parity, parity),
+        stopbits=STOPBITS_MAP.get(str(stopbits), stopbits),
+        timeout=timeout,
+    )
+
+
+def char_time(baudrate):
+    """一个字符（11位）在总线上的传输时间（秒）"""
+    return 11.0 / baudrate
+
+
+def frame_gap(baudrate):
+    """RTU帧间隔t3.5（秒），波特率高于19200时按规范固定为1.75ms"""
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * char_time(baudrate)
+
+
+class SerialLink:
+    """同步串口链路：发送一帧并按预期长度读取响应"""
+
+    def __init__(self, ser, timeout=DEFAULT_TIMEOUT):
+        self.ser = ser
+        self.timeout = timeout
+        self.baudrate = getattr(ser, "baudrate", 9600) or 9600
+        self.gap = frame_gap(self.baudrate)
+        self.last_activity = 0.0
+        self.stages = None  # StageTimer：性能分析时记录发送、等待和解码耗时
+        self.capture = None  # CaptureChannel：抓包时记录收发的每一帧
+
+    def read_response(self, expected_length, timeout):
+        """读取一帧响应，异常响应（5字节）会提前结束，超时返回已收到的字节"""
+        ser = self.ser
+        ser.timeout = timeout
+        head = ser.read(3)
+        if len(head) < 3:
+            return head
+        if head[1] & 0x80:
+            remaining = 2
+        else:
+            remaining = expected_length - 3
+        # 首字节到达后，剩余字节只需等待传输时间加一点余量
+        ser.timeout = remaining * char_time(self.baudrate) + self.gap + 0.05
+        return head + ser.read(remaining)
+
+    def transact(self, request, timeout=None):
+        """执行一次请求/响应事务，返回已解码的ModbusResult"""
+        if timeout is None:
+            timeout = self.timeout
+        ser = self.ser
+        begin_ns = time.perf_counter_ns()
+        # 保证与上一帧之间至少有t3.5的静默间隔
+        idle = time.perf_counter() - self.last_activity
+        if idle < self.gap:
+            time.sleep(self.gap - idle)
+        if ser.in_waiting:
+            ser.reset_input_buffer()
+        start = time.perf_counter()
+        ser.write(request.frame)
+        written_ns = time.perf_counter_ns()
+        capture = self.capture
+        if capture is not None:
+            capture.tx(request.frame)
+        response = self.read_response(request.expected_length, timeout)
+        self.last_activity = time.perf_counter()
+        received_ns = time.perf_counter_ns()
+        if capture is not None:
+            capture.rx(response)
+        result = ModbusResult(request, response, elapsed=self.last_activity - start, timestamp=time.time())
+        result.decode()
+        stages = self.stages
+        if stages is not None:
+            stages.add(STAGE_TRANSMIT, written_ns - begin_ns)
+            stages.add(STAGE_WAIT, received_ns - written_ns)
+            stages.add(STAGE_DECODE, time.perf_counter_ns() - received_ns)
+        return result
+
+    def close(self):
+        """关闭串口"""
+        self.ser.close()
+
+
+class SerialWorker(threading.Thread):
+    """串口I/O线程：独占串口，优先处理请求队列中的手动请求，其次执行合并写和调度器中的轮询任务"""
+
+    def __init__(self, link, result_queue=None, scheduler=None, policy=None, name="modbus-serial", port=None,
+                 write_queue=None, metrics=None):
+        super().__init__(name=name, daemon=True)
+        self.link = link
+        self.port = port  # 串口名，写入每个结果，用于多串口汇总
+        self.requests = queue.Queue()
+        self.results = result_queue if result_queue is not None else queue.Queue()
+        self.scheduler = scheduler
+        self.policy = policy  # TimeoutPolicy：按从站自适应超时、重试和离线跳过
+        self.write_queue = write_queue  # WriteQueue：合并写，与轮询任务按优先级交替执行
+        self.metrics = metrics  # BusMetrics：累计请求、延迟、字节和调度滞后
+        self.profiler = None  # ScanProfiler：性能分析期间由界面线程设置
+        self._stop_event = threading.Event()
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._skipped = 0
+
+    def submit(self, request):
+        """提交一个请求（线程安全，不阻塞）"""
+        with self._pending_lock:
+            self._pending += 1
+        self.requests.put(request)
+
+    def pending(self):
+        """尚未完成的请求数量"""
+        return self._pending
+
+    def _next_request(self):
+        """
+        取下一个请求：手动请求优先，其次按优先级在合并写和到期的轮询任务之间选择，
+        返回(请求, 来源)，来源为轮询任务、WriteBatch或None（手动请求）
+        """
+        try:
+            return self.requests.get_nowait(), None
+        except queue.Empty:
+            pass
+        begin_ns = time.perf_counter_ns()
+        writes = self.write_queue
+        if writes is not None and writes.pending():
+            due_priority = self.scheduler.due_priority() if self.scheduler is not None else None
+            if due_priority is None or writes.priority <= due_priority:
+                batch = writes.next_batch()
+                if batch is not None:
+                    self._record_build(begin_ns)
+                    return batch.request, batch
+        wait = 0.1
+        if self.scheduler is not None:
+            task, due_in = self.scheduler.next_task()
+            if task is not None:
+                self._record_build(begin_ns)
+                return task.request, task
+            if due_in is not None:
+                wait = min(wait, due_in)
+        try:
+            return self.requests.get(timeout=wait), None
+        except queue.Empty:
+            return False, None
+
+    def _record_build(self, begin_ns):
+        """性能分析时记录取任务/合并写组帧的耗时"""
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.stages.add(STAGE_BUILD, time.perf_counter_ns() - begin_ns)
+
+    def _update_profiler(self):
+        """性能分析开始时在本线程开启cProfile，结束后停止，并切换链路的分阶段计时"""
+        profiler = self.profiler
+        if profiler is None:
+            return
+        if profiler.finished:
+            profiler.detach()
+            self.profiler = None
+            self.link.stages = None
+        else:
+            profiler.attach()
+            self.link.stages = profiler.stages
+
+    def run(self):
+        """线程主循环"""
+        while not self._stop_event.is_set():
+            self._update_profiler()
+            request, task = self._next_request()
+            if request is False:
+                continue
+            if request is None:
+                break
+            polled = isinstance(task, PollTask)
+            if polled and self.metrics is not None and not task.is_background:
+                self.metrics.record_lag(self.port, self.scheduler.clock() - task.next_due)
+            try:
+                if self.policy is None:
+                    result = self.link.transact(request)
+                else:
+                    # 手动请求和写总是发送，轮询任务在从站离线时跳过
+                    result = self.policy.execute(self.link, request, force=not polled)
+            except (serial.SerialException, OSError) as e:
+                result = ModbusResult(request, error=e, timestamp=time.time())
+            if polled:
+                self.scheduler.complete(task)
+            elif task is None:
+                with self._pending_lock:
+                    self._pending -= 1
+            if result is None:
+                self._wait_for_probe()
+                continue
+            self._skipped = 0
+            result.port = self.port
+            if self.metrics is not None:
+                self.metrics.record(result)
+            self.results.put(result)
+
+    def _wait_for_probe(self):
+        """轮询任务因从站离线被跳过：连续跳过次数超过任务数时说明只剩离线从站，稍作等待避免空转"""
+        self._skipped += 1
+        if self._skipped > len(self.scheduler.tasks()):
+            self._skipped = 0
+            probe_in = self.policy.next_probe_in()
+            self._stop_event.wait(0.1 if probe_in is None else min(probe_in, 0.1))
+
+    def stop(self, timeout=1.0):
+        """停止线程并关闭串口"""
+        self._stop_event.set()
+        self.requests.put(None)
+        if self.is_alive():
+            self.join(timeout)
+        self.link.close()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus从站模拟器
+用可配置的寄存器/线圈映像确定性地应答请求，支持功能码01-06、15、16和异常响应，
+可配置响应延迟和抖动，可注入故障（CRC错误、不响应、截断帧）；
+通过pty虚拟串口对（RTU）或TCP（Modbus TCP或RTU透传）对外提供服务，用于压测和复现问题
+"""
+
+import json
+import os
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from array import array
+
+from modbus_frame import (
+    READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS,
+    WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS, WRITE_FUNCTIONS,
+    MAX_READ_BITS, MAX_READ_REGISTERS, MAX_WRITE_BITS, MAX_WRITE_REGISTERS, encode_bits, rtu_frame,
+    COILS, DISCRETE_INPUTS, HOLDING_REGISTERS, INPUT_REGISTERS, TABLE_SIZE,
+)
+from modbus_rtu_decoder import RtuFrameDecoder
+from modbus_tcp import MBAP_HEADER, build_mbap
+
+# 异常码
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+
+
+class SlaveImage:
+    """一个从站的数据映像：线圈/离散输入用bytearray（每点1字节），寄存器用array('H')"""
+
+    def __init__(self, ranges=None, pattern=False):
+        self.coils = bytearray(TABLE_SIZE)
+        self.discrete_inputs = bytearray(TABLE_SIZE)
+        self.holding_registers = array("H", bytes(TABLE_SIZE * 2))
+        self.input_registers = array("H", bytes(TABLE_SIZE * 2))
+        # 各表的有效地址范围 {表名: [(起始, 结束(不含))]}，未配置的表全部有效
+        self.ranges = ranges or {}
+        if pattern:
+            self.fill_pattern()
+
+    def fill_pattern(self):
+        """填充确定性的测试数据：寄存器值等于地址，输入寄存器为地址的反码，线圈按地址奇偶"""
+        for address in range(TABLE_SIZE):
+            self.holding_registers[address] = address
+            self.input_registers[address] = address ^ 0xFFFF
+            self.coils[address] = address & 1
+            self.discrete_inputs[address] = (address >> 1) & 1
+
+    def valid(self, table, address, count):
+        """判断地址范围是否全部有效"""
+        if address + count > TABLE_SIZE:
+            return False
+        ranges = self.ranges.get(table)
+        if not ranges:
+            return True
+        return any(start <= address and address + count <= end for start, end in ranges)
+
+    @classmethod
+    def from_dict(cls, config):
+        """
+        从配置字典创建映像，格式：
+        {"ranges": {"holding_registers": [[0, 100]]}, "holding_registers": {"0": 123}, "coils": {"5": 1}, "pattern": true}
+        """
+        image = cls({table: [tuple(r) for r in ranges] for table, ranges in config.get("ranges", {}).items()},
+                    config.get("pattern", False))
+        for table in (COILS, DISCRETE_INPUTS, HOLDING_REGISTERS, INPUT_REGISTERS):
+            target = getattr(image, table)
+            for address, value in config.get(table, {}).items():
+                target[int(address)] = int(value)
+        return image
+
+
+class FaultConfig:
+    """故障注入配置：各类故障的发生概率（0-1）"""
+
+    def __init__(self, crc_error_rate=0.0, timeout_rate=0.0, truncate_rate=0.0):
+        self.crc_error_rate = crc_error_rate
+        self.timeout_rate = timeout_rate
+        self.truncate_rate = truncate_rate
+
+
+class ModbusSlaveSimulator:
+    """从站模拟器：按从站地址分发请求到各自的SlaveImage"""
+
+    def __init__(self, images=None, latency=0.0, jitter=0.0, faults=None, seed=0):
+        self.images = images if images is not None else {1: SlaveImage(pattern=True)}
+        self.latency = latency
+        self.jitter = jitter
+        self.faults = faults or FaultConfig()
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # 统计
+        self.requests = 0
+        self.exceptions = 0
+        self.faults_injected = 0
+
+    def response_delay(self):
+        """本次响应的延迟（秒）"""
+        if not self.jitter:
+            return self.latency
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    def handle_pdu(self, slave, pdu):
+        """处理一个请求PDU，返回响应PDU；从站不存在或广播时返回None"""
+        if len(pdu) < 1:
+            return None
+        if slave == 0:
+            # 广播：写功能码在每个从站的映像上执行，都不应答；读请求不能广播，忽略
+            if pdu[0] in WRITE_FUNCTIONS:
+                with self.lock:
+                    self.requests += 1
+                    for image in self.images.values():
+                        self._dispatch(image, pdu)
+            return None
+        image = self.images.get(slave)
+        if image is None:
+            return None
+        with self.lock:
+            self.requests += 1
+            response = self._dispatch(image, pdu)
+            if response[0] & 0x80:
+                self.exceptions += 1
+        return response
+
+    def _exception(self, function_code, code):
+        """构建异常响应PDU"""
+        return bytes((function_code | 0x80, code))
+
+    def _dispatch(self, image, pdu):
+        """按功能码处理请求"""
+        function_code = pdu[0]
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS, READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS,
+                             WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER):
+            if len(pdu) != 5:
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            address, value = struct.unpack(">HH", pdu[1:5])
+        elif function_code in (WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS):
+            if len(pdu) < 6 or len(pdu) != 6 + pdu[5]:
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            address, value = struct.unpack(">HH", pdu[1:5])
+        else:
+            return self._exception(function_code, ILLEGAL_FUNCTION)
+
+        if function_code in (READ_COILS, READ_DISCRETE_INPUTS):
+            table = COILS if function_code == READ_COILS else DISCRETE_INPUTS
+            if not 1 <= value <= MAX_READ_BITS:
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            if not image.valid(table, address, value):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            data = encode_bits(getattr(image, table)[address:address + value])
+            return bytes((function_code, len(data))) + data
+
+        if function_code in (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS):
+            table = HOLDING_REGISTERS if function_code == READ_HOLDING_REGISTERS else INPUT_REGISTERS
+            if not 1 <= value <= MAX_READ_REGISTERS:
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            if not image.valid(table, address, value):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            registers = getattr(image, table)[address:address + value]
+            registers.byteswap()  # array按本机字节序存储，Modbus为大端
+            return bytes((function_code, value * 2)) + registers.tobytes()
+
+        if function_code == WRITE_SINGLE_COIL:
+            if value not in (0x0000, 0xFF00):
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            if not image.valid(COILS, address, 1):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            image.coils[address] = 1 if value else 0
+            return pdu
+
+        if function_code == WRITE_SINGLE_REGISTER:
+            if not image.valid(HOLDING_REGISTERS, address, 1):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            image.holding_registers[address] = value
+            return pdu
+
+        data = pdu[6:]
+        if function_code == WRITE_MULTIPLE_COILS:
+            if not 1 <= value <= MAX_WRITE_BITS or len(data) != (value + 7) // 8:
+                return self._exception(function_code, ILLEGAL_DATA_VALUE)
+            if not image.valid(COILS, address, value):
+                return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+            for i in range(value):
+                image.coils[address + i] = (data[i >> 3] >> (i & 7)) & 1
+            return pdu[:5]
+
+        # WRITE_MULTIPLE_REGISTERS
+        if not 1 <= value <= MAX_WRITE_REGISTERS or len(data) != value * 2:
+            return self._exception(function_code, ILLEGAL_DATA_VALUE)
+        if not image.valid(HOLDING_REGISTERS, address, value):
+            return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+        registers = array("H", data)
+        registers.byteswap()
+        image.holding_registers[address:address + value] = registers
+        return pdu[:5]
+
+    def _pick_fault(self):
+        """按概率选择本次注入的故障，返回故障名或None"""
+        faults = self.faults
+        if not (faults.crc_error_rate or faults.timeout_rate or faults.truncate_rate):
+            return None
+        with self.lock:
+            roll = self.random.random()
+        for name, rate in (("timeout", faults.timeout_rate), ("crc", faults.crc_error_rate),
+                           ("truncate", faults.truncate_rate)):
+            if roll < rate:
+                self.faults_injected += 1
+                return name
+            roll -= rate
+        return None
+
+    def handle_rtu(self, frame):
+        """处理一个RTU请求帧（已通过CRC校验），返回响应帧；不应答时返回None"""
+        if frame[0] == 0:
+            # 广播：执行但不应答
+            self.handle_pdu(0, bytes(frame[1:-2]))
+            return None
+        pdu = self.handle_pdu(frame[0], bytes(frame[1:-2]))
+        if pdu is None:
+            return None
+        fault = self._pick_fault()
+        if fault == "timeout":
+            return None
+        response = rtu_frame(frame[0], pdu)
+        if fault == "crc":
+            response = response[:-1] + bytes((response[-1] ^ 0xFF,))
+        elif fault == "truncate":
+            response = response[:max(1, len(response) // 2)]
+        return response
+
+    def handle_mbap(self, unit, pdu):
+        """处理一个Modbus TCP请求PDU，返回响应PDU；不应答时返回None"""
+        response = self.handle_pdu(unit, pdu)
+        if response is None:
+            return None
+        fault = self._pick_fault()
+        if fault == "timeout":
+            return None
+        if fault == "truncate":
+            return response[:max(1, len(response) // 2)]
+        return response
+
+    def stats(self):
+        """统计信息"""
+        return {"requests": self.requests, "exceptions": self.exceptions, "faults_injected": self.faults_injected}
+
+
+def load_images(path):
+    """从JSON文件加载映像配置：{"从站地址": {...SlaveImage.from_dict格式...}}"""
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return {int(slave): SlaveImage.from_dict(image) for slave, image in config.items()}
+
+
+class PtySlaveServer:
+    """在pty虚拟串口对上运行模拟器，主站打开port_name即可（仅Linux/macOS）"""
+
+    def __init__(self, simulator, baudrate=115200):
+        import tty
+        self.simulator = simulator
+        self.baudrate = baudrate
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.master_fd)
+        tty.setraw(self.slave_fd)
+        self.port_name = os.ttyname(self.slave_fd)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="modbus-sim-pty", daemon=True)
+
+    def start(self):
+        """启动服务线程"""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        """读取请求、解码、应答"""
+        import select
+        decoder = RtuFrameDecoder(self.baudrate, mode="request")
+        fd = self.master_fd
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([fd], [], [], 0.05)
+            if not readable:
+                decoder.flush()
+                continue
+            try:
+                data = os.read(fd, 4096)
+            except OSError:
+                break
+            for frame in decoder.feed(data, time.perf_counter_ns()):
+                response = self.simulator.handle_rtu(frame.data)
+                if response is None:
+                    continue
+                delay = self.simulator.response_delay()
+                if delay:
+                    time.sleep(delay)
+                os.write(fd, response)
+
+    def stop(self):
+        """停止服务并关闭pty"""
+        self._stop_event.set()
+        self._thread.join(1.0)
+        os.close(self.master_fd)
+        os.close(self.slave_fd)
+
+
+class _TcpHandler(socketserver.BaseRequestHandler):
+    """每个TCP连接一个线程"""
+
+    def handle(self):
+        """处理一个TCP连接，按服务器的帧格式收发"""
+        server = self.server
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if server.framing == "rtu":
+            self._handle_rtu(server.simulator, sock)
+        else:
+            self._handle_mbap(server.simulator, sock)
+
+    def _handle_mbap(self, simulator, sock):
+        """Modbus TCP（MBAP报文头）"""
+        reader = sock.makefile("rb")
+        while True:
+            header = reader.read(MBAP_HEADER.size)
+            if len(header) < MBAP_HEADER.size:
+                return
+            transaction_id, protocol, length, unit = MBAP_HEADER.unpack(header)
+            pdu = reader.read(length - 1)
+            response = simulator.handle_mbap(unit, pdu)
+            if response is None:
+                continue
+            delay = simulator.response_delay()
+            if delay:
+                time.sleep(delay)
+            sock.sendall(build_mbap(transaction_id, unit, response))
+
+    def _handle_rtu(self, simulator, sock):
+        """RTU透传（TCP上直接传RTU帧，主站可用pyserial的socket://URL连接）"""
+        decoder = RtuFrameDecoder(self.server.baudrate, mode="request")
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                return
+            for frame in decoder.feed(data, time.perf_counter_ns()):
+                response = simulator.handle_rtu(frame.data)
+                if response is None:
+                    continue
+                delay = simulator.response_delay()
+                if delay:
+                    time.sleep(delay)
+                sock.sendall(response)
+
+
+class TcpSlaveServer(socketserver.ThreadingTCPServer):
+    """TCP模拟从站，framing为"mbap"（Modbus TCP）或"rtu"（RTU透传）"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, simulator, host="127.0.0.1", port=5020, framing="mbap", baudrate=115200):
+        self.simulator = simulator
+        self.framing = framing
+        self.baudrate = baudrate
+        super().__init__((host, port), _TcpHandler)
+        self.address = self.server_address
+        self._thread = threading.Thread(target=self.serve_forever, name="modbus-sim-tcp", daemon=True)
+
+    def start(self):
+        """启动服务线程"""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus TCP传输模块（MBAP报文头）
+TcpLink是与SerialLink接口相同的同步链路，保持一条长连接，按事务号匹配响应，连接断开时自动重连，
+可以直接用于多串口轮询、扫描和命令行。请求构建和响应解码与RTU共用modbus_frame
+"""
+
+import socket
+import struct
+import time
+
+from modbus_frame import (
+    ModbusResult, ModbusError, ModbusTimeoutError, ModbusFrameError, ModbusExceptionError, ModbusSourceError,
+    READ_FUNCTIONS, decode_read_pdu, check_write_echo,
+)
+from modbus_profile import STAGE_WAIT, STAGE_DECODE
+from modbus_serial import DEFAULT_TIMEOUT
+
+MODBUS_TCP_PORT = 502
+MBAP_HEADER = struct.Struct(">HHHB")  # 事务号、协议号(0)、长度、单元号
+MAX_MBAP_LENGTH = 254  # 长度字段的最大值：单元号 + 最长253字节的PDU
+
+
+def build_mbap(transaction_id, unit, pdu):
+    """给PDU加上MBAP报文头"""
+    return MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, unit) + pdu
+
+
+def check_pdu(pdu, function_code):
+    """检查响应PDU的功能码，异常响应时抛出ModbusExceptionError"""
+    if not pdu:
+        raise ModbusFrameError("响应PDU为空")
+    if pdu[0] == (function_code | 0x80):
+        raise ModbusExceptionError(function_code, pdu[1] if len(pdu) > 1 else 0)
+    if pdu[0] != function_code:
+        raise ModbusFrameError(f"功能码不匹配: 期望{function_code:02d}, 收到{pdu[0]:02d}")
+
+
+def decode_pdu_result(result, pdu):
+    """校验响应PDU并把解码值写入ModbusResult"""
+    request = result.request
+    check_pdu(pdu, request.function_code)
+    if request.function_code in READ_FUNCTIONS:
+        result.values = decode_read_pdu(pdu, request.function_code, request.count)
+    else:
+        check_write_echo(pdu, request.pdu)
+        result.values = []
+    return result
+
+
+class TcpLink:
+    """同步Modbus TCP链路，接口与SerialLink相同（transact/close），一次一个事务"""
+
+    def __init__(self, host, port=MODBUS_TCP_PORT, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self._tid = 0
+        self.stages = None  # StageTimer：性能分析时记录收发和解码耗时
+        self.capture = None  # CaptureChannel：抓包时记录收发的每一帧（含MBAP报文头）
+
+    def _connect(self):
+        """建立连接"""
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _recv_exact(self, size):
+        """读取恰好size字节"""
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("连接已断开")
+            data += chunk
+        return data
+
+    def _exchange(self, request, timeout):
+        """发送请求并读取事务号匹配的响应"""
+        if self.sock is None:
+            self._connect()
+        self.sock.settimeout(timeout)
+        self._tid = (self._tid + 1) & 0xFFFF
+        frame = build_mbap(self._tid, request.slave, request.pdu)
+        self.sock.sendall(frame)
+        capture = self.capture
+        if capture is not None:
+            capture.tx(frame)
+        while True:
+            header = self._recv_exact(MBAP_HEADER.size)
+            transaction_id, protocol, length, unit = MBAP_HEADER.unpack(header)
+            if protocol != 0 or not 2 <= length <= MAX_MBAP_LENGTH:
+                # 报文头无效时无法找到下一帧的边界，断开连接重新同步
+                self.close()
+                raise ModbusFrameError(f"无效的MBAP报文头: 协议号{protocol}, 长度{length}")
+            pdu = self._recv_exact(length - 1)
+            if capture is not None:
+                capture.rx(header + pdu)
+            # 丢弃超时请求迟到的响应
+            if transaction_id == self._tid:
+                return unit, header + pdu, pdu
+
+    def transact(self, request, timeout=None):
+        """执行一次请求/响应事务，返回已解码的ModbusResult"""
+        if timeout is None:
+            timeout = self.timeout
+        start = time.perf_counter()
+        begin_ns = time.perf_counter_ns()
+        result = ModbusResult(request, timestamp=time.time())
+        try:
+            try:
+                unit, result.response, pdu = self._exchange(request, timeout)
+            except (ConnectionError, OSError) as e:
+                if isinstance(e, socket.timeout):
+                    raise
+                # 连接断开时重连一次
+                self.close()
+                unit, result.response, pdu = self._exchange(request, timeout)
+            received_ns = time.perf_counter_ns()
+            if unit != request.slave:
+                raise ModbusSourceError(f"单元号不匹配: 期望{request.slave}, 收到{unit}")
+            decode_pdu_result(result, pdu)
+            if self.stages is not None:
+                # TCP的发送和等待在一次收发中完成，合计记为等待
+                self.stages.add(STAGE_WAIT, received_ns - begin_ns)
+                self.stages.add(STAGE_DECODE, time.perf_counter_ns() - received_ns)
+        except socket.timeout:
+            # 超时可能发生在一帧读到一半时，连接上剩余的字节会错位，下次事务重新连接
+            self.close()
+            result.error = ModbusTimeoutError("响应超时")
+        except (ConnectionError, OSError) as e:
+            self.close()
+            result.error = ModbusError(f"连接{self.host}:{self.port}失败: {e}")
+        except ModbusError as e:
+            result.error = e
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def close(self):
+        """关闭连接"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus自适应超时与重试策略
+按从站统计最近若干次事务的响应时间，超时取高百分位数乘以系数再加余量；
+连续超时的从站判为离线，只按指数退避的探测周期偶尔访问一次，避免少数离线设备占满总线
+"""
+
+import threading
+import time
+from collections import deque
+
+from modbus_frame import ModbusTimeoutError
+from modbus_serial import DEFAULT_TIMEOUT
+
+# 从站状态
+ONLINE = "online"
+SUSPECT = "suspect"   # 最近有超时，但未达到离线阈值
+OFFLINE = "offline"
+
+
+class SlaveTiming:
+    """一个从站的响应时间窗口和当前策略"""
+
+    def __init__(self, slave, window):
+        self.slave = slave
+        self.samples = deque(maxlen=window)
+        self.timeout = None  # None表示样本不足，使用默认超时
+        self.dirty = False
+        self.state = ONLINE
+        self.failures = 0           # 连续超时次数
+        self.probe_interval = 0.0   # 离线后的当前探测间隔
+        self.next_probe = 0.0
+        # 统计
+        self.successes = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.skipped = 0
+
+    def percentile(self, fraction):
+        """响应时间的百分位数（秒）"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class TimeoutPolicy:
+    """
+    按从站自适应的超时/重试策略（线程安全）
+    percentile/factor/margin: 超时 = 响应时间百分位数 * factor + margin，并限制在[min_timeout, max_timeout]
+    offline_after: 连续超时多少次判为离线；probe_interval/max_probe_interval: 离线探测的初始和最大间隔（秒）
+    """
+
+    def __init__(self, default_timeout=DEFAULT_TIMEOUT, min_timeout=0.02, max_timeout=2.0,
+                 percentile=0.99, factor=1.5, margin=0.01, window=200, min_samples=10,
+                 retries=1, offline_after=3, probe_interval=1.0, max_probe_interval=30.0,
+                 adaptive=True, clock=time.perf_counter):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.percentile = percentile
+        self.factor = factor
+        self.margin = margin
+        self.window = window
+        self.min_samples = min_samples
+        self.retries = retries
+        self.offline_after = offline_after
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.adaptive = adaptive
+        self.clock = clock
+        self.slaves = {}
+        self._lock = threading.Lock()
+        self.on_state_change = None  # 回调：on_state_change(slave, old_state, new_state)
+
+    def _timing(self, slave):
+        """取从站的统计对象，不存在时创建"""
+        timing = self.slaves.get(slave)
+        if timing is None:
+            timing = self.slaves[slave] = SlaveTiming(slave, self.window)
+        return timing
+
+    def timeout_for(self, slave):
+        """从站当前的响应超时（秒）"""
+        with self._lock:
+            timing = self._timing(slave)
+            if timing.dirty:
+                timing.dirty = False
+                if self.adaptive and len(timing.samples) >= self.min_samples:
+                    timeout = timing.percentile(self.percentile) * self.factor + self.margin
+                    timing.timeout = min(self.max_timeout, max(self.min_timeout, timeout))
+            if timing.timeout is None or timing.state != ONLINE:
+                # 样本不足或刚出现超时时，用默认超时和学习值中较长的一个，避免把慢响应误判为离线
+                return max(self.default_timeout, timing.timeout or 0.0)
+            return timing.timeout
+
+    def allow(self, slave, now=None):
+        """离线从站只在探测时间到达时才允许访问"""
+        with self._lock:
+            timing = self._timing(slave)
+            if timing.state != OFFLINE:
+                return True
+            if now is None:
+                now = self.clock()
+            if now >= timing.next_probe:
+                return True
+            timing.skipped += 1
+            return False
+
+    def attempts(self, slave):
+        """本次事务最多尝试的次数：在线从站允许重试，离线探测和从未响应过的从站只发一次"""
+        with self._lock:
+            timing = self._timing(slave)
+            if timing.state == OFFLINE or not timing.successes:
+                return 1
+            return 1 + self.retries
+
+    def record(self, result, now=None):
+        """记录一次事务结果，更新响应时间窗口和从站状态"""
+        slave = result.request.slave
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            timing = self._timing(slave)
+            old_state = timing.state
+            if isinstance(result.error, ModbusTimeoutError):
+                timing.timeouts += 1
+                timing.failures += 1
+                if timing.state == OFFLINE:
+                    timing.probe_interval = min(self.max_probe_interval, timing.probe_interval * 2)
+                    timing.next_probe = now + timing.probe_interval
+                elif timing.failures >= self.offline_after or not timing.successes:
+                    # 从未响应过的从站（地址配置错误或未接线）第一次超时即判为离线
+                    timing.state = OFFLINE
+                    timing.probe_interval = self.probe_interval
+                    timing.next_probe = now + timing.probe_interval
+                else:
+                    timing.state = SUSPECT
+            else:
+                # 收到任何响应（包括异常响应和CRC错误）都说明从站在线
+                if result.ok:
+                    timing.successes += 1
+                    timing.samples.append(result.elapsed)
+                    timing.dirty = True
+                timing.failures = 0
+                timing.state = ONLINE
+            new_state = timing.state
+        if new_state != old_state and self.on_state_change:
+            self.on_state_change(slave, old_state, new_state)
+
+    def execute(self, link, request, force=False):
+        """
+        按策略执行一次事务：离线从站未到探测时间时跳过并返回None（force为True时不跳过），
+        超时时按剩余次数重发，返回ModbusResult
+        """
+        slave = request.slave
+        if not force and not self.allow(slave):
+            return None
+        attempts = self.attempts(slave)
+        for attempt in range(attempts):
+            if attempt:
+                with self._lock:
+                    self._timing(slave).retries += 1
+            result = link.transact(request, self.timeout_for(slave))
+            self.record(result)
+            if not isinstance(result.error, ModbusTimeoutError):
+                break
+        return result
+
+    def next_probe_in(self, now=None):
+        """距最早一个离线从站探测的秒数，没有离线从站时返回None"""
+        if now is None:
+            now = self.clock()
+        with self._lock:
+            probes = [timing.next_probe for timing in self.slaves.values() if timing.state == OFFLINE]
+        if not probes:
+            return None
+        return max(0.0, min(probes) - now)
+
+    def snapshot(self):
+        """各从站当前策略和统计"""
+        with self._lock:
+            slaves = sorted(self.slaves.values(), key=lambda timing: timing.slave)
+        policies = []
+        for timing in slaves:
+            timeout = self.timeout_for(timing.slave)
+            with self._lock:
+                policies.append({
+                    "slave": timing.slave,
+                    "state": timing.state,
+                    "timeout_ms": timeout * 1000,
+                    "p50_ms": timing.percentile(0.5) * 1000,
+                    "p99_ms": timing.percentile(0.99) * 1000,
+                    "samples": len(timing.samples),
+                    "successes": timing.successes,
+                    "timeouts": timing.timeouts,
+                    "retries": timing.retries,
+                    "skipped": timing.skipped,
+                    "probe_interval_s": timing.probe_interval if timing.state == OFFLINE else 0.0,
+                })
+        return policies
+
+
+def format_policy(policy):
+    """把snapshot()中的一项格式化为一行文本"""
+    return ("从站{slave}: {state}, 超时 {timeout_ms:.1f}ms, p50 {p50_ms:.1f}ms, p99 {p99_ms:.1f}ms, "
+            "成功 {successes}, 超时 {timeouts}, 重试 {retries}, 离线跳过 {skipped}").format(**policy)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Modbus合并写队列
+同一从站相邻地址的单寄存器写合并为一次功能码16，单线圈写合并为一次功能码15；
+尚未发出的写被同一地址的新值覆盖时只保留最新值；写队列有优先级，由I/O线程与到期的轮询任务按优先级交替执行
+"""
+
+import threading
+
+from modbus_frame import (
+    ModbusRequest,
+    WRITE_SINGLE_COIL, WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_COILS, WRITE_MULTIPLE_REGISTERS,
+    MAX_WRITE_BITS, MAX_WRITE_REGISTERS, check_write_values,
+)
+
+# 写队列默认优先级，比轮询任务的默认优先级(10)高
+DEFAULT_WRITE_PRIORITY = 5
+
+
+class WriteBatch:
+    """合并后的一次写操作"""
+
+    def __init__(self, slave, function_code, address, values, merged):
+        self.slave = slave
+        self.function_code = function_code
+        self.address = address
+        self.values = values
+        self.merged = merged  # 合并了多少个地址的写
+        self.request = ModbusRequest.write(slave, function_code, address, values, tag=self)
+
+    def __repr__(self):
+        return f"WriteBatch(slave={self.slave}, fc={self.function_code:02d}, address={self.address}, count={len(self.values)})"
+
+
+class WriteQueue:
+    """合并写队列（线程安全，界面线程写入，I/O线程取出）"""
+
+    def __init__(self, priority=DEFAULT_WRITE_PRIORITY, max_registers=MAX_WRITE_REGISTERS, max_coils=MAX_WRITE_BITS):
+        self.priority = priority
+        self.max_registers = max_registers
+        self.max_coils = max_coils
+        self._lock = threading.Lock()
+        # (从站, 是否线圈) -> {地址: [值, 是否要求用多写功能码]}，按提交顺序排列
+        self._pending = {}
+        # 统计
+        self.submitted = 0
+        self.superseded = 0
+        self.batches = 0
+
+    def _put(self, slave, coils, address, values, multiple):
+        """加入待写值，同一地址的旧值被覆盖；值超出范围时抛出ValueError，不加入任何值"""
+        check_write_values(WRITE_MULTIPLE_COILS if coils else WRITE_MULTIPLE_REGISTERS, values)
+        with self._lock:
+            table = self._pending.setdefault((slave, coils), {})
+            for offset, value in enumerate(values):
+                entry = table.get(address + offset)
+                if entry is not None:
+                    self.superseded += 1
+                    entry[0] = value
+                    entry[1] = entry[1] or multiple
+                else:
+                    table[address + offset] = [value, multiple]
+            self.submitted += len(values)
+
+    def write_register(self, slave, address, value):
+        """写单个保持寄存器"""
+        self._put(slave, False, address, [value], False)
+
+    def write_registers(self, slave, address, values):
+        """写多个保持寄存器（即使只剩一个也用功能码16发送）"""
+        self._put(slave, False, address, list(values), True)
+
+    def write_coil(self, slave, address, value):
+        """写单个线圈"""
+        self._put(slave, True, address, [value], False)
+
+    def write_coils(self, slave, address, values):
+        """写多个线圈（即使只剩一个也用功能码15发送）"""
+        self._put(slave, True, address, list(values), True)
+
+    def write(self, slave, function_code, address, values):
+        """按功能码加入写操作"""
+        if function_code == WRITE_SINGLE_REGISTER:
+            self.write_register(slave, address, values[0])
+        elif function_code == WRITE_MULTIPLE_REGISTERS:
+            self.write_registers(slave, address, values)
+        elif function_code == WRITE_SINGLE_COIL:
+            self.write_coil(slave, address, values[0])
+        elif function_code == WRITE_MULTIPLE_COILS:
+            self.write_coils(slave, address, values)
+        else:
+            raise ValueError(f"不是写功能码: {function_code:02d}")
+
+    def pending(self):
+        """待写的地址数"""
+        with self._lock:
+            return sum(len(table) for table in self._pending.values())
+
+    def next_batch(self):
+        """
+        取出下一次写：从最早提交的待写地址开始，向前后扩展到连续的待写地址（不超过协议上限），
+        返回WriteBatch，队列为空时返回None
+        """
+        with self._lock:
+            if not self._pending:
+                return None
+            key = next(iter(self._pending))
+            slave, coils = key
+            table = self._pending[key]
+            limit = self.max_coils if coils else self.max_registers
+            first = next(iter(table))
+            start = first
+            while start - 1 in table and first - start + 1 < limit:
+                start -= 1
+            end = first + 1
+            while end in table and end - start < limit:
+                end += 1
+            entries = [table.pop(address) for address in range(start, end)]
+            if not table:
+                del self._pending[key]
+            self.batches += 1
+        values = [entry[0] for entry in entries]
+        multiple = len(entries) > 1 or entries[0][1]
+        if coils:
+            function_code = WRITE_MULTIPLE_COILS if multiple else WRITE_SINGLE_COIL
+        else:
+            function_code = WRITE_MULTIPLE_REGISTERS if multiple else WRITE_SINGLE_REGISTER
+        return WriteBatch(slave, function_code, start, values, len(entries))
+
+    def clear(self):
+        """丢弃全部待写值"""
+        with self._lock:
+            self._pending = {}
+
+    def stats(self):
+        """统计信息"""
+        return {"submitted": self.submitted, "superseded": self.superseded, "batches": self.batches,
+                "pending": self.pending()}
+
+
+def flush_writes(link, write_queue, policy=None):
+    """在当前线程中把写队列全部发出，返回ModbusResult列表"""
+    results = []
+    while True:
+        batch = write_queue.next_batch()
+        if batch is None:
+            return results
+        if policy is None:
+            results.append(link.transact(batch.request))
+        else:
+            results.append(policy.execute(link, batch.request, force=True))
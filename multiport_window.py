@@ -0,0 +1,226 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+import queue
+import time
+import serial.tools.list_ports
+from modbus_frame import READ_FUNCTIONS
+from modbus_multiport import MultiPortPoller
+from modbus_scheduler import PollTask
+
+
+class PortRow:
+    """一个串口在汇总表中的统计"""
+    def __init__(self):
+        self.requests = 0
+        self.ok = 0
+        self.total_elapsed = 0.0
+        self.last_values = ""
+        self.last_error = ""
+
+
+class MultiPortWindow:
+    """多串口轮询窗口：选中的每个串口由独立线程按主界面的Modbus设置并行轮询，结果汇总显示"""
+
+    REFRESH_INTERVAL = 200  # 汇总表刷新间隔（ms）
+
+    def __init__(self, parent, app):
+        self.parent = parent
+        self.app = app  # 主界面，读取串口参数和Modbus设置
+        self.window = tk.Toplevel(parent)
+        self.window.title("多串口轮询")
+        self.window.geometry("800x500")
+        self.window.minsize(600, 400)
+
+        self.poller = None
+        self.rows = {}
+        self.started = 0.0
+        self.refresh_timer = None
+
+        self.create_interface()
+        self.refresh_ports()
+
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def create_interface(self):
+        """创建界面"""
+        self.status_var = tk.StringVar(value="选择串口后点击开始，使用主界面的串口参数和Modbus设置")
+
+        main_frame = ttk.Frame(self.window, padding="5")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+        main_frame.rowconfigure(0, weight=1)
+
+        # 左侧：串口选择
+        port_frame = ttk.LabelFrame(main_frame, text="串口", padding="5")
+        port_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 5))
+        port_frame.rowconfigure(0, weight=1)
+
+        self.port_listbox = tk.Listbox(port_frame, selectmode=tk.MULTIPLE, width=18, exportselection=False)
+        self.port_listbox.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        self.custom_port_var = tk.StringVar()
+        ttk.Entry(port_frame, textvariable=self.custom_port_var, width=14).grid(row=1, column=0, pady=(5, 0))
+        ttk.Button(port_frame, text="添加", command=self.add_custom_port, width=5).grid(row=1, column=1, pady=(5, 0))
+        ttk.Button(port_frame, text="刷新", command=self.refresh_ports).grid(row=2, column=0, columnspan=2,
+                                                                       sticky=(tk.W, tk.E), pady=(5, 0))
+        self.start_button = ttk.Button(port_frame, text="开始", command=self.toggle_polling, style="Accent.TButton")
+        self.start_button.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+
+        # 右侧：汇总表
+        table_frame = ttk.LabelFrame(main_frame, text="轮询结果", padding="5")
+        table_frame.grid(row=0, column=1, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+
+        columns = ("port", "requests", "ok", "failed", "rate", "latency", "last")
+        self.tree = ttk.Treeview(table_frame, columns=columns, show="headings")
+        for column, text, width in (("port", "串口", 100), ("requests", "请求", 60), ("ok", "成功", 60),
+                                    ("failed", "失败", 60), ("rate", "次/秒", 60), ("latency", "平均延迟ms", 80),
+                                    ("last", "最新数据", 220)):
+            self.tree.heading(column, text=text)
+            self.tree.column(column, width=width, anchor=tk.W if column in ("port", "last") else tk.E)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+
+    def refresh_ports(self):
+        """刷新可用串口列表"""
+        selected = set(self.selected_ports())
+        try:
+            ports = [port.device for port in serial.tools.list_ports.comports()]
+        except Exception:
+            ports = []
+        for port in selected:
+            if port not in ports:
+                ports.append(port)
+        self.port_listbox.delete(0, tk.END)
+        for index, port in enumerate(ports):
+            self.port_listbox.insert(tk.END, port)
+            if port in selected:
+                self.port_listbox.selection_set(index)
+
+    def add_custom_port(self):
+        """添加手动输入的串口名或pyserial URL"""
+        port = self.custom_port_var.get().strip()
+        if port and port not in self.port_listbox.get(0, tk.END):
+            self.port_listbox.insert(tk.END, port)
+            self.port_listbox.selection_set(tk.END)
+        self.custom_port_var.set("")
+
+    def selected_ports(self):
+        """当前选中的串口"""
+        return [self.port_listbox.get(index) for index in self.port_listbox.curselection()]
+
+    def toggle_polling(self):
+        """开始/停止切换"""
+        if self.poller is None:
+            self.start_polling()
+        else:
+            self.stop_polling()
+
+    def start_polling(self):
+        """打开选中的串口并开始并行轮询"""
+        ports = self.selected_ports()
+        if not ports:
+            messagebox.showwarning("警告", "请至少选择一个串口", parent=self.window)
+            return
+        app = self.app
+        if app.serial_status and app.com_port_var.get() in ports:
+            messagebox.showwarning("警告", f"串口 {app.com_port_var.get()} 已在主界面打开，请先关闭", parent=self.window)
+            return
+        try:
+            function_code, slave_addr, reg_addr, reg_count = app.get_modbus_settings()
+            scan_rate = int(app.scan_rate_var.get())
+        except ValueError as e:
+            messagebox.showerror("错误", f"参数错误: {str(e)}", parent=self.window)
+            return
+        if function_code not in READ_FUNCTIONS:
+            messagebox.showwarning("警告", "多串口轮询只支持读功能码", parent=self.window)
+            return
+
+        self.poller = MultiPortPoller(metrics=app.bus_metrics)
+        try:
+            for port in ports:
+                self.poller.add_port(port, int(app.baud_rate_var.get()), app.data_bits_var.get(),
+                                     app.parity_var.get(), app.stop_bits_var.get())
+                self.poller.add_task(port, PollTask(slave_addr, function_code, reg_addr, reg_count, scan_rate / 1000.0))
+        except Exception as e:
+            self.poller.stop()
+            self.poller = None
+            messagebox.showerror("错误", f"打开串口失败: {str(e)}", parent=self.window)
+            return
+
+        self.rows = {port: PortRow() for port in ports}
+        self.tree.delete(*self.tree.get_children())
+        for port in ports:
+            self.tree.insert("", tk.END, iid=port, values=(port, 0, 0, 0, "0.0", "", ""))
+        self.started = time.perf_counter()
+        # 各串口收发的帧写入主界面的抓包文件
+        app.add_capture_listener(self.poller.set_capture)
+        self.poller.start()
+        self.start_button.config(text="停止", style="TButton")
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh_results)
+
+    def stop_polling(self):
+        """停止轮询并关闭串口"""
+        if self.refresh_timer is not None:
+            self.window.after_cancel(self.refresh_timer)
+            self.refresh_timer = None
+        if self.poller is not None:
+            self.app.remove_capture_listener(self.poller.set_capture)
+            self.poller.stop()
+            self.drain_results()
+            self.update_table()
+            self.poller = None
+        self.start_button.config(text="开始", style="Accent.TButton")
+
+    def drain_results(self):
+        """取出汇总队列中的全部结果，累计到各串口统计"""
+        results = self.poller.results
+        history = self.app.history
+        while True:
+            try:
+                result = results.get_nowait()
+            except queue.Empty:
+                break
+            row = self.rows.get(result.port)
+            if row is None:
+                continue
+            row.requests += 1
+            if history is not None:
+                history.append_result(result)
+            if result.ok:
+                row.ok += 1
+                row.total_elapsed += result.elapsed
+                row.last_values = " ".join(str(v) for v in result.values)
+            else:
+                row.last_error = str(result.error)
+
+    def update_table(self):
+        """按累计统计刷新汇总表和状态栏"""
+        elapsed = max(time.perf_counter() - self.started, 1e-6)
+        total = 0
+        for port, row in self.rows.items():
+            total += row.requests
+            latency = f"{row.total_elapsed / row.ok * 1000:.1f}" if row.ok else ""
+            self.tree.item(port, values=(port, row.requests, row.ok, row.requests - row.ok,
+                                         f"{row.requests / elapsed:.1f}", latency,
+                                         row.last_values or row.last_error))
+        self.status_var.set(f"串口 {len(self.rows)} 个, 汇总 {total} 次, {total / elapsed:.1f} 次/秒")
+
+    def refresh_results(self):
+        """定时刷新（在界面线程中运行）"""
+        self.drain_results()
+        self.update_table()
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh_results)
+
+    def on_closing(self):
+        """窗口关闭事件"""
+        self.stop_polling()
+        self.window.destroy()
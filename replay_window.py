@@ -0,0 +1,239 @@
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import datetime
+from frame_capture import capture_files, captures_time_range, FILE_SUFFIX
+from frame_replay import ReplayDecoder, ReplayPlayer, SPEED_MAX
+from modbus_parser import ModbusParserWindow
+
+
+class ReplayWindow:
+    """报文回放窗口：把抓包文件中的帧按原始时间、倍速或最快速度送入主界面的解码和显示流程，可暂停和拖动跳转"""
+
+    REFRESH_INTERVAL = 200  # 进度刷新间隔（ms）
+    SCALE_STEPS = 1000      # 进度条刻度数
+    SPEEDS = ["0.1", "0.5", "1", "2", "5", "10", "100", "最快"]
+
+    def __init__(self, parent, app):
+        self.parent = parent
+        self.app = app  # 主界面：Modbus结果放入serial_results，CAN报文放入can_frames，由界面更新泵显示
+        self.window = tk.Toplevel(parent)
+        self.window.title("报文回放")
+        self.window.geometry("640x260")
+        self.window.minsize(520, 220)
+
+        self.paths = []
+        self.player = None
+        self.decoder = None
+        self.first = self.last = None
+        self.start_position = None  # 没有正在回放时，下次播放的起点（纳秒）
+        self.dragging = False
+        self.refresh_timer = None
+
+        self.create_interface()
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+
+    def create_interface(self):
+        """创建界面"""
+        self.file_var = tk.StringVar(value="未选择抓包文件")
+        self.speed_var = tk.StringVar(value="1")
+        self.position_var = tk.StringVar(value="--")
+        self.status_var = tk.StringVar(value="选择抓包文件后点击播放，结果显示在主界面")
+
+        main_frame = ttk.Frame(self.window, padding="5")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+
+        # 文件
+        ttk.Button(main_frame, text="打开文件", command=self.choose_files).grid(row=0, column=0, sticky=tk.W)
+        ttk.Label(main_frame, textvariable=self.file_var).grid(row=0, column=1, sticky=tk.W, padx=5)
+        ttk.Button(main_frame, text="打开目录", command=self.choose_directory).grid(row=0, column=2, sticky=tk.E)
+
+        # 播放控制
+        control_frame = ttk.Frame(main_frame)
+        control_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        ttk.Label(control_frame, text="倍速:").grid(row=0, column=0)
+        speed_combo = ttk.Combobox(control_frame, textvariable=self.speed_var, values=self.SPEEDS, width=6)
+        speed_combo.grid(row=0, column=1, padx=(0, 10))
+        speed_combo.bind("<<ComboboxSelected>>", self.on_speed_change)
+        speed_combo.bind("<Return>", self.on_speed_change)
+        self.play_button = ttk.Button(control_frame, text="播放", command=self.toggle_play, style="Accent.TButton")
+        self.play_button.grid(row=0, column=2, padx=(0, 5))
+        ttk.Button(control_frame, text="停止", command=self.stop).grid(row=0, column=3, padx=(0, 15))
+        ttk.Button(control_frame, text="解析请求", command=lambda: self.open_parser(False)).grid(row=0, column=4)
+        ttk.Button(control_frame, text="解析响应", command=lambda: self.open_parser(True)).grid(row=0, column=5)
+
+        # 进度（拖动跳转）
+        self.scale = ttk.Scale(main_frame, from_=0, to=self.SCALE_STEPS, orient=tk.HORIZONTAL)
+        self.scale.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+        self.scale.bind("<ButtonPress-1>", self.on_drag_start)
+        self.scale.bind("<ButtonRelease-1>", self.on_drag_end)
+        ttk.Label(main_frame, textvariable=self.position_var).grid(row=3, column=0, columnspan=3, sticky=tk.W)
+
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
+
+    def choose_files(self):
+        """选择抓包文件"""
+        paths = filedialog.askopenfilenames(parent=self.window, title="选择抓包文件",
+                                            filetypes=[("抓包文件", "*" + FILE_SUFFIX), ("所有文件", "*.*")])
+        if paths:
+            self.load(list(paths))
+
+    def choose_directory(self):
+        """选择抓包目录（读取其中全部抓包文件）"""
+        path = filedialog.askdirectory(parent=self.window, title="选择抓包目录")
+        if path:
+            self.load([path])
+
+    def load(self, paths):
+        """载入抓包文件，读取时间范围"""
+        self.stop()
+        files = capture_files(paths)
+        if not files:
+            messagebox.showwarning("警告", "没有找到抓包文件", parent=self.window)
+            return
+        try:
+            first, last = captures_time_range(files)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("错误", f"读取抓包文件失败: {str(e)}", parent=self.window)
+            return
+        if first is None:
+            messagebox.showwarning("警告", "抓包文件中没有报文", parent=self.window)
+            return
+        self.first, self.last = first, last
+        self.paths = files
+        self.start_position = None
+        self.file_var.set(f"{len(files)} 个文件" if len(files) > 1 else files[0])
+        self.scale.set(0)
+        self.update_position(self.first)
+        self.status_var.set("就绪")
+
+    def speed(self):
+        """当前倍速，"最快"为SPEED_MAX"""
+        text = self.speed_var.get().strip()
+        if text == "最快":
+            return SPEED_MAX
+        speed = float(text)
+        if speed <= 0:
+            raise ValueError("倍速应大于0")
+        return speed
+
+    def toggle_play(self):
+        """播放/暂停"""
+        player = self.player
+        if player is not None and not player.finished:
+            if player.paused:
+                player.resume()
+                self.play_button.config(text="暂停")
+            else:
+                player.pause()
+                self.play_button.config(text="播放")
+            return
+        if not self.paths:
+            messagebox.showwarning("警告", "请先选择抓包文件", parent=self.window)
+            return
+        try:
+            speed = self.speed()
+        except ValueError as e:
+            messagebox.showerror("错误", f"倍速设置无效: {str(e)}", parent=self.window)
+            return
+        app = self.app
+        self.decoder = ReplayDecoder(app.serial_results.put, app.can_frames.put)
+        self.player = ReplayPlayer(self.paths, self.decoder, speed, start=self.start_position).start()
+        self.start_position = None
+        self.play_button.config(text="暂停")
+        if self.refresh_timer is None:
+            self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def stop(self):
+        """停止回放，下次从头播放"""
+        if self.player is not None:
+            self.player.stop()
+            self.player = None
+        self.start_position = None
+        self.play_button.config(text="播放")
+
+    def on_speed_change(self, event=None):
+        """修改回放倍速"""
+        if self.player is None:
+            return
+        try:
+            self.player.set_speed(self.speed())
+        except ValueError as e:
+            messagebox.showerror("错误", f"倍速设置无效: {str(e)}", parent=self.window)
+
+    def on_drag_start(self, event):
+        """开始拖动进度条，暂停进度刷新"""
+        self.dragging = True
+
+    def on_drag_end(self, event):
+        """松开进度条时跳转"""
+        self.dragging = False
+        if self.first is None:
+            return
+        timestamp = self.first + int((self.last - self.first) * float(self.scale.get()) / self.SCALE_STEPS)
+        player = self.player
+        if player is not None and not player.finished:
+            player.seek(timestamp)
+        else:
+            self.start_position = timestamp
+        self.update_position(timestamp)
+
+    def update_position(self, timestamp):
+        """显示录制时间位置"""
+        if timestamp is None:
+            self.position_var.set("--")
+            return
+        seconds, nanoseconds = divmod(timestamp, 1_000_000_000)
+        text = datetime.datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S") + f".{nanoseconds // 1000:06d}"
+        if self.first is not None:
+            text += f"  ({(timestamp - self.first) / 1e9:.3f}s / {(self.last - self.first) / 1e9:.3f}s)"
+        self.position_var.set(text)
+
+    def refresh(self):
+        """刷新进度和统计（在界面线程中运行）"""
+        self.refresh_timer = None
+        player = self.player
+        if player is None:
+            return
+        position = player.position
+        if position is not None and not self.dragging:
+            self.update_position(position)
+            if self.last is not None and self.last > self.first:
+                self.scale.set((position - self.first) * self.SCALE_STEPS / (self.last - self.first))
+        decoder = self.decoder
+        self.status_var.set(f"回放 {player.records} 帧, 事务 {decoder.results} 个, 未配对响应 {decoder.unmatched}, "
+                            f"{player.rate():.0f} 帧/秒")
+        if player.finished:
+            self.play_button.config(text="播放")
+            self.status_var.set(self.status_var.get() + " - 回放结束")
+            return
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def open_parser(self, response):
+        """在解析对码窗口中解析最近回放的一帧RTU请求或响应"""
+        frame = None
+        if self.decoder is not None:
+            frame = self.decoder.last_response if response else self.decoder.last_request
+        if frame is None:
+            messagebox.showinfo("提示", "还没有回放过Modbus RTU报文", parent=self.window)
+            return
+        if self.player is not None and not self.player.paused and not self.player.finished:
+            # 暂停后再查看，避免报文被后续帧覆盖
+            self.toggle_play()
+        start_address = None
+        request = self.decoder.last_request
+        if response and request is not None and len(request) >= 8:
+            # 响应中的点位按对应请求的起始地址查找注释
+            start_address = int.from_bytes(request[2:4], "big")
+        ModbusParserWindow(self.parent).load_frame(bytes(frame), response, start_address)
+
+    def on_closing(self):
+        """窗口关闭事件"""
+        if self.refresh_timer is not None:
+            self.window.after_cancel(self.refresh_timer)
+            self.refresh_timer = None
+        self.stop()
+        self.window.destroy()
@@ -0,0 +1,966 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+工控测试软件命令行入口（无界面，不导入tkinter）
+用法示例：
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --baud 115200 --slave 1 --fc 03 --addr 0 --count 10 --rate 20
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --task 1:03:0:10:100 --task 2:04:100:4:1000:20
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --port /dev/ttyUSB1 --task /dev/ttyUSB1@3:04:0:2:500
+    python -m testmodbuscharge discover --port /dev/ttyUSB0 --port /dev/ttyUSB1 --baud 115200
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --capture captures
+    python -m testmodbuscharge dump captures --from 2026-10-18T08:00:00 --to 2026-10-18T08:05:00
+    python -m testmodbuscharge export captures -o bus.pcapng
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --pcapng live.pcapng
+    python -m testmodbuscharge map --port /dev/ttyUSB0 --baud 115200 --slave 1 --fc 03 --first 0 --last 9999
+    python -m testmodbuscharge simulate --pty --tcp 127.0.0.1:5020 --slaves 1-4 --latency 2
+    python -m testmodbuscharge replay captures --speed 10
+    python -m testmodbuscharge replay captures --pty
+    python -m testmodbuscharge poll --port /dev/ttyUSB0 --task 1:03:0:10:1000 --store history.db --store-retention 30
+    python -m testmodbuscharge trend history.db --series /dev/ttyUSB0:1:03:5 --from 2026-10-18T00:00:00 --buckets 24
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import queue
+import signal
+import sys
+import time
+
+from frame_capture import (
+    CaptureWriter, read_captures, tee_captures, DIRECTION_NAMES, LINK_NAMES, LINK_MODBUS_RTU,
+    LINK_MODBUS_TCP, DEFAULT_MAX_FILE_SIZE, DEFAULT_MAX_FILES,
+)
+from frame_pcapng import PcapngLiveWriter, export_pcapng, ENCAP_USER, ENCAP_TCP, RTU_OVER_TCP_PORT
+from frame_replay import ReplayDecoder, ReplayPlayer, RecordedResponder
+from gbt27930 import message_name, format_hex
+from modbus_frame import parse_function_code
+from modbus_history import (
+    TimeSeriesStore, parse_series_key, format_series_key, DEFAULT_MIN_INTERVAL, DEFAULT_RETENTION_DAYS,
+)
+from modbus_planner import plan_reads, points_from_annotations
+from modbus_rtu_decoder import RtuFrameDecoder
+from modbus_counters import TransactionCounters, format_counters
+from modbus_discovery import DiscoveryRun, DEFAULT_PASSES, PROBE_FUNCTIONS, FIRST_ADDRESS, LAST_ADDRESS, probe_timeout
+from modbus_image import ImageCache
+from modbus_metrics import BusMetrics, MetricsExporter, FORMAT_PROMETHEUS, FORMAT_JSON
+from modbus_multiport import MultiPortPoller
+from modbus_regmap import (
+    RegisterMapper, RegisterMapError, save_annotations, DEFAULT_FIRST, DEFAULT_LAST, DEFAULT_STRIDE, DEFAULT_RETRIES,
+)
+from modbus_profile import ScanProfiler, STAGE_RENDER, format_breakdown, compare_breakdowns, load_breakdown
+from modbus_scheduler import PollTask
+from modbus_serial import SerialLink, open_port, DEFAULT_TIMEOUT
+from modbus_simulator import (
+    ModbusSlaveSimulator, SlaveImage, FaultConfig, PtySlaveServer, TcpSlaveServer, load_images,
+)
+from modbus_tcp import TcpLink, MODBUS_TCP_PORT
+from modbus_timeout import TimeoutPolicy, format_policy
+from modbus_write_queue import WriteQueue, flush_writes
+
+
+def int_auto(text):
+    """解析整数参数，支持十进制和0x前缀的十六进制"""
+    return int(text, 0)
+
+
+def parse_task(text):
+    """解析轮询任务参数 [串口@]从站:功能码:地址:数量:周期ms[:优先级]，返回(串口或None, 任务)"""
+    port, _, spec = text.rpartition("@")
+    parts = spec.split(":")
+    if len(parts) not in (5, 6):
+        raise argparse.ArgumentTypeError("任务格式应为 [串口@]从站:功能码:地址:数量:周期ms[:优先级]")
+    try:
+        slave, address, count = int_auto(parts[0]), int_auto(parts[2]), int_auto(parts[3])
+        function_code = parse_function_code(parts[1])
+        period = float(parts[4]) / 1000.0
+        priority = int(parts[5]) if len(parts) == 6 else 10
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"任务参数错误: {text} ({e})")
+    return port or None, PollTask(slave, function_code, address, count, period, priority)
+
+
+def parse_point(text):
+    """解析点位参数 从站:功能码:地址"""
+    parts = text.split(":")
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("点位格式应为 从站:功能码:地址")
+    try:
+        return int_auto(parts[0]), parse_function_code(parts[1]), int_auto(parts[2])
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"点位参数错误: {text} ({e})")
+
+
+def parse_series(text):
+    """解析历史数据点位参数 串口:从站:数据表或功能码:地址"""
+    try:
+        return parse_series_key(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def load_points(args):
+    """汇总--point和--annotations指定的点位"""
+    points = list(args.point or [])
+    if args.annotations:
+        with open(args.annotations, "r", encoding="utf-8") as f:
+            points.extend(points_from_annotations(json.load(f), args.slave))
+    return points
+
+
+class PollStats:
+    """轮询统计：请求数、成功数、延迟分布"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.ok = 0
+        self.errors = {}
+        self.latencies = []
+
+    def record(self, result):
+        """记录一次事务结果"""
+        self.requests += 1
+        if result.ok:
+            self.ok += 1
+            self.latencies.append(result.elapsed)
+        else:
+            status = result.status
+            self.errors[status] = self.errors.get(status, 0) + 1
+
+    def percentile(self, fraction):
+        """成功事务延迟的百分位数（秒）"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def summary(self):
+        """生成统计摘要文本"""
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            f"请求: {self.requests}, 成功: {self.ok}, 失败: {self.requests - self.ok}, 用时: {elapsed:.2f}s",
+            f"吞吐: {self.requests / elapsed if elapsed else 0.0:.1f} 次/秒",
+        ]
+        if self.latencies:
+            lines.append(
+                f"延迟(ms): min {min(self.latencies) * 1000:.2f}, "
+                f"avg {sum(self.latencies) / len(self.latencies) * 1000:.2f}, "
+                f"p50 {self.percentile(0.50) * 1000:.2f}, p95 {self.percentile(0.95) * 1000:.2f}, "
+                f"p99 {self.percentile(0.99) * 1000:.2f}, max {max(self.latencies) * 1000:.2f}"
+            )
+        for name, count in sorted(self.errors.items()):
+            lines.append(f"  {name}: {count}")
+        return "\n".join(lines)
+
+
+class ResultWriter:
+    """把事务结果按JSON行或CSV格式写到输出流"""
+
+    CSV_FIELDS = ["timestamp", "port", "slave", "function_code", "address", "count", "latency_ms", "status", "values"]
+
+    def __init__(self, stream, fmt="jsonl"):
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.writer(stream)
+            self.csv.writerow(self.CSV_FIELDS)
+
+    def write(self, result):
+        """写出一条结果"""
+        request = result.request
+        status = "ok" if result.ok else str(result.error)
+        block = getattr(request.tag, "block", None)
+        if self.fmt == "csv":
+            self.csv.writerow([
+                f"{result.timestamp:.6f}", result.port, request.slave, request.function_code, request.address,
+                request.count, f"{result.elapsed * 1000:.3f}", status,
+                " ".join(str(v) for v in result.values or ()),
+            ])
+        else:
+            self.stream.write(json.dumps({
+                "timestamp": round(result.timestamp, 6),
+                "port": result.port,
+                "slave": request.slave,
+                "function_code": request.function_code,
+                "address": request.address,
+                "count": request.count,
+                "latency_ms": round(result.elapsed * 1000, 3),
+                "status": status,
+                "values": result.values,
+                "points": {
+                    f"{slave}:{function_code:02d}:{address}": value
+                    for (slave, function_code, address), value in block.split(result.values).items()
+                } if block is not None and result.ok else None,
+            }, ensure_ascii=False) + "\n")
+
+
+def open_link(args, port, capture=None):
+    """打开链路：mbtcp://host[:port]为Modbus TCP，其余为串口设备名或pyserial URL；capture为CaptureWriter时抓包"""
+    if port.startswith("mbtcp://"):
+        host, _, tcp_port = port[len("mbtcp://"):].partition(":")
+        link = TcpLink(host, int(tcp_port) if tcp_port else MODBUS_TCP_PORT, timeout=args.timeout)
+        link_type = LINK_MODBUS_TCP
+    else:
+        ser = open_port(port, args.baud, args.bytesize, args.parity, args.stopbits)
+        link = SerialLink(ser, timeout=args.timeout)
+        link_type = LINK_MODBUS_RTU
+    if capture is not None:
+        link.capture = capture.channel(port, link_type)
+    return link
+
+
+def open_capture(args):
+    """按--capture/--pcapng参数创建抓包写入器列表"""
+    writers = []
+    if args.capture:
+        writers.append(CaptureWriter(args.capture, max_file_size=int(args.capture_max_size * 1024 * 1024),
+                                     max_files=args.capture_max_files))
+    if args.pcapng:
+        writers.append(PcapngLiveWriter(args.pcapng, args.rtu_encapsulation, args.rtu_port))
+    return writers
+
+
+def close_capture(writers):
+    """关闭抓包写入器并输出统计"""
+    for writer in writers:
+        writer.close()
+        stats = writer.stats()
+        print(f"抓包: {stats['records']} 帧, 写入 {stats['bytes']} 字节, 丢弃 {stats['dropped']} 帧, 文件 {stats['path']}",
+              file=sys.stderr)
+        if stats.get("error") is not None:
+            print(f"抓包写出已停止: {stats['error']}", file=sys.stderr)
+
+
+def cmd_poll(args):
+    """poll子命令：按调度表轮询一个或多个串口上的一个或多个从站"""
+    ports = list(dict.fromkeys(args.port))
+    period = 1.0 / args.rate if args.rate > 0 else 0.0
+    points = load_points(args)
+    if args.task:
+        tasks = args.task
+    elif points:
+        # 分散的点位先合并成最少的读请求，每个请求作为一个轮询任务
+        tasks = [(None, PollTask.from_block(block, period)) for block in plan_reads(points, args.baud, args.max_gap)]
+    else:
+        tasks = [(None, PollTask(args.slave, parse_function_code(args.fc), args.addr, args.count, period))]
+    for port, task in tasks:
+        if port is not None and port not in ports:
+            print(f"任务 {task.name} 指定的串口 {port} 不在 --port 中", file=sys.stderr)
+            return 2
+
+    # 每个串口一个I/O线程，结果汇总到同一个队列
+    metrics = BusMetrics()
+    poller = MultiPortPoller(metrics=metrics, policy_options={
+        "default_timeout": args.timeout,
+        "retries": args.retries,
+        "offline_after": args.offline_after,
+        "max_probe_interval": args.max_probe_interval,
+        "adaptive": not args.fixed_timeout,
+    })
+    captures = open_capture(args)
+    capture = tee_captures(captures)
+    try:
+        for port in ports:
+            poller.add_link(port, open_link(args, port, capture))
+    except Exception:
+        poller.stop()
+        close_capture(captures)
+        raise
+    for port, task in tasks:
+        # 未指定串口的任务在每个串口上各执行一份
+        for index, name in enumerate([port] if port else ports):
+            poller.add_task(name, task if index == 0 else task.copy())
+    writer = ResultWriter(sys.stdout, args.format)
+    store = None
+    if args.store:
+        store = TimeSeriesStore(args.store, min_interval=args.store_interval, retention_days=args.store_retention)
+    stats = PollStats()
+    port_stats = {port: PollStats() for port in ports}
+    image = ImageCache()
+    counters = TransactionCounters()
+    deadline = time.perf_counter() + args.duration if args.duration > 0 else None
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    def handle_result(result):
+        stats.record(result)
+        port_stats[result.port].record(result)
+        counters.record(result)
+        changes = image.apply(result)
+        if store is not None:
+            store.append_result(result)
+        if not args.changes_only or changes or not result.ok:
+            writer.write(result)
+
+    def should_stop():
+        if stopping or (args.cycles and stats.requests >= args.cycles):
+            return True
+        return deadline is not None and time.perf_counter() >= deadline
+
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(metrics, args.metrics_file, args.metrics_interval, args.metrics_format)
+        exporter.start()
+    profiler = None
+    if args.profile:
+        profiler = ScanProfiler(args.profile, args.profile_output)
+        poller.set_profiler(profiler)
+        profiler.attach()
+    poller.start()
+    try:
+        while not should_stop():
+            try:
+                result = poller.results.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if profiler is None:
+                handle_result(result)
+                continue
+            with profiler.stages.span(STAGE_RENDER):
+                handle_result(result)
+            if profiler.cycle_done():
+                save_profile(profiler, args.profile_baseline)
+                profiler = None
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if profiler is not None:
+            # 周期数未达到就结束时保存已完成的部分（I/O线程要在停止前停止各自的Profile）
+            save_profile(profiler, args.profile_baseline)
+        poller.stop()
+        close_capture(captures)
+        if exporter is not None:
+            exporter.stop()
+        if store is not None:
+            store.close()
+            print("历史数据: {samples} 个采样（间隔过短跳过 {skipped} 个）, {series} 个点位, 数据库 {bytes} 字节, "
+                  "文件 {path}".format(**store.stats()), file=sys.stderr)
+        sys.stdout.flush()
+        print(stats.summary(), file=sys.stderr)
+        for row in counters.table():
+            print("  " + format_counters(row), file=sys.stderr)
+        bus = {entry["port"]: entry for entry in metrics.snapshot()["ports"]}
+        for channel_stats in poller.stats():
+            port = channel_stats["port"]
+            if len(ports) > 1:
+                print(f"串口 {port}: " + port_stats[port].summary().splitlines()[1], file=sys.stderr)
+            if port in bus:
+                print("  总线占用 {:.1f}%, 发送 {bytes_out} 字节, 接收 {bytes_in} 字节, 调度滞后 p50 {lag_p50_ms:.2f}ms, "
+                      "p99 {lag_p99_ms:.2f}ms".format(bus[port]["utilisation"] * 100, **bus[port]), file=sys.stderr)
+            for task_stats in channel_stats["tasks"]:
+                print("  任务 {name}: 执行 {runs} 次, overrun {overruns} 次, 平均滞后 {avg_lag_ms:.2f}ms, "
+                      "最大滞后 {max_lag_ms:.2f}ms".format(**task_stats), file=sys.stderr)
+            for slave_policy in channel_stats["slaves"]:
+                print("  " + format_policy(slave_policy), file=sys.stderr)
+    return 0 if stats.ok or not stats.requests else 1
+
+
+def save_profile(profiler, baseline=None):
+    """保存性能分析结果，输出分阶段耗时，指定基准时逐阶段比较"""
+    stats_path, stages_path = profiler.save()
+    print(f"性能分析: {stats_path or '无cProfile数据'}, {stages_path}", file=sys.stderr)
+    breakdown = profiler.breakdown()
+    print(format_breakdown(breakdown), file=sys.stderr)
+    if baseline:
+        print(compare_breakdowns(load_breakdown(baseline), breakdown), file=sys.stderr)
+
+
+def cmd_plan(args):
+    """plan子命令：显示点位合并后的读请求"""
+    points = load_points(args)
+    if not points:
+        print("没有点位，请用 --point 或 --annotations 指定", file=sys.stderr)
+        return 1
+    blocks = plan_reads(points, args.baud, args.max_gap)
+    for block in blocks:
+        print(f"从站{block.slave} 功能码{block.function_code:02d} 地址{block.address} 数量{block.count} "
+              f"覆盖点位{len(block.points)}个")
+    print(f"点位 {len(set(points))} 个 -> 请求 {len(blocks)} 个", file=sys.stderr)
+    return 0
+
+
+def cmd_sniff(args):
+    """sniff子命令：监听总线，按t3.5间隔和CRC切分双向报文并输出"""
+    ser = open_port(args.port, args.baud, args.bytesize, args.parity, args.stopbits, timeout=0.01)
+    decoder = RtuFrameDecoder(args.baud, mode=args.mode)
+    captures = open_capture(args)
+    capture = tee_captures(captures)
+    channel = capture.channel(args.port, LINK_MODBUS_RTU) if capture is not None else None
+    try:
+        while True:
+            data = ser.read(max(1, ser.in_waiting))
+            frames = decoder.feed(data, time.perf_counter_ns()) if data else decoder.flush()
+            for frame in frames:
+                if channel is not None:
+                    # 监听时把主站请求记为发送、从站响应记为接收
+                    (channel.tx if frame.kind == "request" else channel.rx)(frame.data)
+                print(json.dumps({
+                    "timestamp_ns": frame.timestamp_ns,
+                    "kind": frame.kind,
+                    "slave": frame.slave,
+                    "function_code": frame.function_code,
+                    "data": frame.data.hex(" ").upper(),
+                }), flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ser.close()
+        close_capture(captures)
+        print("字节: {bytes_in}, 帧: {frames}, 丢弃噪声: {noise_bytes} 字节".format(**decoder.stats()),
+              file=sys.stderr)
+    return 0
+
+
+def parse_time(text):
+    """解析时间参数：ISO格式本地时间（2026-10-18T08:00:00）或Unix时间戳（秒），返回纳秒"""
+    try:
+        return int(float(text) * 1e9)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.datetime.fromisoformat(text).timestamp() * 1e9)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"时间格式应为ISO格式或Unix时间戳: {text}")
+
+
+def format_time_ns(timestamp):
+    """纳秒时间戳显示为本地时间（精确到纳秒）"""
+    seconds, nanoseconds = divmod(timestamp, 1_000_000_000)
+    return datetime.datetime.fromtimestamp(seconds).strftime("%Y-%m-%d %H:%M:%S") + f".{nanoseconds:09d}"
+
+
+def cmd_dump(args):
+    """dump子命令：按时间范围和通道输出抓包文件中的帧"""
+    count = 0
+    try:
+        for reader, record in read_captures(args.files, args.start, args.end):
+            name, link_type = reader.channels.get(record.channel, (f"#{record.channel}", 0))
+            if args.channel and name not in args.channel:
+                continue
+            direction = DIRECTION_NAMES.get(record.direction, str(record.direction))
+            if args.format == "jsonl":
+                print(json.dumps({
+                    "timestamp_ns": record.timestamp,
+                    "channel": name,
+                    "link": LINK_NAMES.get(link_type, link_type),
+                    "direction": direction,
+                    "data": record.data.hex(" ").upper(),
+                }, ensure_ascii=False))
+            else:
+                print(f"{format_time_ns(record.timestamp)} {name} {direction} {record.data.hex(' ').upper()}")
+            count += 1
+            if args.limit and count >= args.limit:
+                break
+    except BrokenPipeError:
+        return 0
+    print(f"共 {count} 帧", file=sys.stderr)
+    return 0
+
+
+def cmd_export(args):
+    """export子命令：把抓包文件转换为pcapng（流式处理）"""
+    count = export_pcapng(args.files, args.output, args.start, args.end, args.channel,
+                          args.rtu_encapsulation, args.rtu_port)
+    print(f"导出 {count} 帧到 {args.output}", file=sys.stderr)
+    return 0
+
+
+def parse_write(text):
+    """解析写入参数 地址=值[,值...]，返回(地址, 值列表)"""
+    address, sep, values = text.partition("=")
+    try:
+        if not sep:
+            raise ValueError("缺少=")
+        return int_auto(address), [int_auto(value) for value in values.split(",")]
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f"写入格式应为 地址=值[,值...]: {text} ({e})")
+
+
+def cmd_write(args):
+    """write子命令：把寄存器/线圈写入合并成最少的写请求后发送（参数批量下载）"""
+    writes = WriteQueue()
+    registers = list(args.register or ())
+    coils = list(args.coil or ())
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        registers.extend((int(address, 0), [int(value)]) for address, value in config.get("holding_registers", {}).items())
+        coils.extend((int(address, 0), [int(value)]) for address, value in config.get("coils", {}).items())
+    try:
+        for address, values in registers:
+            if args.multiple:
+                writes.write_registers(args.slave, address, values)
+            else:
+                # 逐个按单寄存器写加入，由写队列把相邻地址合并为功能码16
+                for offset, value in enumerate(values):
+                    writes.write_register(args.slave, address + offset, value)
+        for address, values in coils:
+            for offset, value in enumerate(values):
+                writes.write_coil(args.slave, address + offset, value)
+    except ValueError as e:
+        print(f"写入值无效，没有发送任何写请求: {e}", file=sys.stderr)
+        return 2
+    if not writes.pending():
+        print("没有写入值，请用 --register、--coil 或 --file 指定", file=sys.stderr)
+        return 1
+    captures = open_capture(args)
+    try:
+        link = open_link(args, args.port, tee_captures(captures))
+    except Exception:
+        close_capture(captures)
+        raise
+    start = time.perf_counter()
+    try:
+        results = flush_writes(link, writes, TimeoutPolicy(args.timeout))
+    finally:
+        link.close()
+        close_capture(captures)
+    elapsed = time.perf_counter() - start
+    failed = 0
+    for result in results:
+        request = result.request
+        if not result.ok:
+            failed += 1
+        print(json.dumps({
+            "port": args.port,
+            "slave": request.slave,
+            "function_code": request.function_code,
+            "address": request.address,
+            "count": request.count,
+            "latency_ms": round(result.elapsed * 1000, 3),
+            "status": "ok" if result.ok else str(result.error),
+        }, ensure_ascii=False))
+    stats = writes.stats()
+    print(f"写入 {stats['submitted']} 个值（覆盖 {stats['superseded']} 个），合并为 {stats['batches']} 次请求，"
+          f"失败 {failed} 次，用时 {elapsed:.2f}s", file=sys.stderr)
+    return 0 if not failed else 1
+
+
+def cmd_discover(args):
+    """discover子命令：扫描各串口上有响应的从站地址，并探测支持的功能码"""
+    links = {}
+    captures = open_capture(args)
+    capture = tee_captures(captures)
+    try:
+        for port in args.port:
+            links[port] = open_link(args, port, capture)
+    except Exception:
+        for link in links.values():
+            link.close()
+        close_capture(captures)
+        raise
+    passes = tuple(float(factor) for factor in args.passes.split(","))
+    addresses = args.slaves or range(FIRST_ADDRESS, LAST_ADDRESS + 1)
+    print(f"扫描 {len(addresses)} 个地址, 串口 {len(links)} 个, 首轮超时 "
+          f"{probe_timeout(getattr(next(iter(links.values())), 'baudrate', None)) * 1000:.1f}ms", file=sys.stderr)
+
+    def on_event(port, event, data):
+        if event == "pass":
+            index, remaining = data
+            print(f"{port}: 第{index + 1}轮完成, 需要重新探测 {remaining} 个", file=sys.stderr)
+        elif event == "functions" or (event == "found" and args.no_functions):
+            print(json.dumps(data.to_dict(), ensure_ascii=False), flush=True)
+        elif event == "error":
+            print(f"{port}: 扫描失败: {data}", file=sys.stderr)
+
+    run = DiscoveryRun(links, addresses, passes, () if args.no_functions else PROBE_FUNCTIONS, on_event,
+                       args.full_reprobe).start()
+    try:
+        while run.running():
+            run.join(0.1)
+    except KeyboardInterrupt:
+        run.stop()
+    finally:
+        run.join()
+        for link in links.values():
+            link.close()
+        close_capture(captures)
+    slaves = run.slaves()
+    for info in slaves:
+        print(f"{info.port}: {info.summary()}", file=sys.stderr)
+    print(f"发现从站 {len(slaves)} 个, 用时 {run.elapsed:.2f}s", file=sys.stderr)
+    return 1 if run.errors else 0
+
+
+def cmd_map(args):
+    """map子命令：用整块读取和二分查找探测一个从站某个功能码的可读地址区间，写入注释文件"""
+    function_code = parse_function_code(args.fc)
+
+    def on_event(event, data):
+        if event == "range":
+            print(json.dumps(dict(slave=args.slave, function_code=function_code, **data.to_dict()), ensure_ascii=False),
+                  flush=True)
+
+    captures = open_capture(args)
+    try:
+        link = open_link(args, args.port, tee_captures(captures))
+    except Exception:
+        close_capture(captures)
+        raise
+    mapper = RegisterMapper(link, args.slave, function_code, args.timeout, args.stride, args.max_count, args.retries,
+                            args.silent_invalid, on_event)
+    try:
+        ranges = mapper.map(args.first, args.last)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+        return 1
+    except RegisterMapError as e:
+        print(f"探测失败: {e}", file=sys.stderr)
+        return 1
+    finally:
+        link.close()
+        close_capture(captures)
+    total = sum(register_range.count for register_range in ranges)
+    print(f"从站{args.slave} 功能码{function_code:02d} 地址{args.first}-{args.last}: 可读区间 {len(ranges)} 个, "
+          f"共 {total} 个地址, 单次读取上限 {mapper.max_count}, 请求 {mapper.requests} 次, 用时 {mapper.elapsed:.2f}s",
+          file=sys.stderr)
+    if args.annotations and ranges:
+        added = save_annotations(args.annotations, ranges, function_code)
+        print(f"注释已写入 {args.annotations}: 新增 {added} 条（已有的注释不覆盖）", file=sys.stderr)
+    return 0
+
+
+def parse_slaves(text):
+    """解析从站地址列表，如 1,2,5-8"""
+    slaves = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        slaves.extend(range(int_auto(first), int_auto(last or first) + 1))
+    return slaves
+
+
+def cmd_simulate(args):
+    """simulate子命令：运行模拟从站，直到Ctrl+C"""
+    if args.image:
+        images = load_images(args.image)
+    else:
+        images = {slave: SlaveImage(pattern=True) for slave in args.slaves}
+    faults = FaultConfig(args.crc_error_rate, args.timeout_rate, args.truncate_rate)
+    simulator = ModbusSlaveSimulator(images, args.latency / 1000, args.jitter / 1000, faults, args.seed)
+    if not serve(simulator, args, f"从站地址: {sorted(images)}"):
+        return 1
+    print("请求: {requests}, 异常响应: {exceptions}, 注入故障: {faults_injected}".format(**simulator.stats()),
+          file=sys.stderr)
+    return 0
+
+
+def serve(simulator, args, banner):
+    """按--pty/--tcp启动模拟从站服务直到Ctrl+C；没有指定服务方式时返回False"""
+    servers = []
+    if args.pty:
+        server = PtySlaveServer(simulator, args.baud).start()
+        servers.append(server)
+        print(f"RTU模拟从站: {server.port_name}", file=sys.stderr)
+    if args.tcp:
+        host, _, port = args.tcp.rpartition(":")
+        server = TcpSlaveServer(simulator, host or "127.0.0.1", int(port), args.framing, args.baud).start()
+        servers.append(server)
+        url = "mbtcp" if args.framing == "mbap" else "socket"
+        print(f"TCP模拟从站: {url}://{server.address[0]}:{server.address[1]}", file=sys.stderr)
+    if not servers:
+        print("请用 --pty 或 --tcp 指定服务方式", file=sys.stderr)
+        return False
+    print(banner, file=sys.stderr, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.stop()
+    return True
+
+
+def cmd_replay(args):
+    """replay子命令：回放抓包文件，解码输出事务结果；指定--pty/--tcp时用录制的响应扮演现场设备"""
+    if args.pty or args.tcp:
+        latency_scale = 1.0 / args.speed if args.speed else 0.0
+        responder = RecordedResponder(args.files, args.channel, latency_scale, args.start, args.end)
+        if not serve(responder, args, f"录制的请求: {len(responder.table)} 种"):
+            return 1
+        print("请求: {requests}, 应答: {answered}, 未录制的请求: {unknown}".format(**responder.stats()),
+              file=sys.stderr)
+        return 0
+
+    writer = ResultWriter(sys.stdout, args.format)
+    counters = TransactionCounters()
+
+    def on_result(result):
+        counters.record(result)
+        writer.write(result)
+
+    def on_can(frame):
+        name = message_name(frame.can_id)
+        print(json.dumps({
+            "timestamp": round(frame.timestamp, 6),
+            "port": frame.channel,
+            "direction": DIRECTION_NAMES.get(frame.direction, frame.direction),
+            "can_id": f"{frame.can_id:08X}",
+            "message": name,
+            "data": format_hex(frame.data),
+        }, ensure_ascii=False))
+
+    decoder = ReplayDecoder(on_result, on_can)
+    player = ReplayPlayer(args.files, decoder, args.speed, args.start, args.end, args.channel)
+    try:
+        player.run()
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        return 0
+    sys.stdout.flush()
+    print(f"回放: {player.records} 帧, 事务 {decoder.results} 个, 未配对响应 {decoder.unmatched}, "
+          f"无法解析 {decoder.skipped}, 用时 {player.elapsed:.2f}s, {player.rate():.0f} 帧/秒", file=sys.stderr)
+    for row in counters.table():
+        print("  " + format_counters(row), file=sys.stderr)
+    return 0
+
+
+def cmd_trend(args):
+    """trend子命令：列出历史数据库中的点位，或按时间范围输出一个点位的原始采样或降采样结果"""
+    if not os.path.exists(args.database):
+        # 打开不存在的路径会新建一个空数据库，查询结果总是"没有数据"
+        print(f"历史数据库不存在: {args.database}", file=sys.stderr)
+        return 2
+    store = TimeSeriesStore(args.database, retention_days=0)
+    try:
+        if args.list or not args.series:
+            for key in store.series_keys():
+                print(format_series_key(key))
+            return 0
+        first, last = store.time_range(args.series)
+        if first is None:
+            print("该点位没有数据", file=sys.stderr)
+            return 1
+        start = args.start / 1e9 if args.start is not None else first
+        end = args.end / 1e9 if args.end is not None else last
+        if args.buckets:
+            for bucket in store.downsample(args.series, start, end, args.buckets):
+                entry = bucket.to_dict()
+                if args.format == "jsonl":
+                    print(json.dumps(entry, ensure_ascii=False))
+                else:
+                    print(f"{format_time_ns(bucket.start * 1_000_000)} 采样 {bucket.count} 最小 {bucket.min} "
+                          f"最大 {bucket.max} 平均 {bucket.average:.2f} 最后 {bucket.last}")
+        else:
+            for timestamp, value in store.query(args.series, start, end):
+                if args.format == "jsonl":
+                    print(json.dumps({"timestamp": timestamp, "value": value}))
+                else:
+                    print(f"{format_time_ns(int(timestamp * 1e9))} {value}")
+    except BrokenPipeError:
+        return 0
+    finally:
+        store.close()
+    return 0
+
+
+def add_point_arguments(parser):
+    """添加点位参数"""
+    parser.add_argument("--point", type=parse_point, action="append",
+                        help="点位 从站:功能码:地址，可重复；多个点位会合并成最少的读请求")
+    parser.add_argument("--annotations", help="从注释文件（modbus_annotations.json）读取点位，从站取--slave")
+    parser.add_argument("--max-gap", type=int, default=None, help="允许跨越的最大地址间隙，默认按波特率估算")
+
+
+def add_capture_arguments(parser):
+    """添加抓包参数"""
+    parser.add_argument("--capture", metavar="DIR", help="把收发的每一帧写入该目录下的抓包文件（dump子命令读取）")
+    parser.add_argument("--capture-max-size", type=float, default=DEFAULT_MAX_FILE_SIZE / 1024 / 1024,
+                        help="单个抓包文件的大小上限（MB），超过后轮转")
+    parser.add_argument("--capture-max-files", type=int, default=DEFAULT_MAX_FILES,
+                        help="抓包目录中保留的文件数（含之前运行留下的），超过后删除最旧的（0为不限）")
+    parser.add_argument("--pcapng", metavar="FILE",
+                        help="同时实时写出pcapng（可用 tail -f 或命名管道交给 wireshark -k -i - 实时查看）")
+    add_pcapng_arguments(parser)
+
+
+def add_pcapng_arguments(parser):
+    """添加pcapng封装参数"""
+    parser.add_argument("--rtu-encapsulation", default=ENCAP_USER, choices=[ENCAP_USER, ENCAP_TCP],
+                        help="Modbus RTU的封装：user为DLT_USER0（147），tcp为RTU over TCP")
+    parser.add_argument("--rtu-port", type=int, default=RTU_OVER_TCP_PORT, help="RTU over TCP封装的服务端端口")
+
+
+def add_serial_arguments(parser, multiple=False):
+    """添加串口参数，multiple为True时--port可重复（多串口并行轮询）"""
+    if multiple:
+        parser.add_argument("--port", required=True, action="append",
+                            help="串口设备名或pyserial URL（如 /dev/ttyUSB0、COM3、loop://）或Modbus TCP（mbtcp://host:502），"
+                                 "可重复，每个串口由独立线程并行轮询")
+    else:
+        parser.add_argument("--port", required=True, help="串口设备名或pyserial URL（如 /dev/ttyUSB0、COM3、loop://）")
+    parser.add_argument("--baud", type=int, default=9600, help="波特率")
+    parser.add_argument("--bytesize", type=int, default=8, choices=[5, 6, 7, 8], help="数据位")
+    parser.add_argument("--parity", default="N", choices=["N", "O", "E"], help="校验位")
+    parser.add_argument("--stopbits", default="1", choices=["1", "1.5", "2"], help="停止位")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="响应超时（秒），poll中为自适应前的初始超时")
+
+
+def build_parser():
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="testmodbuscharge", description="工控测试软件命令行工具")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    poll = subparsers.add_parser("poll", help="轮询Modbus从站并输出解码结果")
+    add_serial_arguments(poll, multiple=True)
+    poll.add_argument("--slave", type=int_auto, default=1, help="从站地址")
+    poll.add_argument("--fc", default="03", choices=["01", "02", "03", "04"], help="读功能码")
+    poll.add_argument("--addr", type=int_auto, default=0, help="起始地址")
+    poll.add_argument("--count", type=int_auto, default=1, help="数量")
+    poll.add_argument("--rate", type=float, default=0, help="每秒轮询次数，0表示总线最快速度")
+    poll.add_argument("--task", type=parse_task, action="append",
+                      help="轮询任务 [串口@]从站:功能码:地址:数量:周期ms[:优先级]，可重复；周期0表示空闲时执行，"
+                           "不指定串口时在每个--port上各执行一份；指定后忽略--slave/--fc/--addr/--count/--rate")
+    add_point_arguments(poll)
+    poll.add_argument("--duration", type=float, default=0, help="运行时长（秒），0表示直到Ctrl+C")
+    poll.add_argument("--cycles", type=int, default=0, help="轮询次数，0表示不限")
+    poll.add_argument("--retries", type=int, default=1, help="超时后重发次数（离线从站的探测不重发）")
+    poll.add_argument("--offline-after", type=int, default=3, help="连续超时多少次判为离线，之后只按退避间隔探测")
+    poll.add_argument("--max-probe-interval", type=float, default=30.0, help="离线从站的最大探测间隔（秒）")
+    poll.add_argument("--fixed-timeout", action="store_true",
+                      help="始终使用--timeout，不按响应时间自适应（默认按各从站p99响应时间调整）")
+    poll.add_argument("--changes-only", action="store_true", help="只输出值有变化的结果（和失败的结果）")
+    poll.add_argument("--format", default="jsonl", choices=["jsonl", "csv"], help="输出格式")
+    poll.add_argument("--metrics-file", help="定时把总线指标快照写到该文件（供Prometheus textfile采集或外部读取）")
+    poll.add_argument("--metrics-format", default=FORMAT_PROMETHEUS, choices=[FORMAT_PROMETHEUS, FORMAT_JSON],
+                      help="指标快照格式")
+    poll.add_argument("--metrics-interval", type=float, default=10.0, help="指标快照写出间隔（秒）")
+    poll.add_argument("--profile", type=int, default=0, metavar="N",
+                      help="对前N个扫描周期做性能分析（cProfile和分阶段耗时）")
+    poll.add_argument("--profile-output", default="modbus_profile",
+                      help="性能分析输出文件前缀，生成 前缀.pstats 和 前缀.stages.json")
+    poll.add_argument("--profile-baseline", help="与之比较的另一次运行的 .stages.json")
+    poll.add_argument("--store", metavar="DB", help="把读到的数值写入该历史数据库（SQLite），trend子命令查询")
+    poll.add_argument("--store-interval", type=float, default=DEFAULT_MIN_INTERVAL,
+                      help="同一点位写入历史数据库的最小间隔（秒，允许10%%抖动），0为保存每次读到的值")
+    poll.add_argument("--store-retention", type=float, default=DEFAULT_RETENTION_DAYS,
+                      help="历史数据保留天数，更早的数据定时删除（空间由之后的数据复用），0为不限")
+    add_capture_arguments(poll)
+    poll.set_defaults(func=cmd_poll)
+
+    sniff = subparsers.add_parser("sniff", help="监听总线并输出解码出的RTU帧")
+    add_serial_arguments(sniff)
+    sniff.add_argument("--mode", default="both", choices=["both", "request", "response"], help="解码的报文方向")
+    add_capture_arguments(sniff)
+    sniff.set_defaults(func=cmd_sniff)
+
+    dump = subparsers.add_parser("dump", help="按时间范围输出抓包文件中的帧")
+    dump.add_argument("files", nargs="+", help="抓包文件、目录或通配符，多个文件按时间顺序读取")
+    dump.add_argument("--from", dest="start", type=parse_time, help="起始时间（ISO格式本地时间或Unix时间戳）")
+    dump.add_argument("--to", dest="end", type=parse_time, help="结束时间")
+    dump.add_argument("--channel", action="append", help="只输出该通道（串口名），可重复")
+    dump.add_argument("--format", default="text", choices=["text", "jsonl"], help="输出格式")
+    dump.add_argument("--limit", type=int, default=0, help="最多输出的帧数，0为不限")
+    dump.set_defaults(func=cmd_dump)
+
+    export = subparsers.add_parser("export", help="把抓包文件转换为pcapng（Wireshark）")
+    export.add_argument("files", nargs="+", help="抓包文件、目录或通配符，多个文件按时间顺序读取")
+    export.add_argument("-o", "--output", required=True, help="输出的pcapng文件")
+    export.add_argument("--from", dest="start", type=parse_time, help="起始时间（ISO格式本地时间或Unix时间戳）")
+    export.add_argument("--to", dest="end", type=parse_time, help="结束时间")
+    export.add_argument("--channel", action="append", help="只导出该通道（串口名），可重复")
+    add_pcapng_arguments(export)
+    export.set_defaults(func=cmd_export)
+
+    plan = subparsers.add_parser("plan", help="显示点位合并后的读请求")
+    plan.add_argument("--baud", type=int, default=9600, help="波特率（用于估算合并间隙）")
+    plan.add_argument("--slave", type=int_auto, default=1, help="注释文件点位对应的从站地址")
+    add_point_arguments(plan)
+    plan.set_defaults(func=cmd_plan)
+
+    write = subparsers.add_parser("write", help="写寄存器/线圈，相邻地址合并为最少的写请求")
+    add_serial_arguments(write)
+    write.add_argument("--slave", type=int_auto, default=1, help="从站地址")
+    write.add_argument("--register", type=parse_write, action="append",
+                       help="写保持寄存器 地址=值[,值...]，可重复；相邻地址合并为功能码16")
+    write.add_argument("--coil", type=parse_write, action="append", help="写线圈 地址=0/1[,0/1...]，可重复")
+    write.add_argument("--file", help="从JSON文件读取参数：{\"holding_registers\": {\"100\": 5}, \"coils\": {\"3\": 1}}")
+    write.add_argument("--multiple", action="store_true", help="单个寄存器也用功能码16写（设备不支持功能码06时使用）")
+    add_capture_arguments(write)
+    write.set_defaults(func=cmd_write)
+
+    discover = subparsers.add_parser("discover", help="扫描总线上有响应的从站地址和支持的功能码")
+    add_serial_arguments(discover, multiple=True)
+    discover.add_argument("--slaves", type=parse_slaves, help="扫描的地址范围，如 1-32,100（默认1-247）")
+    discover.add_argument("--passes", default=",".join(f"{factor:g}" for factor in DEFAULT_PASSES),
+                          help="各轮探测超时相对首轮（按波特率计算）的倍数，后续轮次只重新探测有迹象（响应迟到、CRC错误）的地址")
+    discover.add_argument("--full-reprobe", action="store_true", default=None,
+                          help="串口上后续轮次也重新探测全部无响应的地址（更慢；Modbus TCP总是如此）")
+    discover.add_argument("--no-functions", action="store_true", help="不探测功能码01-04的支持情况")
+    add_capture_arguments(discover)
+    discover.set_defaults(func=cmd_discover)
+
+    regmap = subparsers.add_parser("map", help="探测一个从站某个读功能码的可读地址区间（整块读取+二分查找边界）")
+    add_serial_arguments(regmap)
+    regmap.add_argument("--slave", type=int_auto, default=1, help="从站地址")
+    regmap.add_argument("--fc", default="03", choices=["01", "02", "03", "04"], help="读功能码")
+    regmap.add_argument("--first", type=int_auto, default=DEFAULT_FIRST, help="探测的起始地址")
+    regmap.add_argument("--last", type=int_auto, default=DEFAULT_LAST, help="探测的结束地址（含）")
+    regmap.add_argument("--stride", type=int, default=DEFAULT_STRIDE,
+                        help="不可读空白段的跳跃步长，短于步长的孤立区间可能漏掉；1为逐个探测")
+    regmap.add_argument("--max-count", type=int, default=None, help="设备的单次读取上限（默认按协议上限，收到异常03时自动下调）")
+    regmap.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="超时、设备忙时的重试次数")
+    regmap.add_argument("--silent-invalid", action="store_true", help="设备对不可读地址不响应（而不是返回异常02），超时视为不可读")
+    regmap.add_argument("--annotations", default="modbus_annotations.json",
+                        help="把探测到的区间写入该注释文件（解析窗口使用的格式，每个区间一条），空字符串表示不写入")
+    add_capture_arguments(regmap)
+    regmap.set_defaults(func=cmd_map)
+
+    simulate = subparsers.add_parser("simulate", help="运行模拟从站（pty虚拟串口或TCP）")
+    simulate.add_argument("--pty", action="store_true", help="在pty虚拟串口对上提供RTU服务（Linux/macOS）")
+    simulate.add_argument("--tcp", help="在TCP端口上提供服务，如 127.0.0.1:5020")
+    simulate.add_argument("--framing", default="mbap", choices=["mbap", "rtu"],
+                          help="TCP报文格式：mbap为Modbus TCP，rtu为RTU透传（主站用socket://连接）")
+    simulate.add_argument("--baud", type=int, default=115200, help="RTU帧间隔计算用的波特率")
+    simulate.add_argument("--slaves", type=parse_slaves, default=[1], help="从站地址列表，如 1,2,5-8")
+    simulate.add_argument("--image", help="从JSON文件加载寄存器/线圈映像，指定后忽略--slaves")
+    simulate.add_argument("--latency", type=float, default=0, help="响应延迟（毫秒）")
+    simulate.add_argument("--jitter", type=float, default=0, help="响应延迟抖动（毫秒，均匀分布±）")
+    simulate.add_argument("--crc-error-rate", type=float, default=0, help="注入CRC错误的概率")
+    simulate.add_argument("--timeout-rate", type=float, default=0, help="注入不响应的概率")
+    simulate.add_argument("--truncate-rate", type=float, default=0, help="注入截断帧的概率")
+    simulate.add_argument("--seed", type=int, default=0, help="随机数种子（抖动和故障注入可复现）")
+    simulate.set_defaults(func=cmd_simulate)
+
+    replay = subparsers.add_parser("replay", help="回放抓包文件：解码输出，或用录制的响应扮演设备")
+    replay.add_argument("files", nargs="+", help="抓包文件、目录或通配符，多个文件按时间顺序读取")
+    replay.add_argument("--speed", type=float, default=1.0,
+                        help="回放倍速，1为原始时间间隔，0为最快速度（扮演设备时按倍速缩放录制的响应延迟，0为立即应答）")
+    replay.add_argument("--from", dest="start", type=parse_time, help="起始时间（ISO格式本地时间或Unix时间戳）")
+    replay.add_argument("--to", dest="end", type=parse_time, help="结束时间")
+    replay.add_argument("--channel", action="append", help="只回放该通道（串口名），可重复")
+    replay.add_argument("--format", default="jsonl", choices=["jsonl", "csv"], help="事务结果的输出格式")
+    replay.add_argument("--pty", action="store_true", help="在pty虚拟串口上用录制的响应应答请求（Linux/macOS）")
+    replay.add_argument("--tcp", help="在TCP端口上用录制的响应应答请求，如 127.0.0.1:5020")
+    replay.add_argument("--framing", default="mbap", choices=["mbap", "rtu"], help="TCP服务的报文格式")
+    replay.add_argument("--baud", type=int, default=115200, help="RTU帧间隔计算用的波特率")
+    replay.set_defaults(func=cmd_replay)
+
+    trend = subparsers.add_parser("trend", help="查询历史数据库中点位的数值（原始采样或按时间桶降采样）")
+    trend.add_argument("database", help="poll --store 或界面写入的历史数据库")
+    trend.add_argument("--list", action="store_true", help="列出全部点位")
+    trend.add_argument("--series", type=parse_series,
+                       help="点位 串口:从站:数据表或功能码:地址（如 /dev/ttyUSB0:1:03:100），不指定时列出全部点位")
+    trend.add_argument("--from", dest="start", type=parse_time, help="起始时间（ISO格式本地时间或Unix时间戳）")
+    trend.add_argument("--to", dest="end", type=parse_time, help="结束时间，默认为当前时间")
+    trend.add_argument("--buckets", type=int, default=0, help="按时间等分为N个桶输出最小/最大/平均/最后值，0为输出原始采样")
+    trend.add_argument("--format", default="text", choices=["text", "jsonl"], help="输出格式")
+    trend.set_defaults(func=cmd_trend)
+    return parser
+
+
+def main(argv=None):
+    """命令行主函数"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
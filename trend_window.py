@@ -0,0 +1,151 @@
+import tkinter as tk
+from tkinter import ttk
+import datetime
+import time
+from modbus_history import format_series_key
+
+
+class TrendWindow:
+    """趋势图窗口：按时间范围显示一个点位的历史数值，每个像素列一个时间桶，画最小/最大值带和平均值曲线"""
+
+    REFRESH_INTERVAL = 2000  # 刷新间隔（ms）
+    MARGIN_LEFT = 60
+    MARGIN_RIGHT = 10
+    MARGIN_TOP = 10
+    MARGIN_BOTTOM = 25
+    # 时间范围（秒），None为全部数据
+    RANGES = {"10分钟": 600, "1小时": 3600, "1天": 86400, "1周": 7 * 86400, "全部": None}
+
+    def __init__(self, parent, store):
+        self.parent = parent
+        self.store = store
+        self.window = tk.Toplevel(parent)
+        self.window.title("趋势图")
+        self.window.geometry("800x420")
+        self.window.minsize(480, 280)
+
+        self.keys = {}
+        self.refresh_timer = None
+
+        self.create_interface()
+        self.window.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.refresh()
+
+    def create_interface(self):
+        """创建界面"""
+        self.series_var = tk.StringVar()
+        self.range_var = tk.StringVar(value="1小时")
+        self.status_var = tk.StringVar(value="选择点位")
+
+        main_frame = ttk.Frame(self.window, padding="5")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(0, weight=1)
+        main_frame.rowconfigure(1, weight=1)
+
+        control_frame = ttk.Frame(main_frame)
+        control_frame.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        ttk.Label(control_frame, text="点位:").grid(row=0, column=0)
+        self.series_combo = ttk.Combobox(control_frame, textvariable=self.series_var, state="readonly", width=40)
+        self.series_combo.grid(row=0, column=1, padx=(0, 10))
+        self.series_combo.bind("<<ComboboxSelected>>", lambda event: self.draw())
+        ttk.Label(control_frame, text="范围:").grid(row=0, column=2)
+        range_combo = ttk.Combobox(control_frame, textvariable=self.range_var, values=list(self.RANGES),
+                                   state="readonly", width=8)
+        range_combo.grid(row=0, column=3)
+        range_combo.bind("<<ComboboxSelected>>", lambda event: self.draw())
+
+        self.canvas = tk.Canvas(main_frame, background="white", highlightthickness=0)
+        self.canvas.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
+        self.canvas.bind("<Configure>", lambda event: self.draw())
+
+        status_bar = ttk.Label(main_frame, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
+        status_bar.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+
+    def update_series(self):
+        """刷新点位列表"""
+        self.keys = {format_series_key(key): key for key in self.store.series_keys()}
+        names = list(self.keys)
+        self.series_combo.config(values=names)
+        if names and self.series_var.get() not in self.keys:
+            self.series_var.set(names[0])
+
+    def draw(self):
+        """按当前点位和时间范围重画曲线"""
+        canvas = self.canvas
+        canvas.delete("all")
+        key = self.keys.get(self.series_var.get())
+        if key is None:
+            return
+        width = canvas.winfo_width()
+        height = canvas.winfo_height()
+        plot_width = width - self.MARGIN_LEFT - self.MARGIN_RIGHT
+        plot_height = height - self.MARGIN_TOP - self.MARGIN_BOTTOM
+        if plot_width < 10 or plot_height < 10:
+            return
+        span = self.RANGES.get(self.range_var.get())
+        end = time.time()
+        if span is None:
+            first, last = self.store.time_range(key)
+            if first is None:
+                return
+            start, end = first, max(last, first + 1)
+        else:
+            start = end - span
+        buckets = self.store.downsample(key, start, end, plot_width)
+        if not buckets:
+            self.status_var.set(f"{self.series_var.get()}: 该时间范围内没有数据")
+            return
+        minimum = min(bucket.min for bucket in buckets)
+        maximum = max(bucket.max for bucket in buckets)
+        low, high = minimum, maximum
+        if high == low:
+            high, low = high + 1, low - 1
+        left, top, bottom = self.MARGIN_LEFT, self.MARGIN_TOP, self.MARGIN_TOP + plot_height
+        x_scale = plot_width / ((end - start) * 1000)
+        y_scale = plot_height / (high - low)
+
+        def x_of(timestamp_ms):
+            return left + (timestamp_ms - start * 1000) * x_scale
+
+        def y_of(value):
+            return bottom - (value - low) * y_scale
+
+        # 坐标轴和刻度
+        canvas.create_rectangle(left, top, left + plot_width, bottom, outline="#999999")
+        for value in (low, (low + high) / 2, high):
+            canvas.create_text(left - 5, y_of(value), text=f"{value:g}", anchor=tk.E, fill="#555555")
+        time_format = "%H:%M:%S" if end - start <= 86400 else "%m-%d %H:%M"
+        for fraction, anchor in ((0, tk.NW), (0.5, tk.N), (1, tk.NE)):
+            timestamp = start + (end - start) * fraction
+            canvas.create_text(left + plot_width * fraction, bottom + 5, anchor=anchor, fill="#555555",
+                               text=datetime.datetime.fromtimestamp(timestamp).strftime(time_format))
+
+        # 最小/最大值带（每个时间桶一条竖线）和平均值曲线
+        points = []
+        for bucket in buckets:
+            x = x_of(bucket.start)
+            canvas.create_line(x, y_of(bucket.min), x, y_of(bucket.max) + 1, fill="#a8c8f0")
+            points.extend((x, y_of(bucket.average)))
+        if len(points) >= 4:
+            canvas.create_line(*points, fill="#1f5fbf")
+        else:
+            canvas.create_oval(points[0] - 2, points[1] - 2, points[0] + 2, points[1] + 2, fill="#1f5fbf")
+
+        samples = sum(bucket.count for bucket in buckets)
+        self.status_var.set(f"{self.series_var.get()}: {samples} 个采样, 最小 {minimum}, 最大 {maximum}, "
+                            f"最新 {buckets[-1].last}")
+
+    def refresh(self):
+        """定时刷新（在界面线程中运行）"""
+        self.update_series()
+        self.draw()
+        self.refresh_timer = self.window.after(self.REFRESH_INTERVAL, self.refresh)
+
+    def on_closing(self):
+        """窗口关闭事件"""
+        if self.refresh_timer is not None:
+            self.window.after_cancel(self.refresh_timer)
+            self.refresh_timer = None
+        self.window.destroy()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+界面更新泵（不依赖tkinter，只需要提供after/after_cancel的控件）
+I/O线程把结果放入有界的UpdateQueue后立即返回，从不等待界面；界面线程按固定帧率用after()执行一次，
+取出积压的全部结果做统计，只显示每帧最新的若干条（其余汇总为一行），各日志视图每帧一次批量追加，
+显示开销按帧计算而不是按报文计算
+"""
+
+import collections
+import threading
+
+DEFAULT_FRAME_RATE = 30         # 界面刷新帧率（次/秒）
+DEFAULT_MAX_RENDER = 50         # 每帧每个来源最多显示的记录数，其余只统计并汇总为一行
+DEFAULT_MAX_PENDING = 20000     # 队列积压上限，超过后丢弃最旧的记录（界面长时间卡住时保护内存）
+
+
+class UpdateQueue:
+    """线程安全的有界队列：put从不阻塞，积压超过上限时丢弃最旧的记录并计数"""
+
+    def __init__(self, max_pending=DEFAULT_MAX_PENDING):
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self.dropped = 0  # 累计丢弃数
+
+    def put(self, item):
+        """放入一条记录（任意线程）"""
+        with self._lock:
+            if len(self._items) >= self.max_pending:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+
+    put_nowait = put
+
+    def drain(self):
+        """取出全部积压记录，返回(记录列表, 上次取出后丢弃的条数)"""
+        with self._lock:
+            items = self._items
+            self._items = collections.deque()
+            dropped = self.dropped
+            self.dropped = 0
+        return list(items), dropped
+
+    def __len__(self):
+        return len(self._items)
+
+
+class _Source:
+    """一个结果来源：handle(记录, 是否显示)，summarize(省略的记录, 丢弃数)"""
+
+    def __init__(self, updates, handle, summarize, max_render):
+        self.updates = updates
+        self.handle = handle
+        self.summarize = summarize
+        self.max_render = max_render
+
+
+class UiPump:
+    """按固定帧率把I/O线程的结果和界面线程写入的日志行批量交给界面"""
+
+    def __init__(self, widget, frame_rate=DEFAULT_FRAME_RATE):
+        self.widget = widget
+        self.interval = max(1, int(1000 / frame_rate))  # 毫秒
+        self.sources = []
+        self.pending = {}  # 日志视图 -> 本帧待追加的行（只在界面线程访问）
+        self.timer = None
+        self.frames = 0
+        self.handled = 0
+        self.skipped = 0   # 过载时只统计未显示的记录数
+        self.dropped = 0   # 队列溢出丢弃的记录数
+        self.profile_span = None  # 性能分析时为返回计时上下文的函数，每帧的批量追加和渲染计入其中
+
+    def add_source(self, updates, handle, summarize=None, max_render=DEFAULT_MAX_RENDER):
+        """登记一个UpdateQueue及其处理函数"""
+        self.sources.append(_Source(updates, handle, summarize, max_render))
+
+    def write(self, view, line):
+        """在本帧末尾向日志视图追加一行（界面线程调用）"""
+        lines = self.pending.get(view)
+        if lines is None:
+            lines = self.pending[view] = []
+        lines.append(line)
+
+    def discard(self, view):
+        """丢弃视图本帧尚未追加的行（清空视图时调用）"""
+        self.pending.pop(view, None)
+
+    def start(self):
+        """开始定时刷新"""
+        if self.timer is None:
+            self.timer = self.widget.after(self.interval, self._run)
+
+    def stop(self):
+        """停止定时刷新"""
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+
+    def _run(self):
+        """定时器回调：执行一帧并安排下一帧（出错时也继续）"""
+        self.timer = None
+        try:
+            self.tick()
+        finally:
+            self.timer = self.widget.after(self.interval, self._run)
+
+    def tick(self):
+        """执行一帧：处理各来源的积压记录，然后每个日志视图批量追加一次"""
+        self.frames += 1
+        for source in self.sources:
+            items, dropped = source.updates.drain()
+            if not items and not dropped:
+                continue
+            first_shown = max(0, len(items) - source.max_render)
+            skipped = items[:first_shown]
+            for item in skipped:
+                source.handle(item, False)
+            if (skipped or dropped) and source.summarize is not None:
+                source.summarize(skipped, dropped)
+            for item in items[first_shown:]:
+                source.handle(item, True)
+            self.handled += len(items)
+            self.skipped += len(skipped)
+            self.dropped += dropped
+        span = self.profile_span
+        if span is None or not self.pending:
+            self.flush()
+            return
+        with span():
+            self.flush()
+            # 日志视图在空闲时才渲染，性能分析时立即执行，使Text控件的实际插入和渲染开销计入
+            self.widget.update_idletasks()
+
+    def flush(self):
+        """把本帧积累的日志行一次性追加到各视图"""
+        if not self.pending:
+            return
+        pending = self.pending
+        self.pending = {}
+        for view, lines in pending.items():
+            view.extend(lines)